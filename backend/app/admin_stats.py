@@ -0,0 +1,207 @@
+# app/admin_stats.py
+# Estadísticas para admins sin COUNT(*) sobre las tablas grandes en horario de uso.
+# Cada cifra sale de una de estas fuentes y dice cuál:
+# - recount: conteo exacto que hace periódicamente la tarea recount_stats (en el
+#   primario), guardado en Redis con su fecha.
+# - counters: contadores en Redis que se incrementan al escribir. crud y la purga
+#   anotan deltas en la sesión (record) y se suman a Redis recién después del commit;
+#   si la transacción se revierte, se descartan. Cada recount los vuelve a cero.
+# - planner: la estimación de filas de Postgres (pg_class.reltuples, al día según el
+#   último ANALYZE / autovacuum).
+# - count: COUNT(*) directo, solo para tablas chicas (genéricos, supermercados).
+# - hll: usuarios activos por día en un HyperLogLog (error típico < 1%).
+# kind = "exact" solo si la cifra es un conteo exacto y no hubo escrituras desde entonces.
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, func, select, text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Product, GenericProduct, Supermarket, Price, PriceHistory, User, PRODUCT_IS_LIVE
+from app.redis_client import get_redis
+from app.supermarkets import all_supermarkets, get_supermarket_region
+
+STATS_RECOUNT_SECONDS = float(os.getenv("STATS_RECOUNT_SECONDS", "21600"))
+# Días que se guardan los contadores diarios (crecimiento del historial, usuarios activos)
+STATS_DAILY_RETENTION_DAYS = 40
+
+EXACT_KEY = "stats:exact"
+DELTAS_KEY = "stats:deltas"
+PLANNER_TABLES = ["products", "prices", "price_history", "users", "basket"]
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+def _history_day_key(day: str) -> str:
+    return f"stats:history_added:{day}"
+
+def _active_day_key(day: str) -> str:
+    return f"stats:active_users:{day}"
+
+def _last_days(days: int) -> list[str]:
+    today = datetime.now(timezone.utc).date()
+    return [(today - timedelta(days=i)).isoformat() for i in range(days)]
+
+# ---------- CONTADORES AL ESCRIBIR ----------
+
+# Anota un delta en la sesión; se aplica en Redis solo si la transacción se commitea
+def record(db: Session, counter: str, amount: int = 1):
+    if amount:
+        deltas = db.info.setdefault("stats_deltas", {})
+        deltas[counter] = deltas.get(counter, 0) + amount
+
+@event.listens_for(SessionLocal, "after_commit")
+def _flush_deltas(session):
+    deltas = session.info.pop("stats_deltas", None)
+    if not deltas:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for counter, amount in deltas.items():
+            pipe.hincrby(DELTAS_KEY, counter, amount)
+        added = deltas.get("price_history", 0)
+        if added > 0:
+            key = _history_day_key(_today())
+            pipe.incrby(key, added)
+            pipe.expire(key, STATS_DAILY_RETENTION_DAYS * 86400)
+        pipe.execute()
+    except Exception as e:
+        # El próximo recount corrige la diferencia
+        print(f"⚠️ No se pudieron actualizar los contadores de stats: {e}")
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_deltas(session, previous_transaction):
+    session.info.pop("stats_deltas", None)
+
+def record_active_user(user_id: int):
+    try:
+        key = _active_day_key(_today())
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.pfadd(key, user_id)
+        pipe.expire(key, STATS_DAILY_RETENTION_DAYS * 86400)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ No se pudo registrar el usuario activo: {e}")
+
+# ---------- RECOUNT EXACTO ----------
+
+# Tiene que correr en el primario: en una réplica atrasada, lo commiteado en el
+# primario que todavía no llegó no estaría ni en el conteo ni en los deltas borrados.
+# Los deltas se vuelven a cero y después se toma un solo snapshot para todos los
+# conteos (REPEATABLE READ). Una escritura commiteada antes del snapshot queda contada,
+# y su delta o se sumó antes del borrado (se pierde, bien) o después (queda contada dos
+# veces y la suma se marca estimada). Una commiteada después suma su delta después del borrado.
+def recount(db: Session) -> dict:
+    redis_client = get_redis()
+    redis_client.delete(DELTAS_KEY)
+    if db.get_bind().dialect.name == "postgresql":
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    prices = dict(db.execute(select(Price.supermarket_id, func.count()).group_by(Price.supermarket_id)).all())
+    exact = {
+        "counted_at": datetime.now(timezone.utc).isoformat(),
+        "products": db.execute(select(func.count()).select_from(Product).where(PRODUCT_IS_LIVE)).scalar(),
+        "price_history": db.execute(select(func.count()).select_from(PriceHistory)).scalar(),
+        "users": db.execute(select(func.count()).select_from(User)).scalar(),
+        "prices": {str(k): v for k, v in prices.items()},
+    }
+    db.commit()
+    redis_client.set(EXACT_KEY, json.dumps(exact))
+    print(f"🔢 Recount de stats: {exact['products']} productos, {exact['price_history']} filas de historial")
+    return exact
+
+# ---------- LECTURA ----------
+
+def _figure(value, kind: str, source: str, as_of: str = None) -> dict:
+    return {"value": value, "kind": kind, "source": source, "as_of": as_of}
+
+def planner_estimates(db: Session) -> dict:
+    if db.get_bind().dialect.name != "postgresql":
+        return {}
+    # Para tablas particionadas, la suma de las particiones
+    rows = db.execute(text("""
+        SELECT c.relname,
+               GREATEST(c.reltuples, 0) + COALESCE((
+                   SELECT SUM(GREATEST(k.reltuples, 0))
+                   FROM pg_inherits i JOIN pg_class k ON k.oid = i.inhrelid
+                   WHERE i.inhparent = c.oid
+               ), 0)
+        FROM pg_class c
+        WHERE c.relname = ANY(:names) AND c.relnamespace = 'public'::regnamespace
+    """), {"names": PLANNER_TABLES}).all()
+    return {name: int(estimate) for name, estimate in rows}
+
+# Conteo exacto + deltas desde entonces; sin recount, la estimación del planner
+def _counted(value, counted_at: str, delta: int, planner_value=None) -> dict:
+    if value is not None:
+        if not delta:
+            return _figure(value, "exact", "recount", counted_at)
+        return _figure(value + delta, "estimated", "recount+counters", counted_at)
+    if planner_value is not None:
+        return _figure(planner_value, "estimated", "planner")
+    return _figure(None, "estimated", "unavailable")
+
+def get_stats(db: Session) -> dict:
+    planner = planner_estimates(db)
+    exact, deltas, history_days, active = None, {}, [], {}
+    try:
+        redis_client = get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.get(EXACT_KEY)
+        pipe.hgetall(DELTAS_KEY)
+        for day in _last_days(30):
+            pipe.get(_history_day_key(day))
+        raw_exact, raw_deltas, *history_days = pipe.execute()
+        exact = json.loads(raw_exact) if raw_exact else None
+        deltas = {k: int(v) for k, v in raw_deltas.items()}
+        history_days = [int(v or 0) for v in history_days]
+        for days in (1, 7, 30):
+            active[days] = redis_client.pfcount(*(_active_day_key(d) for d in _last_days(days)))
+    except Exception as e:
+        print(f"⚠️ Stats sin Redis, solo estimaciones del planner: {e}")
+
+    exact = exact or {}
+    counted_at = exact.get("counted_at")
+    exact_prices = exact.get("prices")
+
+    # Por región/slug: la misma cadena puede estar en varios países con el mismo nombre
+    prices_by_supermarket = {
+        f"{get_supermarket_region(db, supermarket_id)}/{slug}": _counted(
+            exact_prices.get(str(supermarket_id), 0) if exact_prices is not None else None,
+            counted_at, deltas.get(f"prices:{supermarket_id}", 0),
+        )
+        for supermarket_id, _, slug in all_supermarkets(db)
+    }
+    if exact_prices is not None:
+        prices_total = _counted(
+            sum(exact_prices.values()), counted_at,
+            sum(v for k, v in deltas.items() if k.startswith("prices:")),
+        )
+    else:
+        prices_total = _counted(None, None, 0, planner.get("prices"))
+
+    history_growth = {}
+    if history_days:
+        for label, days in (("last_24h", 1), ("last_7d", 7), ("last_30d", 30)):
+            history_growth[label] = _figure(sum(history_days[:days]), "estimated", "counters")
+
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "last_recount_at": counted_at,
+        "catalog": {
+            "products": _counted(exact.get("products"), counted_at, deltas.get("products", 0), planner.get("products")),
+            "generic_products": _figure(db.execute(select(func.count()).select_from(GenericProduct)).scalar(), "exact", "count"),
+            "supermarkets": _figure(db.execute(select(func.count()).select_from(Supermarket)).scalar(), "exact", "count"),
+        },
+        "prices": {
+            "total": prices_total,
+            "by_supermarket": prices_by_supermarket,
+        },
+        "price_history": {
+            "total": _counted(exact.get("price_history"), counted_at, deltas.get("price_history", 0), planner.get("price_history")),
+            "growth": history_growth,
+        },
+        "users": {
+            "total": _counted(exact.get("users"), counted_at, deltas.get("users", 0), planner.get("users")),
+            "active": {f"last_{days}d": _figure(count, "estimated", "hll") for days, count in active.items()},
+        },
+    }
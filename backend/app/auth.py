@@ -8,6 +8,7 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from .database import get_db
 from . import crud, models
+from .admin_stats import record_active_user
 
 
 # Clave secreta para firmar los tokens (guardala en .env en producción)
@@ -26,6 +27,17 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"sub": str(data["sub"]), "exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# ----------- Leer el "sub" de un token -----------
+
+# None si el token no es válido o venció. No consulta la base: lo usa también
+# el rate limiter, que corre antes de cada request.
+def token_subject(token: str):
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 # ----------- Obtener usuario autenticado desde el token -----------
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
@@ -35,18 +47,19 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+    user_id_str = token_subject(token)
+    if user_id_str is None:
+        raise credentials_exception
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id_str: str = payload.get("sub")
-        if user_id_str is None:
-            raise credentials_exception
         user_id = int(user_id_str)
-    except (JWTError, ValueError):
+    except ValueError:
         raise credentials_exception
 
     user = crud.get_user_by_id(db, user_id=user_id)
     if user is None:
         raise credentials_exception
+    # Usuarios activos por día para /admin/stats (un PFADD, no toca la base)
+    record_active_user(user.id)
     return user
 
 # ----------- Verificar rol -----------
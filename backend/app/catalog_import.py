@@ -0,0 +1,259 @@
+# app/catalog_import.py
+# Importación masiva de catálogos (feeds de proveedores, dumps tipo Open Food Facts).
+# Lee CSV o JSONL en streaming, valida por lotes con ProductCreate, descarta códigos
+# de barra que ya existen y carga cada lote con COPY a una tabla temporal + merge.
+# La memoria no depende del tamaño del archivo: solo hay un lote en memoria a la vez
+# y las filas rechazadas se escriben a un CSV aparte.
+#
+# CLI: python -m app.catalog_import catalogo.csv [--format jsonl] [--batch-size 5000]
+import argparse
+import csv
+import io
+import json
+import os
+from datetime import datetime, timezone
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Product, ImportJob, PRODUCT_IS_LIVE
+from app.schemas import ProductCreate
+from app.units import to_base, parse_quantity
+from app.admin_stats import record
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+IMPORT_DIR = os.getenv("IMPORT_DIR", "/tmp/mastermarket-imports")
+
+# Nombres de columnas de Open Food Facts y otros feeds → campos de ProductCreate
+FIELD_ALIASES = {
+    "code": "barcode",
+    "ean": "barcode",
+    "product_name": "name",
+    "brands": "brand",
+    "categories": "category",
+    "main_category": "category",
+    "generic_name": "description",
+    "image_front_url": "image_url",
+}
+
+COLUMNS = [
+    "name", "description", "category", "brand", "quantity", "net_quantity",
+    "unit", "base_quantity", "base_unit", "image_url", "barcode",
+]
+
+def detect_format(filename: str) -> str:
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+def iter_rows(path: str, fmt: str):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "jsonl":
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, e
+        else:
+            # La línea 1 es el encabezado
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                yield line_no, row
+
+def normalize_row(raw: dict) -> dict:
+    row = {}
+    for key, value in raw.items():
+        if key is None:
+            continue
+        key = FIELD_ALIASES.get(key.strip(), key.strip())
+        if isinstance(value, str):
+            value = value.strip()
+        if value == "":
+            value = None
+        if key not in row or row[key] is None:
+            row[key] = value
+
+    # "500 g" en quantity (formato OFF) → contenido neto estructurado
+    quantity = row.get("quantity")
+    if isinstance(quantity, str) and not quantity.isdigit():
+        net_quantity, unit = parse_quantity(quantity)
+        row["quantity"] = 1
+        if row.get("net_quantity") is None and row.get("unit") is None:
+            row["net_quantity"], row["unit"] = net_quantity, unit
+    row["description"] = row.get("description") or ""
+    row["image_url"] = row.get("image_url") or ""
+    return row
+
+class RejectWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._writer = None
+
+    def write(self, line_no: int, error: str, raw):
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(["line", "error", "row"])
+        self._writer.writerow([line_no, error, raw if isinstance(raw, str) else json.dumps(raw, default=str)])
+
+    def close(self):
+        if self._file:
+            self._file.close()
+
+def _existing_barcodes(db: Session, barcodes) -> set:
+    rows = db.query(Product.barcode).filter(Product.barcode.in_(list(barcodes)), PRODUCT_IS_LIVE).all()
+    return {r[0] for r in rows}
+
+def _copy_batch(db: Session, rows: list[dict]) -> int:
+    connection = db.connection()
+    if connection.dialect.name != "postgresql":
+        # SQLite en pruebas locales: insert en bloque común
+        db.execute(insert(Product), rows)
+        return len(rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[c] is None else row[c] for c in COLUMNS])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS import_products_staging "
+            "(LIKE products INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        cursor.copy_expert(
+            f"COPY import_products_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+        # El NOT EXISTS cubre también productos creados por otro request mientras corría el lote
+        cursor.execute(
+            f"INSERT INTO products ({', '.join(COLUMNS)}) "
+            f"SELECT {', '.join('s.' + c for c in COLUMNS)} FROM import_products_staging s "
+            "WHERE NOT EXISTS (SELECT 1 FROM products p WHERE p.barcode = s.barcode AND p.deleted_at IS NULL)"
+        )
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+# Valida, deduplica y carga un lote. Devuelve (insertados, duplicados, rechazados)
+def _load_batch(db: Session, batch: list, rejects: RejectWriter):
+    valid = {}
+    duplicates = 0
+    rejected = 0
+    for line_no, raw in batch:
+        if not isinstance(raw, dict):
+            rejects.write(line_no, str(raw) if isinstance(raw, Exception) else "row is not an object", "")
+            rejected += 1
+            continue
+        try:
+            product = ProductCreate(**normalize_row(raw))
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            rejects.write(line_no, errors, raw)
+            rejected += 1
+            continue
+        if product.barcode in valid:
+            duplicates += 1
+            continue
+        valid[product.barcode] = product
+
+    existing = _existing_barcodes(db, valid.keys()) if valid else set()
+    duplicates += len(existing)
+    rows = []
+    for barcode, product in valid.items():
+        if barcode in existing:
+            continue
+        row = product.dict()
+        row["base_quantity"], row["base_unit"] = to_base(row["net_quantity"], row["unit"])
+        rows.append(row)
+
+    inserted = _copy_batch(db, rows) if rows else 0
+    # Lo que el merge no insertó también era duplicado
+    duplicates += len(rows) - inserted
+    record(db, "products", inserted)
+    db.commit()
+    return inserted, duplicates, rejected
+
+def run_import(path: str, fmt: str = None, job_id: int = None, batch_size: int = IMPORT_BATCH_SIZE,
+               rejects_path: str = None, progress=None) -> dict:
+    fmt = fmt or detect_format(path)
+    rejects_path = rejects_path or f"{path}.rejects.csv"
+    rejects = RejectWriter(rejects_path)
+    totals = {"processed": 0, "inserted": 0, "duplicates": 0, "rejected": 0}
+    db = SessionLocal()
+    job = db.get(ImportJob, job_id) if job_id else None
+
+    def save_progress(status: str, error: str = None):
+        if job is None:
+            return
+        for key, value in totals.items():
+            setattr(job, key, value)
+        job.status = status
+        job.error = error
+        job.rejects_path = rejects_path if totals["rejected"] else None
+        if status in ("done", "failed"):
+            job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+
+    try:
+        save_progress("running")
+        batch = []
+        for item in iter_rows(path, fmt):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                _add_totals(totals, len(batch), _load_batch(db, batch, rejects))
+                batch = []
+                save_progress("running")
+                if progress:
+                    progress(totals)
+        if batch:
+            _add_totals(totals, len(batch), _load_batch(db, batch, rejects))
+        save_progress("done")
+        if progress:
+            progress(totals)
+        return {**totals, "rejects_path": rejects_path if totals["rejected"] else None}
+    except Exception as e:
+        db.rollback()
+        save_progress("failed", str(e))
+        raise
+    finally:
+        rejects.close()
+        db.close()
+
+def _add_totals(totals: dict, processed: int, result):
+    inserted, duplicates, rejected = result
+    totals["processed"] += processed
+    totals["inserted"] += inserted
+    totals["duplicates"] += duplicates
+    totals["rejected"] += rejected
+
+# Para la tarea de Celery del endpoint de admin: los errores quedan en el job
+def run_import_job(job_id: int, path: str, fmt: str):
+    try:
+        run_import(path, fmt, job_id=job_id)
+    except Exception as e:
+        print(f"❌ Falló la importación {job_id}: {e}")
+    finally:
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Importar un catálogo de productos (CSV o JSONL)")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"])
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--rejects")
+    args = parser.parse_args()
+
+    def progress(totals):
+        print(f"📦 {totals['processed']} filas | {totals['inserted']} nuevas | "
+              f"{totals['duplicates']} duplicadas | {totals['rejected']} rechazadas")
+
+    result = run_import(args.path, args.format, batch_size=args.batch_size,
+                        rejects_path=args.rejects, progress=progress)
+    if result["rejects_path"]:
+        print(f"⚠️ Filas rechazadas en {result['rejects_path']}")
+
+if __name__ == "__main__":
+    main()
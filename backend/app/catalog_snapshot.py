@@ -0,0 +1,115 @@
+# app/catalog_snapshot.py
+# Snapshot offline del catálogo para el arranque de la app móvil.
+# Una tarea de Celery arma periódicamente un bundle msgpack comprimido con gzip
+# por región (productos, genéricos, los supermercados de la región y su grilla de
+# precios actuales) y lo guarda en SNAPSHOT_DIR/<región>/ con el hash de su
+# contenido en el nombre: catalog-<hash>.msgpack.gz.
+# Como el nombre cambia cuando cambia el contenido, el archivo se sirve como
+# inmutable y lo puede cachear cualquier CDN. El manifest dice cuál es el último.
+import gzip
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import Product, GenericProduct, PRODUCT_IS_LIVE
+from app.price_matrix import build_price_matrix, pack_msgpack
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "/tmp/mastermarket-snapshots")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "900"))
+# Cuántos bundles viejos se conservan para clientes que todavía están bajando uno anterior
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "3"))
+# Prefijo público de los bundles (ej. la URL del CDN); por defecto, la ruta de la API
+SNAPSHOT_PUBLIC_URL = os.getenv("SNAPSHOT_PUBLIC_URL", "/snapshot/files")
+SNAPSHOT_FORMAT_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+ARTIFACT_PATTERN = re.compile(r"^catalog-[0-9a-f]{16}\.msgpack\.gz$")
+
+PRODUCT_COLUMNS = [
+    "id", "name", "description", "category", "brand", "quantity", "net_quantity",
+    "unit", "base_quantity", "base_unit", "image_url", "barcode", "generic_product_id",
+]
+GENERIC_COLUMNS = ["id", "name", "description", "category", "image_url"]
+
+# Tabla en formato columnar: {"columns": [...], "rows": [[...], ...]}
+def _table(db: Session, model, columns: list[str], *where) -> dict:
+    query = select(*(getattr(model, c) for c in columns)).where(*where).order_by(model.id)
+    return {"columns": columns, "rows": [list(row) for row in db.execute(query)]}
+
+def snapshot_dir(region: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, region)
+
+def build_snapshot(db: Session, region: str) -> dict:
+    matrix = build_price_matrix(db, region=region)
+    return {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "supermarkets": matrix.pop("supermarkets"),
+        "products": _table(db, Product, PRODUCT_COLUMNS, PRODUCT_IS_LIVE),
+        "generic_products": _table(db, GenericProduct, GENERIC_COLUMNS),
+        "prices": matrix,
+    }
+
+def read_manifest(directory: str):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def artifact_path(filename: str, directory: str):
+    if not ARTIFACT_PATTERN.match(filename):
+        return None
+    path = os.path.join(directory, filename)
+    return path if os.path.exists(path) else None
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _prune(directory: str, keep: set):
+    artifacts = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if ARTIFACT_PATTERN.match(name) and name not in keep
+    ]
+    artifacts.sort(key=os.path.getmtime, reverse=True)
+    for path in artifacts[max(SNAPSHOT_KEEP - len(keep), 0):]:
+        os.remove(path)
+
+# Arma el bundle de la región y publica un manifest nuevo. Si el contenido no cambió
+# desde el último snapshot, no escribe nada y devuelve el manifest actual.
+def publish_snapshot(db: Session, region: str, directory: str = None) -> dict:
+    directory = directory or snapshot_dir(region)
+    os.makedirs(directory, exist_ok=True)
+    payload = pack_msgpack(build_snapshot(db, region))
+    version = hashlib.sha256(payload).hexdigest()[:16]
+
+    current = read_manifest(directory)
+    if current and current["version"] == version and artifact_path(current["filename"], directory):
+        return current
+
+    filename = f"catalog-{version}.msgpack.gz"
+    # mtime=0 para que el mismo contenido dé exactamente los mismos bytes
+    compressed = gzip.compress(payload, compresslevel=9, mtime=0)
+    _write_atomic(os.path.join(directory, filename), compressed)
+
+    manifest = {
+        "version": version,
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "filename": filename,
+        "url": f"{SNAPSHOT_PUBLIC_URL.rstrip('/')}/{region}/{filename}",
+        "region": region,
+        "sha256": hashlib.sha256(compressed).hexdigest(),
+        "size": len(compressed),
+        "uncompressed_size": len(payload),
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    # El manifest se escribe después del bundle: nunca apunta a un archivo a medio escribir
+    _write_atomic(os.path.join(directory, MANIFEST_NAME), json.dumps(manifest).encode("utf-8"))
+    _prune(directory, keep={filename})
+    print(f"📦 Snapshot del catálogo {region} {version} ({len(compressed)} bytes)")
+    return manifest
@@ -1,10 +1,24 @@
 # app/celery.py
+import os
 from celery import Celery
+from app.redis_client import REDIS_URL
+from app.catalog_snapshot import SNAPSHOT_INTERVAL_SECONDS
+from app.product_purge import PURGE_INTERVAL_SECONDS
+from app.price_index import PRICE_INDEX_INTERVAL_SECONDS
+from app.generic_matching import GENERIC_MATCH_INTERVAL_SECONDS
+from app.price_cache import PRICE_CACHE_CHECK_SECONDS
+from app.image_store import IMAGE_CLEANUP_INTERVAL_SECONDS
+from app.deals_feed import DEALS_INTEREST_REBUILD_SECONDS
+from app.admin_stats import STATS_RECOUNT_SECONDS
+
+# Cada cuánto se vacía la cola de precios enviados por usuarios
+PRICE_QUEUE_DRAIN_SECONDS = float(os.getenv("PRICE_QUEUE_DRAIN_SECONDS", "5"))
 
 celery_app = Celery(
     "mastermarket_tasks",
-    broker="redis://localhost:6379/0",
-    backend="redis://localhost:6379/0"
+    broker=REDIS_URL,
+    backend=REDIS_URL,
+    include=["app.tasks"]
 )
 
 celery_app.conf.beat_schedule = {
@@ -12,4 +26,40 @@ celery_app.conf.beat_schedule = {
         'task': 'app.tasks.update_prices',
         'schedule': 3600.0,
     },
+    'drain-price-submissions': {
+        'task': 'app.tasks.drain_price_submissions',
+        'schedule': PRICE_QUEUE_DRAIN_SECONDS,
+    },
+    'build-catalog-snapshot': {
+        'task': 'app.tasks.build_catalog_snapshot',
+        'schedule': SNAPSHOT_INTERVAL_SECONDS,
+    },
+    'purge-deleted-products': {
+        'task': 'app.tasks.purge_deleted_products',
+        'schedule': PURGE_INTERVAL_SECONDS,
+    },
+    'update-price-index': {
+        'task': 'app.tasks.update_price_index',
+        'schedule': PRICE_INDEX_INTERVAL_SECONDS,
+    },
+    'match-generic-products': {
+        'task': 'app.tasks.match_generic_products',
+        'schedule': GENERIC_MATCH_INTERVAL_SECONDS,
+    },
+    'check-price-cache': {
+        'task': 'app.tasks.check_price_cache',
+        'schedule': PRICE_CACHE_CHECK_SECONDS,
+    },
+    'cleanup-orphan-images': {
+        'task': 'app.tasks.cleanup_orphan_images',
+        'schedule': IMAGE_CLEANUP_INTERVAL_SECONDS,
+    },
+    'rebuild-deals-interest-index': {
+        'task': 'app.tasks.rebuild_deals_interest_index',
+        'schedule': DEALS_INTEREST_REBUILD_SECONDS,
+    },
+    'recount-stats': {
+        'task': 'app.tasks.recount_stats',
+        'schedule': STATS_RECOUNT_SECONDS,
+    },
 }
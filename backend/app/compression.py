@@ -0,0 +1,193 @@
+# app/compression.py
+# Compresión gzip / Brotli negociada con Accept-Encoding para respuestas grandes
+# (catálogo, historial de precios) que viajan por redes móviles.
+# Las respuestas de catálogo cacheables se guardan en memoria junto con sus
+# versiones ya comprimidas, así los hits repetidos no vuelven a comprimir.
+# El cache es un LRU de RESPONSE_CACHE_MAX_ENTRIES entradas por worker: la clave
+# incluye el query string, que el cliente puede variar a gusto.
+# Comprimir un cuerpo de varios MB (/products/with-prices) lleva decenas de ms de CPU:
+# desde COMPRESSION_THREAD_MIN_SIZE se hace en el threadpool para no frenar el event loop.
+import gzip
+import os
+import threading
+import time
+from collections import OrderedDict
+import anyio.to_thread
+import brotli
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Niveles moderados: los más altos cuestan mucho CPU y ganan poco en JSON
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", str(256 * 1024)))
+RESPONSE_CACHE_SECONDS = float(os.getenv("RESPONSE_CACHE_SECONDS", "30"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-msgpack", "text/")
+CACHEABLE_PATHS = ("/products/all-simple", "/products/with-prices")
+# Una escritura bajo estos prefijos vacía el cache de este worker
+INVALIDATING_PREFIXES = ("/products", "/prices")
+
+def negotiate(accept_encoding: str):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        pieces = part.strip().split(";")
+        name = pieces[0].strip().lower()
+        q = 1.0
+        for param in pieces[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name] = q
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    if len(body) < COMPRESSION_THREAD_MIN_SIZE:
+        return compress(body, encoding)
+    return await anyio.to_thread.run_sync(compress, body, encoding)
+
+class CachedResponse:
+    def __init__(self, status: int, headers: list, body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.encoded = {}
+        self.stored_at = time.monotonic()
+
+    async def body_for(self, encoding: str, minimum_size: int = COMPRESSION_MIN_SIZE) -> bytes:
+        if encoding is None or len(self.body) < minimum_size:
+            return self.body
+        if encoding not in self.encoded:
+            # Dos hits simultáneos pueden comprimir los dos; queda el último, es el mismo resultado
+            self.encoded[encoding] = await compress_async(self.body, encoding)
+        return self.encoded[encoding]
+
+def _header(headers, name: bytes):
+    for key, value in headers:
+        if key.lower() == name:
+            return value.decode("latin-1")
+    return None
+
+def _without(headers, *names: bytes):
+    return [(k, v) for k, v in headers if k.lower() not in names]
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, cacheable_paths=CACHEABLE_PATHS,
+                 cache_seconds: float = RESPONSE_CACHE_SECONDS, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cacheable_paths = cacheable_paths
+        self.cache_seconds = cache_seconds
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: CachedResponse, now: float) -> bool:
+        return now - entry.stored_at >= self.cache_seconds
+
+    def _get(self, cache_key):
+        with self._lock:
+            entry = self._cache.get(cache_key)
+            if entry is None:
+                return None
+            if self._expired(entry, time.monotonic()):
+                del self._cache[cache_key]
+                return None
+            self._cache.move_to_end(cache_key)
+            return entry
+
+    def _store(self, cache_key, entry: CachedResponse):
+        with self._lock:
+            self._cache[cache_key] = entry
+            self._cache.move_to_end(cache_key)
+            # Primero las vencidas, después las menos usadas
+            now = time.monotonic()
+            for key in [k for k, e in self._cache.items() if self._expired(e, now)]:
+                del self._cache[key]
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = scope.get("headers", [])
+        encoding = negotiate(_header(request_headers, b"accept-encoding") or "")
+        path = scope["path"]
+        method = scope["method"]
+        cache_key = None
+        # Un request perfilado (app/profiling.py) corre siempre contra la app
+        if method == "GET" and path in self.cacheable_paths and self.cache_seconds > 0 and not scope.get("profiling"):
+            # La región también puede venir en un header (app/regions.py)
+            cache_key = (path, scope.get("query_string", b""), _header(request_headers, b"x-region"))
+            cached = self._get(cache_key)
+            if cached:
+                await self._send_cached(cached, encoding, send)
+                return
+
+        start = {}
+        chunks = []
+        passthrough = False
+
+        async def capture(message):
+            nonlocal passthrough
+            if message["type"] == "http.response.start":
+                start.update(message)
+                headers = message.get("headers", [])
+                content_type = _header(headers, b"content-type") or ""
+                # Archivos, streams y respuestas ya comprimidas pasan tal cual
+                if _header(headers, b"content-encoding") or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                await self._finish(start, b"".join(chunks), encoding, cache_key, send)
+
+        await self.app(scope, receive, capture)
+
+        if method not in ("GET", "HEAD", "OPTIONS") and path.startswith(INVALIDATING_PREFIXES):
+            with self._lock:
+                self._cache.clear()
+
+    async def _finish(self, start: dict, body: bytes, encoding, cache_key, send):
+        status = start["status"]
+        headers = _without(start.get("headers", []), b"content-length")
+        if cache_key is not None and status == 200:
+            entry = CachedResponse(status, headers, body)
+            self._store(cache_key, entry)
+            await self._send_cached(entry, encoding, send)
+            return
+
+        if encoding and len(body) >= self.minimum_size:
+            body = await compress_async(body, encoding)
+            headers = headers + [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_cached(self, entry: CachedResponse, encoding, send):
+        body = await entry.body_for(encoding, self.minimum_size)
+        headers = list(entry.headers)
+        if body is not entry.body:
+            headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": entry.status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
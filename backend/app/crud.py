@@ -1,138 +1,551 @@
-from sqlalchemy.orm import Session
-from app.models import Price, PriceHistory, Product, Basket, GenericProduct
-from app.schemas import PriceCreate, PriceUpdate, ProductCreate, ProductUpdate, BasketCreate, BasketUpdate, ProductSummaryResponse, ProductSummaryItem
+import math
+from sqlalchemy import insert, select, func
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy.exc import IntegrityError
+from collections import namedtuple
+from uuid import uuid4
+from app.models import Price, PriceHistory, Product, Basket, GenericProduct, PriceSubmission, PriceQuarantine, ProductPurge, GenericMatchSuggestion, PRODUCT_IS_LIVE
+from app.schemas import PriceCreate, PriceUpdate, ProductCreate, ProductUpdate, BasketCreate, BasketUpdate, ProductSummaryResponse, ProductSummaryItem, BestValueItem
 from datetime import datetime, timezone
 from app.models import User
 from app.schemas import UserCreate, UserUpdate, ProductOrGenericOut
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from app.models import Price
+from app.supermarkets import get_supermarket_id, get_supermarket_name, get_supermarket_region
+from app.database import DEFAULT_REGION, session_database
+from app.price_events import publish_price_events, price_event
+from app.price_cache import write_prices, invalidate_products, get_current_prices
+from app.deals_feed import is_price_drop, refresh_interest
+from app.admin_stats import record
+from app.celery import celery_app
+from app.units import to_base, unit_price
+from app.fieldsets import load_only_columns
+from app.price_validation import detect_outliers, REASONS
 from . import models, schemas
 
 # ---------- PRICE ----------
 
-def create_price(db: Session, price: PriceCreate):
-    existing = db.query(Price).filter_by(
-        product_id=price.product_id,
-        supermarket=price.supermarket
-    ).first()
-
-    if existing:
-        # Guardar el precio anterior en PriceHistory
-        history = PriceHistory(
-            product_id=existing.product_id,
-            supermarket=existing.supermarket,
-            price=existing.price,
-            recorded_at=existing.updated_at  # o datetime.utcnow() si preferís
-        )
-        db.add(history)
-
-        # Actualizar el precio actual
-        existing.price = price.price
-        existing.updated_at = datetime.now(timezone.utc)
-        db.commit()
-        db.refresh(existing)
-        return existing
-    else:
-        # Crear nuevo precio si no existía
-        new_price = Price(
-            product_id=price.product_id,
-            supermarket=price.supermarket,
-            price=price.price,
-            updated_at=datetime.now(timezone.utc)
-        )
-        db.add(new_price)
-        db.commit()
-        db.refresh(new_price)
-        return new_price
-
-def update_price(db: Session, price_id: int, new_price: float):
-    db_price = db.query(Price).filter(Price.id == price_id).first()
+# Un cambio de precio ya resuelto a ids: (producto, supermercado, precio, momento)
+PriceChange = namedtuple("PriceChange", "product_id supermarket_id price at")
+
+# Aplica varios cambios de precio en la sesión (sin commit): guarda el precio
+# anterior en PriceHistory y actualiza o crea la fila de Price. Carga los precios
+# actuales y las cantidades de todos los productos del lote en dos queries.
+# Cada fila va a la partición de la región de su supermercado.
+def apply_price_changes(db: Session, changes: list[PriceChange]) -> list[Price]:
+    product_ids = {c.product_id for c in changes}
+    regions = {c.supermarket_id: get_supermarket_region(db, c.supermarket_id) for c in changes}
+    base_quantities = dict(
+        db.query(Product.id, Product.base_quantity).filter(Product.id.in_(product_ids)).all()
+    )
+    current = {
+        (p.product_id, p.supermarket_id): p
+        for p in db.query(Price).filter(Price.product_id.in_(product_ids), Price.region.in_(set(regions.values()))).all()
+    }
+
+    touched = {}
+    for change in sorted(changes, key=lambda c: c.at):
+        key = (change.product_id, change.supermarket_id)
+        existing = current.get(key)
+        if existing:
+            # El precio de antes del lote (si el lote cambia dos veces el mismo, el primero)
+            if key not in touched:
+                existing.previous_price = existing.price
+            # Guardar el precio anterior en PriceHistory
+            db.add(PriceHistory(
+                product_id=existing.product_id,
+                supermarket_id=existing.supermarket_id,
+                region=existing.region,
+                price=existing.price,
+                recorded_at=existing.updated_at
+            ))
+            record(db, "price_history")
+            existing.price = change.price
+            existing.unit_price = unit_price(change.price, base_quantities.get(change.product_id))
+            existing.updated_at = change.at
+        else:
+            # Crear nuevo precio si no existía
+            existing = Price(
+                product_id=change.product_id,
+                supermarket_id=change.supermarket_id,
+                region=regions[change.supermarket_id],
+                price=change.price,
+                unit_price=unit_price(change.price, base_quantities.get(change.product_id)),
+                updated_at=change.at
+            )
+            db.add(existing)
+            record(db, f"prices:{change.supermarket_id}")
+            current[key] = existing
+        touched[key] = existing
+    db.flush()
+    return list(touched.values())
+
+# Eventos de los precios tocados, armados con una sola query antes del commit
+def _price_events(db: Session, db_prices: list[Price]) -> list[dict]:
+    generic_ids = dict(
+        db.query(Product.id, Product.generic_product_id)
+        .filter(Product.id.in_({p.product_id for p in db_prices}))
+        .all()
+    )
+    return [
+        price_event(p, generic_ids.get(p.product_id), get_supermarket_name(db, p.supermarket_id))
+        for p in db_prices
+    ]
+
+# Todo lo que tiene que pasar después de que un cambio de precio quedó commiteado
+def _after_price_commit(db: Session, events: list[dict]):
+    write_prices(session_database(db), events)
+    publish_price_events(events)
+    _enqueue_deals([e for e in events if is_price_drop(e)])
+
+# Las bajadas de precio van al feed de ofertas en segundo plano (fan-out en Celery)
+def _enqueue_deals(drops: list[dict]):
+    if not drops:
+        return
+    try:
+        celery_app.send_task("app.tasks.fan_out_deals", args=[drops], retry=False)
+    except Exception as e:
+        print(f"⚠️ No se pudieron encolar las ofertas del feed: {e}")
+
+def update_price(db: Session, price_id: int, new_price: float, region: str = None):
+    query = db.query(Price).filter(Price.id == price_id)
+    if region is not None:
+        query = query.filter(Price.region == region)
+    db_price = query.first()
     if not db_price:
         return None
+    db_price.previous_price = db_price.price
     db_price.price = new_price
+    db_price.unit_price = unit_price(new_price, db_price.product.base_quantity if db_price.product else None)
     db_price.updated_at = datetime.now(timezone.utc)
+    db.flush()
+    events = _price_events(db, [db_price])
     db.commit()
     db.refresh(db_price)
+    _after_price_commit(db, events)
     return db_price
 
-def get_prices_by_product_id(db: Session, product_id: int):
-    return db.query(Price).filter(Price.product_id == product_id).all()
+# ---------- PRICE SUBMISSIONS (write-behind) ----------
 
-def get_prices(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Price).offset(skip).limit(limit).all()
-    
+# Encola un precio enviado por un usuario para un supermercado que ya existe en la
+# región (supermarket_id resuelto por la ruta). Si el cliente reintenta con la misma
+# Idempotency-Key se devuelve la misma submission en vez de crear otra.
+def enqueue_price_submission(db: Session, price: PriceCreate, supermarket_id: int,
+                             idempotency_key: str = None) -> PriceSubmission:
+    idempotency_key = idempotency_key or uuid4().hex
+    existing = db.query(PriceSubmission).filter(PriceSubmission.idempotency_key == idempotency_key).first()
+    if existing:
+        return existing
+    if db.query(Product.id).filter(Product.id == price.product_id, PRODUCT_IS_LIVE).first() is None:
+        return None
+
+    submission = PriceSubmission(
+        idempotency_key=idempotency_key,
+        product_id=price.product_id,
+        supermarket_id=supermarket_id,
+        price=price.price,
+        submitted_at=datetime.now(timezone.utc),
+        status="pending"
+    )
+    db.add(submission)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Reintento concurrente con la misma key
+        db.rollback()
+        return db.query(PriceSubmission).filter(PriceSubmission.idempotency_key == idempotency_key).one()
+    db.refresh(submission)
+    return submission
+
+# Toma un lote de submissions pendientes, junta las del mismo (producto, supermercado)
+# que caen dentro de window_seconds y las aplica en una transacción. Se validan todas
+# antes de juntarlas: gana la última que no es anómala, y si la última del grupo es
+# anómala va a cuarentena. Devuelve cuántas submissions se procesaron.
+def apply_pending_price_submissions(db: Session, limit: int = 500, window_seconds: float = 60) -> int:
+    pending = (
+        db.query(PriceSubmission)
+        .filter(PriceSubmission.status == "pending")
+        .order_by(PriceSubmission.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not pending:
+        return 0
+
+    groups = []
+    by_key = {}
+    for submission in sorted(pending, key=lambda s: (s.product_id, s.supermarket_id, s.submitted_at)):
+        key = (submission.product_id, submission.supermarket_id)
+        group = by_key.get(key)
+        if group and (submission.submitted_at - group[0].submitted_at).total_seconds() <= window_seconds:
+            group.append(submission)
+        else:
+            group = [submission]
+            by_key[key] = group
+            groups.append(group)
+
+    # Validación: los precios anómalos van a cuarentena en vez de aplicarse
+    reasons, reference = detect_outliers(
+        db,
+        [s.product_id for s in pending],
+        [s.supermarket_id for s in pending],
+        [s.price for s in pending],
+    )
+    checks = {s.id: (int(reason), reference_price) for s, reason, reference_price in zip(pending, reasons, reference)}
+
+    now = datetime.now(timezone.utc)
+    changes = []
+    quarantined = []
+    for group in groups:
+        valid = [s for s in group if not checks[s.id][0]]
+        winner = valid[-1] if valid else None
+        latest = group[-1]
+        if winner is not None:
+            changes.append(PriceChange(winner.product_id, winner.supermarket_id, winner.price, winner.submitted_at))
+        if latest is not winner:
+            reason, reference_price = checks[latest.id]
+            quarantined.append({
+                "product_id": latest.product_id,
+                "supermarket_id": latest.supermarket_id,
+                "price": latest.price,
+                "reference_price": None if math.isnan(reference_price) else float(reference_price),
+                "reason": REASONS[reason],
+                "submission_id": latest.id,
+                "submitted_at": latest.submitted_at,
+                "status": "pending",
+            })
+        for submission in group:
+            if submission is winner:
+                submission.status = "applied"
+            elif submission is latest:
+                submission.status = "quarantined"
+            else:
+                submission.status = "coalesced"
+            submission.processed_at = now
+    if quarantined:
+        db.execute(insert(PriceQuarantine), quarantined)
+
+    db_prices = apply_price_changes(db, changes) if changes else []
+    events = _price_events(db, db_prices) if db_prices else []
+    db.commit()
+    _after_price_commit(db, events)
+    return len(pending)
+
+# ---------- PRICE QUARANTINE ----------
+
+# SQLite devuelve fechas sin zona; para comparar se usan todas como UTC naive
+def _naive(value: datetime) -> datetime:
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def get_quarantined_prices(db: Session, status: str = "pending", skip: int = 0, limit: int = 100):
+    return (
+        db.query(PriceQuarantine)
+        .filter(PriceQuarantine.status == status)
+        .order_by(PriceQuarantine.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+# Aprobar aplica el precio. Si mientras tanto llegó un precio más nuevo para ese
+# supermercado, el aprobado solo se guarda en el historial con su fecha original.
+def approve_quarantined_price(db: Session, quarantine_id: int, reviewer_id: int):
+    item = db.query(PriceQuarantine).filter(PriceQuarantine.id == quarantine_id).first()
+    if not item or item.status != "pending":
+        return None
+
+    current = db.query(Price).filter_by(
+        product_id=item.product_id, supermarket_id=item.supermarket_id,
+        region=get_supermarket_region(db, item.supermarket_id),
+    ).first()
+    events = []
+    if current and current.updated_at and _naive(current.updated_at) > _naive(item.submitted_at):
+        db.add(PriceHistory(
+            product_id=item.product_id,
+            supermarket_id=item.supermarket_id,
+            region=get_supermarket_region(db, item.supermarket_id),
+            price=item.price,
+            recorded_at=item.submitted_at
+        ))
+        record(db, "price_history")
+    else:
+        db_prices = apply_price_changes(db, [
+            PriceChange(item.product_id, item.supermarket_id, item.price, datetime.now(timezone.utc))
+        ])
+        events = _price_events(db, db_prices)
+
+    item.status = "approved"
+    item.reviewed_by = reviewer_id
+    item.reviewed_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(item)
+    _after_price_commit(db, events)
+    return item
+
+def reject_quarantined_price(db: Session, quarantine_id: int, reviewer_id: int):
+    item = db.query(PriceQuarantine).filter(PriceQuarantine.id == quarantine_id).first()
+    if not item or item.status != "pending":
+        return None
+    item.status = "rejected"
+    item.reviewed_by = reviewer_id
+    item.reviewed_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(item)
+    return item
+
+# Los precios de productos borrados quedan ocultos hasta que la purga los elimina.
+# Con region, la query solo toca la partición de esa región.
+def _live_prices(db: Session, fields=None, region: str = None):
+    query = (
+        db.query(Price)
+        .options(*load_only_columns(Price, fields))
+        .join(Product, Product.id == Price.product_id)
+        .filter(PRODUCT_IS_LIVE)
+    )
+    if region is not None:
+        query = query.filter(Price.region == region)
+    return query
+
+def get_price(db: Session, price_id: int, fields=None, region: str = None):
+    return _live_prices(db, fields, region).filter(Price.id == price_id).first()
+
+def get_prices_by_product_id(db: Session, product_id: int, region: str = None):
+    return _live_prices(db, region=region).filter(Price.product_id == product_id).all()
+
+def get_prices(db: Session, skip: int = 0, limit: int = 100, fields=None, region: str = None):
+    return _live_prices(db, fields, region).offset(skip).limit(limit).all()
+
+# Mejor precio por kg / l / unidad dentro de un genérico o una categoría.
+# Solo ordena por la columna precalculada unit_price, no calcula nada acá.
+# €/kg, €/l y €/unidad no se comparan entre sí: sin base_unit devuelve los mejores
+# `limit` de cada unidad base, ordenados por unidad y después por unit_price.
+def get_best_value(db: Session, generic_id: int = None, category: str = None, base_unit: str = None,
+                   limit: int = 10, region: str = None):
+    filters = [Price.unit_price.isnot(None), Product.base_unit.isnot(None), PRODUCT_IS_LIVE]
+    if region is not None:
+        filters.append(Price.region == region)
+    if generic_id is not None:
+        filters.append(Product.generic_product_id == generic_id)
+    if category is not None:
+        filters.append(Product.category == category)
+    if base_unit is not None:
+        filters.append(Product.base_unit == base_unit)
+
+    query = db.query(Price, Product).join(Product, Product.id == Price.product_id).filter(*filters)
+    if base_unit is not None:
+        rows = query.order_by(Price.unit_price.asc(), Price.id).limit(limit).all()
+    else:
+        ranked = (
+            select(
+                Price.id.label("price_id"),
+                func.row_number().over(
+                    partition_by=Product.base_unit, order_by=(Price.unit_price.asc(), Price.id)
+                ).label("rank"),
+            )
+            .join(Product, Product.id == Price.product_id)
+            .where(*filters)
+            .subquery()
+        )
+        rows = (
+            query.join(ranked, ranked.c.price_id == Price.id)
+            .filter(ranked.c.rank <= limit)
+            .order_by(Product.base_unit, Price.unit_price.asc(), Price.id)
+            .all()
+        )
+    return [
+        BestValueItem(
+            product_id=product.id,
+            name=product.name,
+            brand=product.brand,
+            supermarket=price_obj.supermarket,
+            price=price_obj.price,
+            unit_price=price_obj.unit_price,
+            base_unit=product.base_unit,
+            net_quantity=product.net_quantity,
+            unit=product.unit,
+        )
+        for price_obj, product in rows
+    ]
 
 # ---------- PRICE HISTORY ----------
 
-def create_price_history(db: Session, price: PriceCreate, timestamp: datetime):
+# Supermercado desconocido: None (no se dan de alta desde acá)
+def create_price_history(db: Session, price: PriceCreate, timestamp: datetime, region: str = DEFAULT_REGION):
+    supermarket_id = get_supermarket_id(db, price.supermarket, region=region)
+    if supermarket_id is None:
+        return None
     db_price_history = PriceHistory(
         product_id=price.product_id,
-        supermarket=price.supermarket,
+        supermarket_id=supermarket_id,
+        region=region,
         price=price.price,
         recorded_at=timestamp
     )
     db.add(db_price_history)
+    record(db, "price_history")
     db.commit()
     db.refresh(db_price_history)
     return db_price_history
 
 # ---------- PRODUCT ----------
 
-def get_product(db: Session, product_id: int):
-    return db.query(Product).filter(Product.id == product_id).first()
+def get_product(db: Session, product_id: int, fields=None):
+    return db.query(Product).options(*load_only_columns(Product, fields)).filter(Product.id == product_id, PRODUCT_IS_LIVE).first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Product).offset(skip).limit(limit).all()
+def get_products(db: Session, skip: int = 0, limit: int = 100, fields=None):
+    return db.query(Product).options(*load_only_columns(Product, fields)).filter(PRODUCT_IS_LIVE).offset(skip).limit(limit).all()
+
+# Recalcula la cantidad normalizada del producto y el unit_price de todos sus precios
+def _apply_base_quantity(db: Session, db_product: Product):
+    db_product.base_quantity, db_product.base_unit = to_base(db_product.net_quantity, db_product.unit)
+    if db_product.id is not None:
+        base_quantity = db_product.base_quantity
+        db.query(Price).filter(Price.product_id == db_product.id).update(
+            {Price.unit_price: Price.price / base_quantity if base_quantity else None},
+            synchronize_session=False,
+        )
 
 def create_product(db: Session, product: ProductCreate):
     db_product = Product(**product.dict())
+    _apply_base_quantity(db, db_product)
     db.add(db_product)
+    record(db, "products")
     db.commit()
     db.refresh(db_product)
     return db_product
 
 def update_product(db: Session, product_id: int, product: ProductUpdate):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = db.query(Product).filter(Product.id == product_id, PRODUCT_IS_LIVE).first()
     if not db_product:
         return None
     for key, value in product.dict().items():
         setattr(db_product, key, value)
+    _apply_base_quantity(db, db_product)
     db.commit()
+    # El UPDATE de unit_price no pasa por write-through: los hashes se vuelven a llenar desde la base
+    invalidate_products(session_database(db), [product_id])
     db.refresh(db_product)
     return db_product
 
+# Borrado lógico: el producto deja de verse enseguida y una tarea de Celery
+# (app.product_purge) borra sus precios, historial y cestas por lotes
 def delete_product(db: Session, product_id: int):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+    db_product = db.query(Product).filter(Product.id == product_id, PRODUCT_IS_LIVE).first()
     if not db_product:
         return None
-    db.delete(db_product)
+    db_product.deleted_at = datetime.now(timezone.utc)
+    db.add(ProductPurge(product_id=product_id, status="queued"))
+    record(db, "products", -1)
     db.commit()
+    invalidate_products(session_database(db), [product_id])
+    db.refresh(db_product)
     return db_product
 
+def get_product_purges(db: Session, status: str = None, skip: int = 0, limit: int = 100):
+    query = db.query(ProductPurge)
+    if status:
+        query = query.filter(ProductPurge.status == status)
+    return query.order_by(ProductPurge.id.desc()).offset(skip).limit(limit).all()
+
+def get_product_purge(db: Session, purge_id: int):
+    return db.query(ProductPurge).filter(ProductPurge.id == purge_id).first()
+
+# Vuelve a encolar una purga fallida o cortada (la purga es idempotente)
+def retry_product_purge(db: Session, purge_id: int):
+    purge = get_product_purge(db, purge_id)
+    if not purge or purge.status == "done":
+        return None
+    purge.status = "queued"
+    purge.error = None
+    purge.finished_at = None
+    db.commit()
+    db.refresh(purge)
+    return purge
+
+# ---------- GENERIC MATCHING ----------
+
+def get_generic_match_suggestions(db: Session, status: str = "pending", min_score: float = None,
+                                  skip: int = 0, limit: int = 100):
+    query = db.query(GenericMatchSuggestion).filter(GenericMatchSuggestion.status == status)
+    if min_score is not None:
+        query = query.filter(GenericMatchSuggestion.score >= min_score)
+    return (
+        query.order_by(GenericMatchSuggestion.score.desc(), GenericMatchSuggestion.id)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
+
+# Aceptar asigna el genérico al producto y descarta las otras propuestas pendientes del producto
+def accept_generic_match(db: Session, suggestion_id: int, reviewer_id: int):
+    suggestion = db.query(GenericMatchSuggestion).filter(GenericMatchSuggestion.id == suggestion_id).first()
+    if not suggestion or suggestion.status != "pending":
+        return None
+    product = db.query(Product).filter(Product.id == suggestion.product_id, PRODUCT_IS_LIVE).first()
+    if not product:
+        return None
+    product.generic_product_id = suggestion.generic_product_id
+    suggestion.status = "accepted"
+    suggestion.reviewed_by = reviewer_id
+    suggestion.reviewed_at = datetime.now(timezone.utc)
+    db.query(GenericMatchSuggestion).filter(
+        GenericMatchSuggestion.product_id == suggestion.product_id,
+        GenericMatchSuggestion.status == "pending",
+        GenericMatchSuggestion.id != suggestion.id,
+    ).delete(synchronize_session=False)
+    db.commit()
+    db.refresh(suggestion)
+    return suggestion
+
+def reject_generic_match(db: Session, suggestion_id: int, reviewer_id: int):
+    suggestion = db.query(GenericMatchSuggestion).filter(GenericMatchSuggestion.id == suggestion_id).first()
+    if not suggestion or suggestion.status != "pending":
+        return None
+    suggestion.status = "rejected"
+    suggestion.reviewed_by = reviewer_id
+    suggestion.reviewed_at = datetime.now(timezone.utc)
+    db.commit()
+    db.refresh(suggestion)
+    return suggestion
+
 # ---------- BASKET ----------
 
 def get_basket(db: Session, basket_id: int):
     return db.query(Basket).filter(Basket.id == basket_id).first()
 
 def get_baskets(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Basket).offset(skip).limit(limit).all()
+    return (
+        db.query(Basket)
+        .join(Product, Product.id == Basket.product_id)
+        .filter(PRODUCT_IS_LIVE)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 def create_basket(db: Session, basket: BasketCreate):
     db_basket = Basket(**basket.dict())
     db.add(db_basket)
     db.commit()
     db.refresh(db_basket)
+    refresh_interest(db, db_basket.user_id, [db_basket.product_id])
     return db_basket
 
 def update_basket(db: Session, basket_id: int, basket: BasketUpdate):
     db_basket = db.query(Basket).filter(Basket.id == basket_id).first()
     if not db_basket:
         return None
+    old_user_id, old_product_id = db_basket.user_id, db_basket.product_id
     for key, value in basket.dict().items():
         setattr(db_basket, key, value)
     db.commit()
     db.refresh(db_basket)
+    # Índice del feed de ofertas: lo de antes y lo de después del cambio
+    if old_user_id != db_basket.user_id:
+        refresh_interest(db, old_user_id, [old_product_id])
+    refresh_interest(db, db_basket.user_id, {old_product_id, db_basket.product_id})
     return db_basket
 
 def delete_basket(db: Session, basket_id: int):
@@ -141,6 +554,7 @@ def delete_basket(db: Session, basket_id: int):
         return None
     db.delete(db_basket)
     db.commit()
+    refresh_interest(db, db_basket.user_id, [db_basket.product_id])
     return db_basket
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -166,6 +580,7 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
         is_premium=user.is_premium
     )
     db.add(db_user)
+    record(db, "users")
     db.commit()
     db.refresh(db_user)
     return db_user
@@ -201,9 +616,19 @@ def update_user(db: Session, user_id: int, update_data: dict) -> models.User:
     db.commit()
     db.refresh(user)
     return user
-# Busca producto y precio tanto si es producto o generico
-def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
-    product = db.query(Product).filter(Product.id == product_id).first()
+# Columnas de Product que usa el resumen (no hace falta traer description)
+SUMMARY_PRODUCT_COLUMNS = load_only(
+    Product.id, Product.name, Product.category, Product.brand, Product.barcode,
+    Product.image_url, Product.base_unit, Product.generic_product_id,
+)
+
+# Precio más reciente entre los del cache (updated_at en isoformat, ordena como texto)
+def _latest_price(prices: list[dict]):
+    return max(prices, key=lambda p: p["updated_at"] or "", default=None)
+
+# Busca producto y precio tanto si es producto o generico (precios de la región)
+def get_product_summary(db: Session, product_id: int, region: str) -> ProductSummaryResponse:
+    product = db.query(Product).options(SUMMARY_PRODUCT_COLUMNS).filter(Product.id == product_id, PRODUCT_IS_LIVE).first()
 
     if product:
         # Si el producto tiene un genérico asociado y es distinto de 0/null
@@ -212,23 +637,21 @@ def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
             generic = db.query(GenericProduct).filter(GenericProduct.id == generic_id).first()
             if not generic:
                 return None
-            products = db.query(Product).filter(Product.generic_product_id == generic_id).all()
+            products = db.query(Product).options(SUMMARY_PRODUCT_COLUMNS).filter(Product.generic_product_id == generic_id, PRODUCT_IS_LIVE).all()
             product_summaries = []
+            current = get_current_prices(db, [p.id for p in products], region)
             for p in products:
-                price_obj = (
-                    db.query(Price)
-                    .filter(Price.product_id == p.id)
-                    .order_by(Price.updated_at.desc())
-                    .first()
-                )
+                price_obj = _latest_price(current[p.id])
                 product_summaries.append(ProductSummaryItem(
                     id=p.id,
                     name=p.name,
                     brand=p.brand,
                     barcode=p.barcode,
                     image_url=p.image_url,
-                    supermarket=price_obj.supermarket,  # Cambia aquí si tienes otro campo para supermarket
-                    last_price=price_obj.price if price_obj else None
+                    supermarket=price_obj["supermarket"] if price_obj else None,
+                    last_price=price_obj["price"] if price_obj else None,
+                    unit_price=price_obj["unit_price"] if price_obj else None,
+                    base_unit=p.base_unit
                 ))
             return ProductSummaryResponse(
                 id=generic.id,
@@ -239,7 +662,7 @@ def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
             )
         else:
             # Producto simple (sin genérico asociado)
-            prices = db.query(Price).filter(Price.product_id == product.id).all()
+            prices = get_current_prices(db, [product.id], region)[product.id]
             product_summaries = []
             for price_obj in prices:
                 product_summaries.append(ProductSummaryItem(
@@ -248,8 +671,10 @@ def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
                     brand=product.brand,
                     barcode=product.barcode,
                     image_url=product.image_url,
-                    supermarket=price_obj.supermarket,
-                    last_price=price_obj.price
+                    supermarket=price_obj["supermarket"],
+                    last_price=price_obj["price"],
+                    unit_price=price_obj["unit_price"],
+                    base_unit=product.base_unit
                 ))
             return ProductSummaryResponse(
                 id=product.id,
@@ -262,23 +687,21 @@ def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
     # Si no existe el producto, busca el genérico por ese ID
     generic = db.query(GenericProduct).filter(GenericProduct.id == product_id).first()
     if generic:
-        products = db.query(Product).filter(Product.generic_product_id == generic.id).all()
+        products = db.query(Product).options(SUMMARY_PRODUCT_COLUMNS).filter(Product.generic_product_id == generic.id, PRODUCT_IS_LIVE).all()
         product_summaries = []
+        current = get_current_prices(db, [p.id for p in products], region)
         for p in products:
-            price_obj = (
-                db.query(Price)
-                .filter(Price.product_id == p.id)
-                .order_by(Price.updated_at.desc())
-                .first()
-            )
+            price_obj = _latest_price(current[p.id])
             product_summaries.append(ProductSummaryItem(
                 id=p.id,
                 name=p.name,
                 brand=p.brand,
                 barcode=p.barcode,
                 image_url=p.image_url,
-                supermarket=price_obj.supermarket,  # Cambia aquí si tienes otro campo para supermarket
-                last_price=price_obj.price if price_obj else None
+                supermarket=price_obj["supermarket"] if price_obj else None,
+                last_price=price_obj["price"] if price_obj else None,
+                unit_price=price_obj["unit_price"] if price_obj else None,
+                base_unit=p.base_unit
             ))
         return ProductSummaryResponse(
             id=generic.id,
@@ -292,11 +715,22 @@ def get_product_summary(db: Session, product_id: int) -> ProductSummaryResponse:
 
 
 
-def get_all_simple_products(db: Session) -> list[ProductOrGenericOut]:
+# Valores fijos de los campos que GenericProduct no tiene
+GENERIC_FIELD_DEFAULTS = {"brand": "", "quantity": None, "barcode": ""}
+
+def get_all_simple_products(db: Session, fields=None) -> list[ProductOrGenericOut]:
     # Productos sin genérico
-    simple_products = db.query(Product).filter(Product.generic_product_id == None).all()
+    simple_products = db.query(Product).options(*load_only_columns(Product, fields)).filter(Product.generic_product_id == None, PRODUCT_IS_LIVE).all()
     # Genéricos
-    generic_products = db.query(GenericProduct).all()
+    generic_products = db.query(GenericProduct).options(*load_only_columns(GenericProduct, fields)).all()
+
+    if fields:
+        # Solo los campos pedidos, sin tocar columnas que no se cargaron
+        return [{f: getattr(p, f) for f in fields} for p in simple_products] + [
+            {f: GENERIC_FIELD_DEFAULTS[f] if f in GENERIC_FIELD_DEFAULTS else getattr(g, f) for f in fields}
+            for g in generic_products
+        ]
+
     all_products = []
 
     for p in simple_products:
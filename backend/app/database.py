@@ -1,13 +1,139 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event, text, Insert, Update, Delete
+from sqlalchemy.orm import sessionmaker, declarative_base, Session
+import json
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 DATABASE_URL = os.getenv('DATABASE_URL')
+# Réplicas de solo lectura separadas por comas, ej: postgresql://...@replica1/db,postgresql://...@replica2/db
+# Si está vacío, todas las lecturas van al primario como antes.
+DATABASE_REPLICA_URLS = [u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv('REPLICA_HEALTH_CHECK_SECONDS', '30'))
+
+# Regiones (países) con precios, ej: REGIONS=ie,gb,es. prices y price_history están
+# particionadas por región; la región por defecto es la de los datos de antes.
+DEFAULT_REGION = os.getenv('DEFAULT_REGION', 'ie')
+REGIONS = [r.strip() for r in os.getenv('REGIONS', DEFAULT_REGION).split(',') if r.strip()]
+# Regiones que viven en su propia base, ej: REGION_DATABASE_URLS='{"gb": "postgresql://...@db-gb/mastermarket"}'
+# Las que no están acá usan la base principal.
+REGION_DATABASE_URLS = json.loads(os.getenv('REGION_DATABASE_URLS', '{}'))
 
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# ---------- READ REPLICAS ----------
+
+# Round-robin sobre las réplicas, saltando las que fallaron el último health check
+class ReplicaPool:
+    def __init__(self, engines, check_interval: float):
+        self.engines = engines
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next = 0
+        self._healthy = {e: True for e in engines}
+        self._checked_at = {e: float("-inf") for e in engines}
+
+    def _is_healthy(self, replica) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at[replica] < self.check_interval:
+            return self._healthy[replica]
+        self._checked_at[replica] = now
+        try:
+            with replica.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            self._healthy[replica] = True
+        except Exception as e:
+            print(f"⚠️ Réplica {replica.url.render_as_string(hide_password=True)} no disponible: {e}")
+            self._healthy[replica] = False
+        return self._healthy[replica]
+
+    def mark_down(self, replica):
+        self._healthy[replica] = False
+        self._checked_at[replica] = time.monotonic()
+
+    def pick(self):
+        if not self.engines:
+            return None
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.engines)
+        for i in range(len(self.engines)):
+            replica = self.engines[(start + i) % len(self.engines)]
+            if self._is_healthy(replica):
+                return replica
+        # Ninguna réplica sana: el primario atiende las lecturas
+        return None
+
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in DATABASE_REPLICA_URLS]
+replicas = ReplicaPool(replica_engines, REPLICA_HEALTH_CHECK_SECONDS)
+
+def _watch_replica(replica):
+    @event.listens_for(replica, "handle_error")
+    def _on_error(context):
+        if context.is_disconnect:
+            replicas.mark_down(replica)
+
+for _replica in replica_engines:
+    _watch_replica(_replica)
+
+# ---------- REGIONES EN OTRA BASE ----------
+
+region_engines = {region: create_engine(url, pool_pre_ping=True) for region, url in REGION_DATABASE_URLS.items()}
+
+# Base de una región: la suya si tiene, si no MAIN_DATABASE. Cada base de región tiene
+# su propia copia del catálogo con los mismos ids, así que los caches que guardan ids
+# (supermercados en memoria, precios en Redis) van separados por base.
+MAIN_DATABASE = "main"
+
+def database_for_region(region: str) -> str:
+    return region if region in region_engines else MAIN_DATABASE
+
+# Una sesión por cada región que vive en su propia base: los cambios del catálogo
+# (que cada base tiene copiado con los mismos ids) se repiten en todas
+def region_database_sessions():
+    for region in region_engines:
+        db = SessionLocal(region=region)
+        try:
+            yield db
+        finally:
+            db.close()
+
+# Regiones cuyos precios viven en esa base
+def regions_in_database(database: str) -> list[str]:
+    return [r for r in REGIONS if database_for_region(r) == database]
+
+def session_database(db: Session) -> str:
+    return getattr(db, "database", MAIN_DATABASE)
+
+# Sesión que manda las lecturas a una réplica cuando se pide con use_replica=True.
+# Cualquier escritura (flush, INSERT/UPDATE/DELETE) fija la sesión al primario
+# para el resto del request, así una lectura posterior ve lo que se acaba de escribir.
+# Con region= de una región que vive en otra base, toda la sesión va a esa base
+# (tiene su propia copia del catálogo y solo los precios de su región).
+class RoutingSession(Session):
+    def __init__(self, *args, use_replica: bool = False, region: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.use_replica = use_replica
+        self.region_engine = region_engines.get(region)
+        self.database = database_for_region(region)
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.region_engine is not None:
+            return self.region_engine
+        if not self.use_replica:
+            return engine
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.use_replica = False
+            return engine
+        if self._replica is None:
+            # Una sola réplica por sesión para que todas las lecturas vean el mismo snapshot
+            self._replica = replicas.pick() or engine
+        return self._replica
+
+SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
@@ -17,3 +143,10 @@ def get_db():
     finally:
         db.close()
 
+# Para handlers GET de solo lectura: usa una réplica si hay alguna configurada y sana
+def get_read_db():
+    db = SessionLocal(use_replica=True)
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,192 @@
+# app/deals_feed.py
+# Feed "ofertas para vos", armado al escribir (fan-out on write) en vez de al leer.
+#
+# - Índice de interés en Redis: feed:interest:<base>:product:<id> y
+#   feed:interest:<base>:generic:<id> son sets con los usuarios que tienen ese producto
+#   (o uno de ese genérico) en la cesta. <base> es la base de la sesión
+#   (session_database): una región con su propia base tiene sus cestas y sus ids.
+#   crud lo actualiza en cada escritura de cesta; rebuild_interest_index lo rearma
+#   entero desde cada base (Redis no es la fuente de verdad).
+# - Cuando se commitea un lote de precios, crud encola fan_out_deals con las bajadas
+#   (cada evento lleva su región); la tarea abre la base de esa región, busca los
+#   usuarios interesados y agrega una entrada a feed:user:<id>, una lista acotada a
+#   FEED_MAX_ENTRIES con la más nueva primero.
+# - GET /feed solo lee esa lista: no toca la base.
+import json
+import os
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import session_database
+from app.models import Basket, Product, PRODUCT_IS_LIVE
+from app.redis_client import get_redis
+
+# Bajada mínima (fracción del precio anterior) para que un cambio cuente como oferta
+DEALS_MIN_DROP = float(os.getenv("DEALS_MIN_DROP", "0.05"))
+FEED_MAX_ENTRIES = int(os.getenv("FEED_MAX_ENTRIES", "200"))
+FEED_TTL_SECONDS = int(os.getenv("FEED_TTL_SECONDS", str(30 * 86400)))
+DEALS_INTEREST_REBUILD_SECONDS = float(os.getenv("DEALS_INTEREST_REBUILD_SECONDS", "86400"))
+# Usuarios por pipeline al repartir un lote
+FAN_OUT_CHUNK = 1000
+
+SEQUENCE_KEY = "feed:seq"
+
+def _interest_prefix(database: str) -> str:
+    return f"feed:interest:{database}:"
+
+def _product_key(database: str, product_id) -> str:
+    return f"{_interest_prefix(database)}product:{product_id}"
+
+def _generic_key(database: str, generic_id) -> str:
+    return f"{_interest_prefix(database)}generic:{generic_id}"
+
+def _feed_key(user_id) -> str:
+    return f"feed:user:{user_id}"
+
+def is_price_drop(event: dict) -> bool:
+    previous = event.get("previous_price")
+    return bool(previous) and event["price"] is not None and event["price"] <= previous * (1 - DEALS_MIN_DROP)
+
+# ---------- ÍNDICE DE INTERÉS ----------
+
+# Recalcula desde la base el interés de un usuario en estos productos (y sus genéricos).
+# Se llama después del commit de cualquier escritura de cesta, con los productos
+# de antes y de después del cambio.
+def refresh_interest(db: Session, user_id: int, product_ids):
+    product_ids = {p for p in product_ids if p is not None}
+    if user_id is None or not product_ids:
+        return
+    generics = dict(db.execute(
+        select(Product.id, Product.generic_product_id).where(Product.id.in_(product_ids))
+    ).all())
+    generic_ids = {g for g in generics.values() if g}
+    in_basket = db.execute(
+        select(Basket.product_id, Product.generic_product_id)
+        .join(Product, Product.id == Basket.product_id)
+        .where(Basket.user_id == user_id, PRODUCT_IS_LIVE, (
+            Basket.product_id.in_(product_ids) | Product.generic_product_id.in_(generic_ids)
+        ))
+    ).all()
+    kept_products = {p for p, _ in in_basket}
+    kept_generics = {g for _, g in in_basket if g}
+    database = session_database(db)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for product_id in product_ids:
+            if product_id in kept_products:
+                pipe.sadd(_product_key(database, product_id), user_id)
+            else:
+                pipe.srem(_product_key(database, product_id), user_id)
+        for generic_id in generic_ids:
+            if generic_id in kept_generics:
+                pipe.sadd(_generic_key(database, generic_id), user_id)
+            else:
+                pipe.srem(_generic_key(database, generic_id), user_id)
+        pipe.execute()
+    except Exception as e:
+        # El rebuild periódico lo corrige
+        print(f"⚠️ No se pudo actualizar el índice de interés del feed: {e}")
+
+# Solo los sets de la base de la sesión
+def rebuild_interest_index(db: Session) -> dict:
+    database = session_database(db)
+    interest = {}
+    rows = db.execute(
+        select(Basket.user_id, Basket.product_id, Product.generic_product_id)
+        .join(Product, Product.id == Basket.product_id)
+        .where(Basket.user_id.isnot(None), PRODUCT_IS_LIVE)
+    )
+    for user_id, product_id, generic_id in rows:
+        interest.setdefault(_product_key(database, product_id), set()).add(user_id)
+        if generic_id:
+            interest.setdefault(_generic_key(database, generic_id), set()).add(user_id)
+
+    redis_client = get_redis()
+    # Cada set se reemplaza en una transacción: nunca queda vacío a medio armar
+    keys = list(interest)
+    for i in range(0, len(keys), FAN_OUT_CHUNK):
+        pipe = redis_client.pipeline(transaction=True)
+        for key in keys[i:i + FAN_OUT_CHUNK]:
+            pipe.delete(key)
+            pipe.sadd(key, *interest[key])
+        pipe.execute()
+    stale = [k for k in redis_client.scan_iter(match=f"{_interest_prefix(database)}*", count=1000) if k not in interest]
+    for i in range(0, len(stale), FAN_OUT_CHUNK):
+        redis_client.delete(*stale[i:i + FAN_OUT_CHUNK])
+    stats = {"keys": len(keys), "removed": len(stale)}
+    print(f"🎯 Índice de interés del feed ({database}): {stats}")
+    return stats
+
+# ---------- FAN-OUT ----------
+
+# Reparte las bajadas de precio de un lote a los feeds de los usuarios interesados.
+# db es una sesión contra la base donde se escribieron esos precios.
+def fan_out_deals(db: Session, events: list[dict]) -> int:
+    drops = [e for e in events if is_price_drop(e)]
+    if not drops:
+        return 0
+    database = session_database(db)
+    redis_client = get_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    for event in drops:
+        pipe.smembers(_product_key(database, event["product_id"]))
+    direct_users = pipe.execute()
+    for event in drops:
+        if event.get("generic_product_id"):
+            pipe.smembers(_generic_key(database, event["generic_product_id"]))
+    generic_users = iter(pipe.execute())
+    members = [
+        (direct, next(generic_users) if event.get("generic_product_id") else set())
+        for event, direct in zip(drops, direct_users)
+    ]
+
+    names = dict(db.execute(
+        select(Product.id, Product.name).where(Product.id.in_({e["product_id"] for e in drops}), PRODUCT_IS_LIVE)
+    ).all())
+    # Numeración global de entradas, para paginar con ?before=
+    last_seq = redis_client.incrby(SEQUENCE_KEY, len(drops))
+    deliveries = []
+    for n, event in enumerate(drops):
+        if event["product_id"] not in names:
+            continue
+        direct, via_generic = members[n]
+        entry = {
+            "id": last_seq - len(drops) + n + 1,
+            "product_id": event["product_id"],
+            "product_name": names[event["product_id"]],
+            "generic_product_id": event.get("generic_product_id"),
+            "supermarket": event["supermarket"],
+            "region": event.get("region"),
+            "price": event["price"],
+            "previous_price": event["previous_price"],
+            "drop_pct": round(100 * (1 - event["price"] / event["previous_price"]), 1),
+            "updated_at": event["updated_at"],
+        }
+        for user_id in direct | via_generic:
+            reason = "basket" if user_id in direct else "generic"
+            deliveries.append((user_id, json.dumps({**entry, "reason": reason})))
+
+    for i in range(0, len(deliveries), FAN_OUT_CHUNK):
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id, entry in deliveries[i:i + FAN_OUT_CHUNK]:
+            key = _feed_key(user_id)
+            pipe.lpush(key, entry)
+            pipe.ltrim(key, 0, FEED_MAX_ENTRIES - 1)
+            pipe.expire(key, FEED_TTL_SECONDS)
+        pipe.execute()
+    return len(deliveries)
+
+# ---------- LECTURA ----------
+
+# Página del feed, la más nueva primero. before = id de la última entrada de la
+# página anterior (las entradas nuevas que llegan mientras tanto no desplazan la página).
+def get_feed(user_id: int, before: int = None, limit: int = 20) -> dict:
+    entries = [json.loads(e) for e in get_redis().lrange(_feed_key(user_id), 0, -1)]
+    # Dos lotes repartidos a la vez pueden intercalarse en la lista
+    entries.sort(key=lambda e: e["id"], reverse=True)
+    if before is not None:
+        entries = [e for e in entries if e["id"] < before]
+    page = entries[:limit]
+    return {
+        "entries": page,
+        "next_before": page[-1]["id"] if len(entries) > limit else None,
+    }
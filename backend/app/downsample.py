@@ -0,0 +1,65 @@
+# app/downsample.py
+# Reducción de series (x, y) a un máximo de puntos para gráficos, con NumPy.
+# Las funciones devuelven índices ordenados de los puntos que se conservan, así
+# quien llama elige qué columnas recortar. El primero y el último siempre quedan.
+#
+# - lttb: Largest-Triangle-Three-Buckets. Conserva la forma visual de la serie;
+#   cada bucket aporta el punto que forma el triángulo más grande con el punto
+#   elegido antes y el promedio del bucket siguiente.
+# - minmax: mínimo y máximo de cada bucket. Nunca pierde un pico ni una oferta,
+#   a cambio de ser más ruidoso que lttb.
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+
+# Bordes de n_buckets buckets sobre los puntos interiores [1, size - 1), más size al final.
+# Con enteros: en coma flotante el último borde puede quedar en size - 2 y el último
+# punto interior cae en un bucket de más.
+def _bucket_edges(size: int, n_buckets: int) -> np.ndarray:
+    edges = 1 + (np.arange(n_buckets + 1, dtype=np.int64) * (size - 2)) // n_buckets
+    return np.append(edges, size)
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    size = len(x)
+    if points >= size or points < 3:
+        return np.arange(size)
+    edges = _bucket_edges(size, points - 2)
+    # Promedio de cada bucket (y del último punto) de una vez, con reduceat
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x, edges[:-1]) / counts
+    avg_y = np.add.reduceat(y, edges[:-1]) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = a = 0
+    # Cada bucket depende del punto elegido en el anterior: el loop es por bucket,
+    # el cálculo dentro del bucket es vectorizado
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = size - 1
+    return selected
+
+def minmax(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    size = len(x)
+    if points >= size or points < 4:
+        return np.arange(size)
+    n_buckets = (points - 2) // 2
+    edges = _bucket_edges(size, n_buckets)[:-1]
+    interior = np.arange(1, size - 1)
+    bucket = np.searchsorted(edges, interior, side="right") - 1
+    # Ordenado por (bucket, y): el primero de cada bucket es el mínimo, el último el máximo
+    order = interior[np.lexsort((y[interior], bucket))]
+    sorted_bucket = bucket[order - 1]
+    starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
+    return np.unique(np.concatenate(([0], order[starts], order[ends], [size - 1])))
+
+def downsample(x: np.ndarray, y: np.ndarray, points: int, method: str = "lttb") -> np.ndarray:
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return lttb(x, y, points) if method == "lttb" else minmax(x, y, points)
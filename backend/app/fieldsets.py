@@ -0,0 +1,61 @@
+# app/fieldsets.py
+# Sparse fieldsets: ?fields=id,name,image_url recorta la respuesta a esos campos
+# y además le dice al ORM que cargue solo esas columnas (load_only), así las
+# vistas de lista no traen description ni nada que no muestran.
+from functools import lru_cache
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
+from sqlalchemy.orm import load_only
+
+# Campos de la respuesta que no son columnas directas del modelo ORM
+COMPUTED_FIELD_COLUMNS = {
+    "supermarket": ["supermarket_id"],
+}
+
+def parse_fields(fields: str, schema: type[BaseModel], always=("id",)):
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(schema.model_fields)}",
+        )
+    selected = [f for f in always if f in schema.model_fields]
+    return tuple(selected + [f for f in requested if f not in selected])
+
+# Opciones de query para cargar solo las columnas que necesitan los campos pedidos
+def load_only_columns(model, fields):
+    if not fields:
+        return []
+    columns = []
+    for field in fields:
+        for name in COMPUTED_FIELD_COLUMNS.get(field, [field]):
+            attr = getattr(model, name, None)
+            if attr is not None and hasattr(attr, "property") and hasattr(attr.property, "columns"):
+                columns.append(attr)
+    return [load_only(*columns)] if columns else []
+
+@lru_cache(maxsize=256)
+def _subset_adapter(schema: type[BaseModel], fields: tuple, many: bool) -> TypeAdapter:
+    subset = create_model(
+        f"{schema.__name__}Fields",
+        __config__=ConfigDict(from_attributes=True),
+        **{f: (schema.model_fields[f].annotation, schema.model_fields[f].default) for f in fields},
+    )
+    return TypeAdapter(list[subset] if many else subset)
+
+# Serializa objetos ORM (o schemas) con un modelo recortado a los campos pedidos
+def sparse_content(data, schema: type[BaseModel], fields: tuple):
+    many = isinstance(data, list)
+    adapter = _subset_adapter(schema, fields, many)
+    if many:
+        data = [d.model_dump() if isinstance(d, BaseModel) else d for d in data]
+    elif isinstance(data, BaseModel):
+        data = data.model_dump()
+    return adapter.dump_python(adapter.validate_python(data, from_attributes=True), mode="json")
+
+def sparse_response(data, schema: type[BaseModel], fields: tuple) -> JSONResponse:
+    return JSONResponse(content=sparse_content(data, schema, fields))
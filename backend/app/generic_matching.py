@@ -0,0 +1,225 @@
+# app/generic_matching.py
+# Propuestas automáticas de genérico para productos sin generic_product_id.
+#
+# 1. Normalización: minúsculas, sin acentos, sin la marca y sin cantidades ("500 g").
+# 2. Blocking: índice invertido token → genéricos (nombre del genérico + nombres de los
+#    productos ya asignados). Cada producto solo se compara con los genéricos con los
+#    que comparte algún token poco común; los tokens que aparecen en demasiados
+#    genéricos no sirven para bloquear y se ignoran.
+# 3. Scoring vectorizado: cada texto es un vector de trigramas de caracteres hasheados
+#    (feature hashing con signo, dimensión fija); la similitud coseno de todos los
+#    pares candidatos de un chunk se calcula de una vez con NumPy. Se suma un poco por
+#    misma categoría y misma unidad base (kg / l / unidad).
+# 4. Las mejores propuestas por producto quedan en generic_match_suggestions para que
+#    un admin las acepte o rechace. Un par rechazado no se vuelve a proponer.
+#
+# CLI: python -m app.generic_matching
+import argparse
+import os
+import re
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select, delete, insert
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Product, GenericProduct, GenericMatchSuggestion, PRODUCT_IS_LIVE
+
+GENERIC_MATCH_INTERVAL_SECONDS = float(os.getenv("GENERIC_MATCH_INTERVAL_SECONDS", "86400"))
+GENERIC_MATCH_MIN_SCORE = float(os.getenv("GENERIC_MATCH_MIN_SCORE", "0.55"))
+GENERIC_MATCH_PER_PRODUCT = int(os.getenv("GENERIC_MATCH_PER_PRODUCT", "3"))
+# Productos por chunk (acota la memoria de los vectores)
+GENERIC_MATCH_CHUNK = int(os.getenv("GENERIC_MATCH_CHUNK", "5000"))
+# Candidatos por producto que pasan del blocking al scoring
+MAX_CANDIDATES = 30
+# Un token presente en más de esta fracción de genéricos (y en más de BLOCK_MIN_DF)
+# no se usa para bloquear
+BLOCK_MAX_DF = 0.05
+BLOCK_MIN_DF = 50
+HASH_DIM = 512
+
+NAME_WEIGHT = 0.8
+CATEGORY_WEIGHT = 0.1
+UNIT_WEIGHT = 0.1
+
+_QUANTITY_RE = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:x\s*)?(?:mg|g|gr|grs|kg|ml|cl|l|ltr|units?|pcs?|u)?\b")
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {"de", "la", "el", "y", "con", "sin", "en", "the", "and", "of", "with", "for", "pack"}
+
+# ---------- NORMALIZACIÓN ----------
+
+def normalize_text(text: str, brand: str = None) -> str:
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    if brand:
+        for token in _TOKEN_RE.findall(normalize_text(brand)):
+            text = re.sub(rf"\b{re.escape(token)}\b", " ", text)
+    text = _QUANTITY_RE.sub(" ", text)
+    return " ".join(t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS and not t.isdigit())
+
+def tokens(text: str) -> set:
+    return {t for t in text.split() if len(t) > 1}
+
+# ---------- VECTORES ----------
+
+# Trigramas de caracteres hasheados a HASH_DIM columnas, con signo para que las
+# colisiones se cancelen en promedio. Filas normalizadas (coseno = producto punto).
+def hashed_trigram_vectors(texts: list[str]) -> np.ndarray:
+    rows, cols, signs = [], [], []
+    for i, text in enumerate(texts):
+        padded = f"  {text} "
+        for j in range(len(padded) - 2):
+            h = zlib.crc32(padded[j:j + 3].encode("utf-8"))
+            rows.append(i)
+            cols.append(h % HASH_DIM)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+    matrix = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+# ---------- ÍNDICE DE GENÉRICOS ----------
+
+class GenericIndex:
+    def __init__(self, db: Session):
+        generics = db.execute(
+            select(GenericProduct.id, GenericProduct.name, GenericProduct.category).order_by(GenericProduct.id)
+        ).all()
+        self.ids = np.array([g.id for g in generics], dtype=np.int64)
+        self.categories = [(g.category or "").strip().lower() for g in generics]
+        position = {g.id: i for i, g in enumerate(generics)}
+
+        # Perfil de cada genérico: su nombre + los nombres de los productos ya asignados
+        profiles = [[normalize_text(g.name)] for g in generics]
+        units = [Counter() for _ in generics]
+        members = db.execute(
+            select(Product.generic_product_id, Product.name, Product.brand, Product.base_unit)
+            .where(Product.generic_product_id.isnot(None), PRODUCT_IS_LIVE)
+        )
+        for generic_id, name, brand, base_unit in members:
+            i = position.get(generic_id)
+            if i is None:
+                continue
+            profiles[i].append(normalize_text(name, brand))
+            if base_unit:
+                units[i][base_unit] += 1
+        # Unidad base más común entre los productos del genérico
+        self.units = [u.most_common(1)[0][0] if u else None for u in units]
+
+        texts = [" ".join(dict.fromkeys(" ".join(p).split())) for p in profiles]
+        self.vectors = hashed_trigram_vectors(texts)
+
+        postings = defaultdict(list)
+        for i, text in enumerate(texts):
+            for token in tokens(text):
+                postings[token].append(i)
+        max_df = max(BLOCK_MIN_DF, int(len(generics) * BLOCK_MAX_DF))
+        self.postings = {t: ids for t, ids in postings.items() if len(ids) <= max_df}
+
+    def candidates(self, product_tokens: set) -> list[int]:
+        counts = Counter()
+        for token in product_tokens:
+            for i in self.postings.get(token, ()):
+                counts[i] += 1
+        return [i for i, _ in counts.most_common(MAX_CANDIDATES)]
+
+# ---------- MATCHING ----------
+
+# Devuelve las sugerencias de un chunk de productos: [(product_id, generic_id, score, rank)]
+def score_chunk(index: GenericIndex, products: list) -> list[tuple]:
+    texts = [normalize_text(p.name, p.brand) for p in products]
+    pair_product, pair_generic = [], []
+    for i, text in enumerate(texts):
+        for g in index.candidates(tokens(text)):
+            pair_product.append(i)
+            pair_generic.append(g)
+    if not pair_product:
+        return []
+
+    pair_product = np.array(pair_product)
+    pair_generic = np.array(pair_generic)
+    vectors = hashed_trigram_vectors(texts)
+    name_score = np.einsum("ij,ij->i", vectors[pair_product], index.vectors[pair_generic])
+
+    product_categories = np.array([(p.category or "").strip().lower() for p in products], dtype=object)
+    generic_categories = np.array(index.categories, dtype=object)
+    pc = product_categories[pair_product]
+    same_category = ((pc == generic_categories[pair_generic]) & (pc != "")).astype(np.float32)
+
+    product_units = np.array([p.base_unit for p in products], dtype=object)
+    generic_units = np.array(index.units, dtype=object)
+    pu, gu = product_units[pair_product], generic_units[pair_generic]
+    # Sin unidad conocida de un lado no se penaliza
+    same_unit = ((pu == None) | (gu == None) | (pu == gu)).astype(np.float32)  # noqa: E711
+
+    score = NAME_WEIGHT * name_score + CATEGORY_WEIGHT * same_category + UNIT_WEIGHT * same_unit
+    keep = score >= GENERIC_MATCH_MIN_SCORE
+    pair_product, pair_generic, score = pair_product[keep], pair_generic[keep], score[keep]
+
+    # Mejores GENERIC_MATCH_PER_PRODUCT por producto: ordenar por (producto, -score)
+    order = np.lexsort((-score, pair_product))
+    pair_product, pair_generic, score = pair_product[order], pair_generic[order], score[order]
+    starts = np.searchsorted(pair_product, pair_product, side="left")
+    rank = np.arange(len(pair_product)) - starts + 1
+    keep = rank <= GENERIC_MATCH_PER_PRODUCT
+
+    return [
+        (products[p].id, int(index.ids[g]), round(float(s), 4), int(r))
+        for p, g, s, r in zip(pair_product[keep], pair_generic[keep], score[keep], rank[keep])
+    ]
+
+def run_matching(db: Session, chunk_size: int = GENERIC_MATCH_CHUNK) -> dict:
+    index = GenericIndex(db)
+    totals = {"products": 0, "suggestions": 0, "generics": len(index.ids)}
+    if not len(index.ids):
+        return totals
+
+    rejected = set(db.execute(
+        select(GenericMatchSuggestion.product_id, GenericMatchSuggestion.generic_product_id)
+        .where(GenericMatchSuggestion.status == "rejected")
+    ).all())
+    # Las pendientes se regeneran en cada corrida
+    db.execute(delete(GenericMatchSuggestion).where(GenericMatchSuggestion.status == "pending"))
+
+    last_id = 0
+    now = datetime.now(timezone.utc)
+    while True:
+        products = db.execute(
+            select(Product.id, Product.name, Product.brand, Product.category, Product.base_unit)
+            .where(Product.generic_product_id.is_(None), PRODUCT_IS_LIVE, Product.id > last_id)
+            .order_by(Product.id)
+            .limit(chunk_size)
+        ).all()
+        if not products:
+            break
+        last_id = products[-1].id
+        rows = [
+            {"product_id": p, "generic_product_id": g, "score": s, "rank": r, "status": "pending", "created_at": now}
+            for p, g, s, r in score_chunk(index, products)
+            if (p, g) not in rejected
+        ]
+        if rows:
+            db.execute(insert(GenericMatchSuggestion), rows)
+        totals["products"] += len(products)
+        totals["suggestions"] += len(rows)
+
+    db.commit()
+    print(f"🔗 Matching de genéricos: {totals['products']} productos, {totals['suggestions']} sugerencias")
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Proponer genéricos para productos sin asignar")
+    parser.add_argument("--chunk-size", type=int, default=GENERIC_MATCH_CHUNK)
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        run_matching(db, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+# app/image_store.py
+# Imágenes direccionadas por contenido. Cada subida se hashea antes de hacer nada:
+# - sha256 de los bytes: la misma foto subida otra vez devuelve la url existente
+#   sin decodificar, recomprimir ni volver a subir.
+# - dHash (hash perceptual de 64 bits): la misma foto recomprimida o achicada por
+#   otro teléfono también se reconoce y reutiliza la url existente. La búsqueda usa
+#   las 4 bandas de 16 bits indexadas y después la distancia de Hamming con NumPy.
+# Las dos búsquedas son dentro del mismo storage: una subida a S3 no recibe una url
+# local del worker (ni una local un JPEG de S3).
+# Las imágenes nuevas se guardan como images/<sha256>.<ext> (local o S3), así dos
+# subidas iguales en paralelo escriben el mismo archivo.
+# cleanup_orphan_images (tarea de Celery) cuenta las referencias desde productos y
+# genéricos y borra las que no usa nadie.
+import io
+import os
+import hashlib
+from datetime import datetime, timedelta, timezone
+import boto3
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import select, delete, or_, exists
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import StoredImage, Product, GenericProduct
+
+# Ruta absoluta a static/images
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+UPLOAD_DIR = os.path.abspath(os.path.join(BASE_DIR, "static", "images"))
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+#  AWS S3 config
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_S3_BUCKET_NAME = os.getenv("AWS_S3_BUCKET")
+AWS_REGION = os.getenv("AWS_REGION", "eu-west-1")
+
+s3 = boto3.client("s3",
+                  region_name=AWS_REGION,
+                  aws_access_key_id=AWS_ACCESS_KEY_ID,
+                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
+
+# Distancia de Hamming máxima entre dHash para considerar dos fotos la misma.
+# Con 4 bandas, hasta 3 bits distintos se encuentran siempre.
+IMAGE_DHASH_MAX_DISTANCE = int(os.getenv("IMAGE_DHASH_MAX_DISTANCE", "3"))
+# Una imagen sin referencias se borra recién después de este margen desde su
+# última subida (el cliente sube la foto antes de crear el producto)
+IMAGE_ORPHAN_GRACE_SECONDS = float(os.getenv("IMAGE_ORPHAN_GRACE_SECONDS", "86400"))
+IMAGE_CLEANUP_INTERVAL_SECONDS = float(os.getenv("IMAGE_CLEANUP_INTERVAL_SECONDS", "86400"))
+IMAGE_CLEANUP_BATCH = 500
+JPEG_QUALITY = 70
+
+LOCAL_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+# ---------- HASHES ----------
+
+# dHash: 9x8 en gris, un bit por cada par de píxeles vecinos (¿el de la derecha es más claro?)
+def dhash(image: Image.Image) -> int:
+    small = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def _signed(value: int) -> int:
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _bands(value: int) -> list[int]:
+    return [(value >> (16 * i)) & 0xFFFF for i in range(4)]
+
+def _hamming(a: np.ndarray, b: int) -> np.ndarray:
+    xor = (a.astype(np.uint64) ^ np.uint64(b & 0xFFFFFFFFFFFFFFFF)).view(np.uint8)
+    return np.unpackbits(xor).reshape(-1, 64).sum(axis=1)
+
+def find_near_duplicate(db: Session, value: int, storage: str):
+    bands = _bands(value)
+    candidates = db.execute(
+        select(StoredImage.id, StoredImage.dhash).where(StoredImage.storage == storage, or_(
+            StoredImage.dhash_band0 == bands[0],
+            StoredImage.dhash_band1 == bands[1],
+            StoredImage.dhash_band2 == bands[2],
+            StoredImage.dhash_band3 == bands[3],
+        ))
+    ).all()
+    if not candidates:
+        return None
+    distances = _hamming(np.array([c.dhash for c in candidates], dtype=np.int64), value)
+    best = int(np.argmin(distances))
+    if distances[best] > IMAGE_DHASH_MAX_DISTANCE:
+        return None
+    return db.get(StoredImage, candidates[best].id)
+
+# ---------- STORAGE ----------
+
+def _put(storage: str, key: str, data: bytes, content_type: str) -> str:
+    if storage == "s3":
+        s3.upload_fileobj(io.BytesIO(data), AWS_S3_BUCKET_NAME, key, ExtraArgs={"ContentType": content_type})
+        return f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{key}"
+    path = os.path.join(UPLOAD_DIR, os.path.basename(key))
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return f"/static/images/{os.path.basename(key)}"
+
+def _remove(storage: str, key: str):
+    if storage == "s3":
+        s3.delete_object(Bucket=AWS_S3_BUCKET_NAME, Key=key)
+        return
+    path = os.path.join(UPLOAD_DIR, os.path.basename(key))
+    if os.path.exists(path):
+        os.remove(path)
+
+# ---------- SUBIDA ----------
+
+def _touch(db: Session, image: StoredImage) -> StoredImage:
+    image.last_seen_at = datetime.now(timezone.utc)
+    db.commit()
+    return image
+
+# Guarda una subida y devuelve (imagen, duplicada). storage="s3" recomprime a JPEG
+# como antes; storage="local" guarda los bytes originales.
+def store_image(db: Session, data: bytes, storage: str = "local") -> tuple[StoredImage, bool]:
+    sha256 = hashlib.sha256(data).hexdigest()
+    existing = db.query(StoredImage).filter(StoredImage.storage == storage, StoredImage.sha256 == sha256).first()
+    if existing:
+        return _touch(db, existing), True
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError):
+        raise HTTPException(status_code=400, detail="Invalid image file")
+
+    value = dhash(image)
+    similar = find_near_duplicate(db, value, storage)
+    if similar:
+        print(f"🖼️ Imagen casi igual a {similar.sha256[:12]}, se reutiliza")
+        return _touch(db, similar), True
+
+    if storage == "s3":
+        buffer = io.BytesIO()
+        image.convert("RGB").save(buffer, format="JPEG", optimize=True, quality=JPEG_QUALITY)
+        payload, extension, content_type = buffer.getvalue(), "jpg", "image/jpeg"
+    else:
+        extension = LOCAL_EXTENSIONS.get(image.format, "bin")
+        payload, content_type = data, Image.MIME.get(image.format, "application/octet-stream")
+    key = f"images/{sha256}.{extension}"
+    try:
+        url = _put(storage, key, payload, content_type)
+    except Exception as e:
+        print(f"❌ Error guardando la imagen: {e}")
+        raise HTTPException(status_code=500, detail=f"Image upload failed: {str(e)}")
+
+    now = datetime.now(timezone.utc)
+    bands = _bands(value)
+    stored = StoredImage(
+        sha256=sha256,
+        dhash=_signed(value),
+        dhash_band0=bands[0], dhash_band1=bands[1], dhash_band2=bands[2], dhash_band3=bands[3],
+        url=url,
+        storage=storage,
+        storage_key=key,
+        content_type=content_type,
+        size=len(payload),
+        width=image.width,
+        height=image.height,
+        created_at=now,
+        last_seen_at=now,
+    )
+    db.add(stored)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra subida de los mismos bytes ganó la carrera: mismo archivo, misma fila
+        db.rollback()
+        return _touch(db, db.query(StoredImage).filter(StoredImage.storage == storage, StoredImage.sha256 == sha256).one()), True
+    db.refresh(stored)
+    return stored, False
+
+# ---------- LIMPIEZA ----------
+
+# Borra las imágenes que ningún producto (vivo o pendiente de purga) ni genérico usa
+# y que no se subieron ni reutilizaron dentro del margen. La fila se borra antes que
+# el archivo, y el DELETE vuelve a chequear todo: si alguien la reutilizó entre la
+# lectura y el borrado, se queda.
+def cleanup_orphan_images(db: Session, batch_size: int = IMAGE_CLEANUP_BATCH) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=IMAGE_ORPHAN_GRACE_SECONDS)
+    orphan = (
+        (StoredImage.last_seen_at < cutoff)
+        & ~exists().where(Product.image_url == StoredImage.url)
+        & ~exists().where(GenericProduct.image_url == StoredImage.url)
+    )
+    removed = 0
+    last_id = 0
+    while True:
+        ids = [i for (i,) in db.execute(
+            select(StoredImage.id).where(StoredImage.id > last_id, orphan).order_by(StoredImage.id).limit(batch_size)
+        )]
+        if not ids:
+            break
+        last_id = ids[-1]
+        deleted = db.execute(
+            delete(StoredImage)
+            .where(StoredImage.id.in_(ids), orphan)
+            .returning(StoredImage.storage, StoredImage.storage_key)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+        for storage, key in deleted:
+            try:
+                _remove(storage, key)
+            except Exception as e:
+                print(f"⚠️ No se pudo borrar {key}: {e}")
+        removed += len(deleted)
+    if removed:
+        print(f"🧹 {removed} imágenes huérfanas borradas")
+    return removed
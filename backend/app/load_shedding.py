@@ -0,0 +1,213 @@
+# app/load_shedding.py
+# Deadlines por ruta y load shedding. Cada request cae en una clase (lecturas de
+# catálogo, escrituras, auth) con un límite de requests concurrentes y una cola
+# corta; si la cola está llena o no se libera lugar a tiempo, responde 503 con
+# Retry-After enseguida en vez de esperar un connection del pool que no llega.
+# El deadline de la ruta se aplica como statement_timeout de Postgres (SET LOCAL
+# al empezar cada transacción) y como timeout del request hasta que empieza la respuesta.
+# Los límites son por worker: con N workers el total es N veces cada límite.
+import asyncio
+import contextvars
+import json
+import os
+from dataclasses import dataclass, field
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app.database import SessionLocal
+
+RETRY_AFTER_SECONDS = int(os.getenv("LOAD_SHED_RETRY_AFTER_SECONDS", "1"))
+# Tiempo máximo esperando lugar en la cola antes de descartar el request
+LOAD_SHED_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LOAD_SHED_QUEUE_TIMEOUT_SECONDS", "2"))
+
+# Rutas que no pasan por el limitador (archivos estáticos, docs)
+EXEMPT_PREFIXES = ("/static", "/snapshot/files", "/docs", "/redoc", "/openapi.json")
+
+# Deadlines más finos que el de la clase, por prefijo (gana el más largo).
+# None = sin deadline (importaciones, que suben archivos grandes).
+ROUTE_DEADLINES = {
+    "/price-history": 5.0,
+    "/users": 3.0,
+    "/products/with-prices": 10.0,
+    "/admin/import": None,
+}
+# Ej: ROUTE_DEADLINES_JSON='{"/prices/matrix": 8}'
+ROUTE_DEADLINES.update(json.loads(os.getenv("ROUTE_DEADLINES_JSON", "{}")))
+
+# Request en curso: deadline en segundos, lo lee el hook de la sesión
+request_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+@dataclass
+class RouteClass:
+    name: str
+    limit: int
+    queue: int
+    deadline: float
+    in_flight: int = 0
+    waiting: int = 0
+    stats: dict = field(default_factory=lambda: {
+        "admitted": 0,
+        "queued": 0,
+        "shed_queue_full": 0,
+        "shed_queue_timeout": 0,
+        "deadline_exceeded": 0,
+        "peak_in_flight": 0,
+    })
+    _semaphore: asyncio.Semaphore = None
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self._semaphore.locked():
+            if self.waiting >= self.queue:
+                self.stats["shed_queue_full"] += 1
+                return False
+            self.stats["queued"] += 1
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), LOAD_SHED_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.stats["shed_queue_timeout"] += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.in_flight)
+        return True
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "deadline_seconds": self.deadline,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            **self.stats,
+        }
+
+def _route_class(name: str, limit: str, queue: str, deadline: str) -> RouteClass:
+    prefix = name.upper()
+    return RouteClass(
+        name=name,
+        limit=int(os.getenv(f"{prefix}_CONCURRENCY", limit)),
+        queue=int(os.getenv(f"{prefix}_QUEUE", queue)),
+        deadline=float(os.getenv(f"{prefix}_DEADLINE_SECONDS", deadline)),
+    )
+
+# Los límites por defecto quedan por debajo del pool de SQLAlchemy (5 + 10 overflow)
+route_classes = {
+    "catalog": _route_class("catalog", "10", "50", "3"),
+    "write": _route_class("write", "5", "20", "5"),
+    # bcrypt es caro: pocos logins/registros a la vez
+    "auth": _route_class("auth", "4", "20", "5"),
+}
+
+def classify(method: str, path: str) -> RouteClass:
+    if path.startswith("/auth") or (method == "POST" and path.rstrip("/") == "/users"):
+        return route_classes["auth"]
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return route_classes["catalog"]
+    return route_classes["write"]
+
+def route_deadline(route_class: RouteClass, path: str):
+    matches = [p for p in ROUTE_DEADLINES if path.startswith(p)]
+    if matches:
+        return ROUTE_DEADLINES[max(matches, key=len)]
+    return route_class.deadline
+
+def _json_response(status: int, detail: str, headers: list):
+    body = json.dumps({"detail": detail}).encode()
+    return (
+        {"type": "http.response.start", "status": status, "headers": headers + [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]},
+        {"type": "http.response.body", "body": body},
+    )
+
+class LoadSheddingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        route_class = classify(scope["method"], scope["path"])
+        if not await route_class.acquire():
+            start, body = _json_response(
+                503, "Server busy, retry later", [(b"retry-after", str(RETRY_AFTER_SECONDS).encode())]
+            )
+            await send(start)
+            await send(body)
+            return
+
+        deadline = route_deadline(route_class, scope["path"])
+        token = request_deadline.set(deadline)
+        released_later = False
+        try:
+            if deadline is None:
+                await self.app(scope, receive, send)
+            else:
+                released_later = await self._call_with_deadline(scope, receive, send, route_class, deadline)
+        finally:
+            request_deadline.reset(token)
+            if not released_later:
+                route_class.release()
+
+    # El timeout corre hasta que empieza la respuesta: un stream largo no se corta.
+    # El handler síncrono sigue en su thread hasta que Postgres cancela la query,
+    # pero el cliente recibe el 504 en el deadline. Su lugar en el límite se libera
+    # recién cuando el thread termina (devuelve True en ese caso).
+    async def _call_with_deadline(self, scope, receive, send, route_class: RouteClass, deadline: float):
+        started = asyncio.Event()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                started.set()
+            await send(message)
+
+        task = asyncio.ensure_future(self.app(scope, receive, send_wrapper))
+        waiter = asyncio.ensure_future(started.wait())
+        try:
+            done, _ = await asyncio.wait({task, waiter}, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+        if task in done or started.is_set():
+            await task
+            return False
+
+        task.cancel()
+        task.add_done_callback(lambda _: route_class.release())
+        route_class.stats["deadline_exceeded"] += 1
+        start, body = _json_response(504, "Request deadline exceeded", [])
+        await send(start)
+        await send(body)
+        return True
+
+def load_shedding_snapshot() -> dict:
+    return {name: route_class.snapshot() for name, route_class in route_classes.items()}
+
+# ---------- statement_timeout ----------
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    deadline = request_deadline.get()
+    if deadline is None or connection.dialect.name != "postgresql":
+        return
+    # SET LOCAL dura solo esta transacción; no contamina el connection del pool
+    connection.execute(text(f"SET LOCAL statement_timeout = {int(deadline * 1000)}"))
+
+# Query cancelada por statement_timeout (SQLSTATE 57014) → 504 en vez de 500
+async def query_deadline_handler(request: Request, exc: OperationalError):
+    if getattr(exc.orig, "pgcode", None) != "57014":
+        raise exc
+    classify(request.method, request.url.path).stats["deadline_exceeded"] += 1
+    return JSONResponse(status_code=504, content={"detail": "Query deadline exceeded"})
@@ -19,6 +19,15 @@ from app.routes import admin
 from app.models import Base
 from app.database import engine
 from app.routes import products_summary
+from app.routes import price_stream
+from app.routes import snapshot
+from app.routes import analytics
+from app.routes import feed
+from app.compression import CompressionMiddleware
+from app.load_shedding import LoadSheddingMiddleware, query_deadline_handler
+from app.rate_limit import RateLimitMiddleware
+from app.profiling import ProfilingMiddleware
+from sqlalchemy.exc import OperationalError
 from fastapi.staticfiles import StaticFiles
 import os
 
@@ -37,6 +46,14 @@ def get_db():
     finally:
         db.close()
 
+# Orden (de afuera hacia adentro): CORS → rate limit → profiling → compresión/cache → load shedding.
+# Los 429/503/504 llevan los headers CORS; el rate limit cuenta también las respuestas
+# que salen del cache, y un request rechazado no ocupa lugar en la cola.
+app.add_middleware(LoadSheddingMiddleware)
+app.add_exception_handler(OperationalError, query_deadline_handler)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # O usar ["http://localhost:8081"] para solo el frontend
@@ -55,6 +72,10 @@ app.include_router(users.router)
 app.include_router(routes_user.router)
 app.include_router(admin.router)
 app.include_router(products_summary.router)
+app.include_router(price_stream.router)
+app.include_router(snapshot.router)
+app.include_router(analytics.router)
+app.include_router(feed.router)
 
 
 
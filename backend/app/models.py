@@ -1,8 +1,8 @@
 # app/models.py
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, BigInteger, String, Boolean, Float, Date, DateTime, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from .database import Base
+from .database import Base, DEFAULT_REGION
 from datetime import datetime
 
 class User(Base):
@@ -23,14 +23,36 @@ class Product(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     description = Column(String)
-    category = Column(String)
+    category = Column(String, index=True)
     brand = Column(String, nullable=True)
     quantity = Column(Integer)
+    # Contenido neto estructurado (ej 500 + "g") y su versión normalizada (0.5 + "kg"),
+    # que es la que se usa para calcular Price.unit_price
+    net_quantity = Column(Float, nullable=True)
+    unit = Column(String, nullable=True)
+    base_quantity = Column(Float, nullable=True)
+    base_unit = Column(String, nullable=True)
     image_url = Column(String)
     barcode = Column(String, index=True) 
     # Define relationshwith GenericProduct
-    generic_product_id = Column(Integer, ForeignKey("generic_products.id"), nullable=True)
+    generic_product_id = Column(Integer, ForeignKey("generic_products.id"), nullable=True, index=True)
     generic_product = relationship("GenericProduct", back_populates="products")
+    # Borrado lógico: con deleted_at el producto desaparece de todas las lecturas
+    # y una tarea de fondo purga sus precios, historial y cestas por lotes
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Índices parciales: solo productos vivos, que es lo que filtran las lecturas
+        Index("ix_products_live_category", "category", "id", postgresql_where=deleted_at.is_(None)),
+        Index("ix_products_live_barcode", "barcode", postgresql_where=deleted_at.is_(None)),
+        # Mejor precio por unidad (crud.get_best_value): productos del genérico o la
+        # categoría por unidad base, y de ahí sus precios por (product_id, unit_price)
+        Index("ix_products_live_category_base_unit", "category", "base_unit", "id", postgresql_where=deleted_at.is_(None)),
+        Index("ix_products_live_generic_base_unit", "generic_product_id", "base_unit", "id", postgresql_where=deleted_at.is_(None)),
+    )
+
+# Filtro de productos no borrados, para usar en todas las lecturas
+PRODUCT_IS_LIVE = Product.deleted_at.is_(None)
 
 #new table for generic products
 class GenericProduct(Base):
@@ -45,31 +67,220 @@ class GenericProduct(Base):
     # Relación reversa
     products = relationship("Product", back_populates="generic_product")
 
+# Dimensión de supermercados: los precios guardan un smallint en vez del nombre repetido
+class Supermarket(Base):
+    __tablename__ = "supermarkets"
+    # En SQLite (pruebas locales) solo INTEGER PRIMARY KEY es autoincremental
+    id = Column(SmallInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    name = Column(String, nullable=False)               # nombre para mostrar, ej "Tesco"
+    slug = Column(String, nullable=False)               # clave normalizada, ej "tesco"
+    region = Column(String(8), nullable=False, default=DEFAULT_REGION)  # país, ej "ie"
+
+    # La misma cadena puede estar en varios países (un supermercado por región)
+    __table_args__ = (
+        UniqueConstraint("region", "slug", name="uq_supermarkets_region_slug"),
+    )
+
 class Price(Base):
     __tablename__ = "prices"
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"))
-    supermarket = Column(String)
+    supermarket_id = Column(SmallInteger, ForeignKey("supermarkets.id"))
+    # Clave de partición (la región del supermercado). En Postgres la PK es (id, region);
+    # para el ORM alcanza con id, que sale de una sola secuencia.
+    region = Column(String(8), nullable=False, default=DEFAULT_REGION)
     price = Column(Float)
+    # Precio por kg / l / unidad, precalculado en cada escritura de precio o de producto
+    unit_price = Column(Float, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow)
     product = relationship("Product", backref="prices")
+    supermarket_ref = relationship("Supermarket", lazy="joined")
+
+    # La API sigue devolviendo el nombre del supermercado
+    @property
+    def supermarket(self):
+        return self.supermarket_ref.name if self.supermarket_ref else None
+
+    # No es columna: precio antes del cambio, lo completa crud al escribir y va en el evento
+    previous_price = None
+
+    __table_args__ = (
+        Index("ix_prices_product_supermarket", "product_id", "supermarket_id"),
+        Index("ix_prices_product_unit_price", "product_id", "unit_price", postgresql_where=unit_price.isnot(None)),
+    )
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
-    supermarket = Column(String)
+    supermarket_id = Column(SmallInteger, ForeignKey("supermarkets.id"))
+    region = Column(String(8), nullable=False, default=DEFAULT_REGION)  # clave de partición, como en Price
     price = Column(Float)
     recorded_at = Column(DateTime, default=datetime.utcnow)
     product = relationship("Product", backref="price_history")
+    supermarket_ref = relationship("Supermarket", lazy="joined")
+
+    @property
+    def supermarket(self):
+        return self.supermarket_ref.name if self.supermarket_ref else None
+
+    __table_args__ = (
+        Index("ix_price_history_product_supermarket", "product_id", "supermarket_id", "recorded_at"),
+    )
 
 class Basket(Base):
     __tablename__ = "basket"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     quantity = Column(Integer)
     added_at = Column(DateTime, default=datetime.utcnow)
 
     product = relationship("Product")
+
+# Importaciones masivas de catálogo (admin o CLI): progreso y filas rechazadas
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, default="pending")   # pending, running, done, failed
+    processed = Column(Integer, default=0)
+    inserted = Column(Integer, default=0)
+    duplicates = Column(Integer, default=0)
+    rejected = Column(Integer, default=0)
+    rejects_path = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# Cola de precios enviados por usuarios (write-behind): el POST solo encola y
+# una tarea de Celery los aplica en lote
+class PriceSubmission(Base):
+    __tablename__ = "price_submissions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, unique=True, nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    supermarket_id = Column(SmallInteger, ForeignKey("supermarkets.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    status = Column(String, default="pending")   # pending, applied, coalesced, quarantined
+    submitted_at = Column(DateTime(timezone=True), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_price_submissions_pending", "id", postgresql_where=(status == "pending")),
+    )
+
+# Precios sospechosos que no se aplicaron y esperan revisión de un admin
+class PriceQuarantine(Base):
+    __tablename__ = "price_quarantine"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    supermarket_id = Column(SmallInteger, ForeignKey("supermarkets.id"), nullable=False)
+    price = Column(Float, nullable=False)
+    reference_price = Column(Float, nullable=True)   # mediana reciente contra la que se comparó
+    reason = Column(String, nullable=False)
+    submission_id = Column(Integer, nullable=True)
+    submitted_at = Column(DateTime(timezone=True), nullable=False)
+    status = Column(String, default="pending", index=True)   # pending, approved, rejected
+    reviewed_by = Column(Integer, nullable=True)
+    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+
+# Purga en segundo plano de un producto borrado (ver Product.deleted_at).
+# product_id no es FK porque al final de la purga se borra el producto.
+class ProductPurge(Base):
+    __tablename__ = "product_purges"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, nullable=False, index=True)
+    status = Column(String, default="queued", index=True)   # queued, running, done, failed
+    history_deleted = Column(Integer, default=0)
+    basket_deleted = Column(Integer, default=0)
+    prices_deleted = Column(Integer, default=0)
+    submissions_deleted = Column(Integer, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+# Agregados diarios del índice encadenado (Jevons) por supermercado y categoría.
+# category = "*" es el índice de todo el supermercado.
+class PriceIndexDay(Base):
+    __tablename__ = "price_index_days"
+
+    day = Column(Date, primary_key=True)
+    supermarket_id = Column(SmallInteger, ForeignKey("supermarkets.id"), primary_key=True)
+    category = Column(String, primary_key=True)
+    sum_log_relative = Column(Float, default=0.0)   # suma de log(precio nuevo / anterior) del día
+    new_products = Column(Integer, default=0)       # productos que aparecen por primera vez ese día
+    products = Column(Integer, default=0)           # productos con precio conocido al final del día
+    index_value = Column(Float, nullable=True)      # base 100 en el primer día de la serie
+
+    __table_args__ = (
+        Index("ix_price_index_days_series", "category", "supermarket_id", "day"),
+    )
+
+# Último precio visto por (producto, supermercado), para calcular el relativo del próximo cambio
+class PriceIndexState(Base):
+    __tablename__ = "price_index_state"
+
+    product_id = Column(Integer, primary_key=True)
+    supermarket_id = Column(SmallInteger, primary_key=True)
+    category = Column(String, nullable=True)
+    price = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+# Hasta qué fila de price_history procesó cada job incremental
+class AnalyticsWatermark(Base):
+    __tablename__ = "analytics_watermarks"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+
+# Genérico propuesto por app.generic_matching para un producto sin asignar
+class GenericMatchSuggestion(Base):
+    __tablename__ = "generic_match_suggestions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False, index=True)
+    generic_product_id = Column(Integer, ForeignKey("generic_products.id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float, nullable=False)
+    rank = Column(Integer, nullable=False)   # 1 = mejor propuesta para ese producto
+    status = Column(String, default="pending", index=True)   # pending, accepted, rejected
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    reviewed_by = Column(Integer, nullable=True)
+    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+
+# Imagen subida, guardada con su sha256 como nombre (app.image_store).
+# Subidas repetidas o casi iguales (dHash cercano) reutilizan la misma url.
+class StoredImage(Base):
+    __tablename__ = "images"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=False)
+    # dHash de 64 bits (con signo, para que entre en BIGINT) y sus 4 bandas de 16 bits:
+    # dos hashes a distancia <= 3 comparten al menos una banda
+    dhash = Column(BigInteger, nullable=False)
+    dhash_band0 = Column(Integer, nullable=False, index=True)
+    dhash_band1 = Column(Integer, nullable=False, index=True)
+    dhash_band2 = Column(Integer, nullable=False, index=True)
+    dhash_band3 = Column(Integer, nullable=False, index=True)
+    url = Column(String, unique=True, nullable=False)
+    storage = Column(String, nullable=False)        # local, s3
+    storage_key = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    # Última vez que se subió o se reutilizó; la limpieza de huérfanas respeta un margen desde acá
+    last_seen_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    # Los mismos bytes pueden estar una vez en cada storage (la url de uno no sirve para el otro)
+    __table_args__ = (
+        UniqueConstraint("storage", "sha256", name="uq_images_storage_sha256"),
+    )
@@ -0,0 +1,208 @@
+# app/price_cache.py
+# Cache write-through de precios actuales en Redis: un hash por producto y región,
+# prices:<base>:<región>:product:<id> → {supermarket_id: JSON del precio}. <base> es la
+# base de la sesión (session_database): una región con su propia base repite los ids de
+# productos y supermercados de la principal, así que cada base tiene sus hashes.
+# Con un hash por región, un miss solo lee la partición de esa región.
+#
+# - Escritura: crud escribe el precio nuevo después del commit (HSET, pisa lo que haya).
+# - Lectura: HGETALL en pipeline para todos los productos pedidos. Un hash solo se
+#   considera completo si tiene el campo "_"; si no, se va a la base y se completa
+#   con HSETNX, así un precio escrito por write-through mientras tanto no se pisa
+#   con el valor viejo que leyó la lectura.
+# - Si Redis no está, todo sigue funcionando contra la base.
+# - check_consistency (tarea check_price_cache de Celery) compara con la base y repara
+#   diferencias, una vez por base y por cada región de esa base.
+#
+# En desarrollo se puede probar con fakeredis: app.redis_client._client = fakeredis.FakeRedis(decode_responses=True)
+import json
+import os
+from datetime import datetime, timezone
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database import REGIONS, session_database, regions_in_database
+from app.models import Price, Product, Supermarket, PRODUCT_IS_LIVE
+from app.redis_client import get_redis
+
+PRICE_CACHE_TTL_SECONDS = int(os.getenv("PRICE_CACHE_TTL_SECONDS", "86400"))
+PRICE_CACHE_CHECK_SECONDS = float(os.getenv("PRICE_CACHE_CHECK_SECONDS", "3600"))
+PRICE_CACHE_CHECK_CHUNK = 1000
+# Campo que marca un hash cargado completo desde la base
+COMPLETE_FIELD = "_"
+def _prefix(database: str, region: str) -> str:
+    return f"prices:{database}:{region}:product:"
+
+def _key(database: str, region: str, product_id: int) -> str:
+    return f"{_prefix(database, region)}{product_id}"
+
+# Fechas siempre como UTC sin zona, igual que las devuelve la columna de la base
+def _timestamp(value) -> str:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def _entry(price_id, product_id, supermarket_id, supermarket, price, unit_price, updated_at) -> str:
+    return json.dumps({
+        "id": price_id,
+        "product_id": product_id,
+        "supermarket_id": supermarket_id,
+        "supermarket": supermarket,
+        "price": price,
+        "unit_price": unit_price,
+        "updated_at": _timestamp(updated_at),
+    })
+
+# ---------- ESCRITURA ----------
+
+# Se llama después del commit con los eventos de price_events y la base donde se escribieron
+def write_prices(database: str, events: list[dict]):
+    if not events:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for event in events:
+            key = _key(database, event["region"], event["product_id"])
+            pipe.hset(key, str(event["supermarket_id"]), _entry(
+                event["price_id"], event["product_id"], event["supermarket_id"], event["supermarket"],
+                event["price"], event.get("unit_price"), event["updated_at"],
+            ))
+            pipe.expire(key, PRICE_CACHE_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el cache de precios: {e}")
+
+# Borra los hashes de todas las regiones (un producto puede tener precios en varias)
+def invalidate_products(database: str, product_ids):
+    if not product_ids:
+        return
+    try:
+        get_redis().delete(*[_key(database, region, p) for region in REGIONS for p in product_ids])
+    except Exception as e:
+        print(f"⚠️ No se pudo invalidar el cache de precios: {e}")
+
+# ---------- LECTURA ----------
+
+# Solo la partición de la región
+def _load_from_db(db: Session, product_ids, region: str) -> dict:
+    rows = db.execute(
+        select(Price.id, Price.product_id, Price.supermarket_id, Supermarket.name,
+               Price.price, Price.unit_price, Price.updated_at)
+        .join(Product, Product.id == Price.product_id)
+        .outerjoin(Supermarket, Supermarket.id == Price.supermarket_id)
+        .where(Price.product_id.in_(list(product_ids)), Price.region == region, PRODUCT_IS_LIVE)
+    ).all()
+    loaded = {}
+    for row in rows:
+        loaded.setdefault(row.product_id, {})[str(row.supermarket_id)] = _entry(
+            row.id, row.product_id, row.supermarket_id, row.name, row.price, row.unit_price, row.updated_at
+        )
+    return loaded
+
+def _fill(database: str, region: str, loaded: dict):
+    pipe = get_redis().pipeline(transaction=False)
+    for product_id, fields in loaded.items():
+        key = _key(database, region, product_id)
+        for field, value in fields.items():
+            pipe.hsetnx(key, field, value)
+        pipe.hset(key, COMPLETE_FIELD, "1")
+        pipe.expire(key, PRICE_CACHE_TTL_SECONDS)
+    pipe.execute()
+
+# Precios actuales de varios productos en una región:
+# {product_id: [dict con los campos de schemas.Price + supermarket_id]}.
+# Los productos sin precios no se cachean (no hay nada que marcar como completo).
+def get_current_prices(db: Session, product_ids, region: str) -> dict:
+    product_ids = list(dict.fromkeys(product_ids))
+    result = {p: [] for p in product_ids}
+    if not product_ids:
+        return result
+
+    database = session_database(db)
+    cached = {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for product_id in product_ids:
+            pipe.hgetall(_key(database, region, product_id))
+        for product_id, fields in zip(product_ids, pipe.execute()):
+            if fields.pop(COMPLETE_FIELD, None):
+                cached[product_id] = fields
+        redis_ok = True
+    except Exception as e:
+        print(f"⚠️ Cache de precios no disponible, leyendo de la base: {e}")
+        redis_ok = False
+
+    missing = [p for p in product_ids if p not in cached]
+    if missing:
+        loaded = _load_from_db(db, missing, region)
+        cached.update(loaded)
+        if redis_ok and loaded:
+            try:
+                _fill(database, region, loaded)
+            except Exception as e:
+                print(f"⚠️ No se pudo llenar el cache de precios: {e}")
+
+    for product_id, fields in cached.items():
+        result[product_id] = [json.loads(value) for value in fields.values()]
+    return result
+
+# ---------- CONSISTENCIA ----------
+
+# Recorre los precios de la base por chunks de productos y compara con los hashes
+# cargados; los que no coinciden se borran y se vuelven a llenar desde la base.
+# Solo mira los hashes de la base de la sesión, región por región.
+def check_consistency(db: Session, chunk_size: int = PRICE_CACHE_CHECK_CHUNK) -> dict:
+    database = session_database(db)
+    regions = regions_in_database(database)
+    redis_client = get_redis()
+    stats = {"checked": 0, "mismatched": 0, "orphaned": 0}
+    seen = set()
+    last_id = 0
+    while True:
+        product_ids = [p for (p,) in db.execute(
+            select(Product.id).where(Product.id > last_id, PRODUCT_IS_LIVE).order_by(Product.id).limit(chunk_size)
+        )]
+        if not product_ids:
+            break
+        last_id = product_ids[-1]
+        seen.update(product_ids)
+
+        for region in regions:
+            pipe = redis_client.pipeline(transaction=False)
+            for product_id in product_ids:
+                pipe.hgetall(_key(database, region, product_id))
+            cached = dict(zip(product_ids, pipe.execute()))
+            loaded = _load_from_db(db, product_ids, region)
+
+            broken = []
+            for product_id, fields in cached.items():
+                if not fields:
+                    continue
+                stats["checked"] += 1
+                complete = fields.pop(COMPLETE_FIELD, None)
+                expected = {k: json.loads(v) for k, v in loaded.get(product_id, {}).items()}
+                actual = {k: json.loads(v) for k, v in fields.items()}
+                # Un hash parcial (sin "_") solo puede tener precios correctos, no todos
+                if actual != expected and (complete or any(expected.get(k) != v for k, v in actual.items())):
+                    broken.append(product_id)
+            if broken:
+                stats["mismatched"] += len(broken)
+                redis_client.delete(*[_key(database, region, p) for p in broken])
+                _fill(database, region, {p: loaded[p] for p in broken if p in loaded})
+
+    # Hashes de productos borrados o que ya no existen
+    for region in regions:
+        prefix = _prefix(database, region)
+        orphans = [
+            key for key in redis_client.scan_iter(match=f"{prefix}*", count=1000)
+            if int(key[len(prefix):]) not in seen
+        ]
+        if orphans:
+            stats["orphaned"] += len(orphans)
+            redis_client.delete(*orphans)
+    if stats["mismatched"] or stats["orphaned"]:
+        print(f"🩹 Cache de precios reparado ({database}): {stats}")
+    return stats
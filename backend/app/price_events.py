@@ -0,0 +1,118 @@
+# app/price_events.py
+# Eventos de cambio de precio. crud los publica en Redis pub/sub después del commit
+# y cada worker tiene un único suscriptor que los reparte a sus websockets,
+# así funciona igual con uno o varios workers detrás del balanceador.
+import asyncio
+import json
+import os
+from collections import OrderedDict
+from app.redis_client import get_redis, get_pubsub_redis
+
+PRICE_EVENTS_CHANNEL = os.getenv("PRICE_EVENTS_CHANNEL", "price-updates")
+# Máximo de deltas pendientes por conexión antes de descartar los más viejos
+PRICE_STREAM_MAX_PENDING = int(os.getenv("PRICE_STREAM_MAX_PENDING", "500"))
+# Ventana para juntar ráfagas en un solo mensaje, y tamaño máximo de cada mensaje
+PRICE_STREAM_BATCH_SECONDS = float(os.getenv("PRICE_STREAM_BATCH_SECONDS", "0.25"))
+PRICE_STREAM_BATCH_SIZE = int(os.getenv("PRICE_STREAM_BATCH_SIZE", "100"))
+
+# ---------- PUBLICACIÓN ----------
+
+# Se arma antes del commit (después del commit los atributos quedan expirados)
+def price_event(db_price, generic_product_id, supermarket_name) -> dict:
+    return {
+        "price_id": db_price.id,
+        "product_id": db_price.product_id,
+        "generic_product_id": generic_product_id,
+        "supermarket_id": db_price.supermarket_id,
+        "supermarket": supermarket_name,
+        "region": db_price.region,
+        "price": db_price.price,
+        "previous_price": db_price.previous_price,
+        "unit_price": db_price.unit_price,
+        "updated_at": db_price.updated_at.isoformat() if db_price.updated_at else None,
+    }
+
+# Se llama después del commit: si Redis no está, el precio ya quedó guardado
+# y solo se pierde la notificación en vivo.
+def publish_price_events(events: list[dict]):
+    if not events:
+        return
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for event in events:
+            pipe.publish(PRICE_EVENTS_CHANNEL, json.dumps(event))
+        pipe.execute()
+    except Exception as e:
+        print(f"⚠️ No se pudo publicar el cambio de precio: {e}")
+
+# ---------- SUSCRIPCIÓN ----------
+
+class PriceSubscription:
+    def __init__(self):
+        self.product_ids = set()
+        self.generic_ids = set()
+        # Un delta por (producto, supermercado): si llega otro antes de enviarse, reemplaza al anterior
+        self.pending = OrderedDict()
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def wants(self, event: dict) -> bool:
+        return event["product_id"] in self.product_ids or event.get("generic_product_id") in self.generic_ids
+
+    def offer(self, event: dict):
+        key = (event["product_id"], event["supermarket_id"])
+        self.pending.pop(key, None)
+        self.pending[key] = event
+        # Backpressure: un cliente lento no hace crecer la memoria sin límite
+        while len(self.pending) > PRICE_STREAM_MAX_PENDING:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+        self.ready.set()
+
+    async def next_batch(self) -> list[dict]:
+        await self.ready.wait()
+        # Esperar un poco para mandar una ráfaga de cambios en un solo mensaje
+        await asyncio.sleep(PRICE_STREAM_BATCH_SECONDS)
+        batch = []
+        while self.pending and len(batch) < PRICE_STREAM_BATCH_SIZE:
+            batch.append(self.pending.popitem(last=False)[1])
+        if not self.pending:
+            self.ready.clear()
+        return batch
+
+class PriceEventHub:
+    def __init__(self):
+        self.subscriptions = set()
+        self._listener = None
+
+    def register(self, subscription: PriceSubscription):
+        self.subscriptions.add(subscription)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    def unregister(self, subscription: PriceSubscription):
+        self.subscriptions.discard(subscription)
+
+    def dispatch(self, event: dict):
+        for subscription in self.subscriptions:
+            if subscription.wants(event):
+                subscription.offer(event)
+
+    async def _listen(self):
+        while True:
+            pubsub = get_pubsub_redis().pubsub()
+            try:
+                await pubsub.subscribe(PRICE_EVENTS_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    self.dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Se cortó la suscripción a {PRICE_EVENTS_CHANNEL}: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+hub = PriceEventHub()
@@ -0,0 +1,405 @@
+# app/price_index.py
+# Índice diario de precios encadenado (Jevons) por supermercado y por categoría.
+#
+# Cada fila de price_history es un precio vigente desde recorded_at, y cada fila de
+# prices el precio vigente desde updated_at (price_history solo recibe un precio
+# cuando lo reemplaza otro). Para cada (producto, supermercado) se guarda el último
+# precio visto (price_index_state); cuando llega uno nuevo, log(nuevo / anterior) se
+# suma al día del cambio. Volver a ver el mismo precio con la misma fecha no suma nada.
+# Con precios arrastrados (un producto sin cambios cuenta como relativo 1):
+#     ln I(d) = ln I(d-1) + suma_de_logs(d) / productos_conocidos(d)
+# La serie arranca en 100 el primer día.
+#
+# El job incremental solo lee las filas de price_history con id mayor al watermark
+# y las de prices más nuevas que su price_index_state (prices tiene una fila por
+# producto y supermercado; updated_at no sirve de watermark porque las submissions
+# encoladas llegan con su submitted_at). Como los agregados por día son sumas, las
+# filas nuevas se suman y después se recalcula la serie de los grupos tocados
+# (días × 1 grupo, es barato).
+# El backfill recorre todo el historial en paralelo, un supermercado por worker:
+# el estado y los agregados de cada supermercado son independientes. Si falla, el
+# watermark vuelve al valor de antes (abort_backfill); si nadie lo restaura (un worker
+# que murió), el incremental lo restaura solo pasado PRICE_INDEX_BACKFILL_TIMEOUT_SECONDS.
+#
+# Cada región con su propia base tiene su índice: las funciones trabajan sobre la
+# base de la sesión, y el backfill recibe la región (None para la principal).
+#
+# CLI: python -m app.price_index [--backfill] [--workers 4] [--region gb]
+import argparse
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from sqlalchemy import select, delete, insert, update, func, or_, and_
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Price, PriceHistory, Product, Supermarket, PriceIndexDay, PriceIndexState, AnalyticsWatermark
+
+PRICE_INDEX_INTERVAL_SECONDS = float(os.getenv("PRICE_INDEX_INTERVAL_SECONDS", "3600"))
+PRICE_INDEX_BATCH_SIZE = int(os.getenv("PRICE_INDEX_BATCH_SIZE", "20000"))
+PRICE_INDEX_BACKFILL_CHUNK = int(os.getenv("PRICE_INDEX_BACKFILL_CHUNK", "50000"))
+PRICE_INDEX_BACKFILL_WORKERS = int(os.getenv("PRICE_INDEX_BACKFILL_WORKERS", "4"))
+PRICE_INDEX_BACKFILL_TIMEOUT_SECONDS = float(os.getenv("PRICE_INDEX_BACKFILL_TIMEOUT_SECONDS", "86400"))
+
+ALL_CATEGORIES = "*"
+WATERMARK_NAME = "price_index"
+# last_id = watermark de antes del backfill en curso, updated_at = cuándo empezó
+BACKFILL_WATERMARK_NAME = "price_index_backfill"
+# last_id mientras corre un backfill: el job incremental no hace nada
+BACKFILL_RUNNING = -1
+# Tamaño de los IN (...) al cargar el estado
+STATE_QUERY_CHUNK = 5000
+BASE_INDEX = 100.0
+
+def _history_query():
+    return (
+        select(
+            PriceHistory.id, PriceHistory.product_id, PriceHistory.supermarket_id,
+            PriceHistory.price, PriceHistory.recorded_at, Product.category,
+        )
+        .outerjoin(Product, Product.id == PriceHistory.product_id)
+        .where(PriceHistory.supermarket_id.isnot(None), PriceHistory.price > 0, PriceHistory.recorded_at.isnot(None))
+    )
+
+# Los precios actuales con las mismas columnas que _history_query
+def _current_prices_query():
+    return (
+        select(
+            Price.id, Price.product_id, Price.supermarket_id,
+            Price.price, Price.updated_at.label("recorded_at"), Product.category,
+        )
+        .outerjoin(Product, Product.id == Price.product_id)
+        .where(Price.supermarket_id.isnot(None), Price.price > 0, Price.updated_at.isnot(None))
+    )
+
+# Suma los relativos de las filas (ordenadas por recorded_at) en deltas[(día, supermercado, categoría)]
+# = [suma de logs, productos nuevos] y actualiza state. Devuelve las claves de state que cambiaron.
+def _accumulate(rows, state: dict, deltas: dict) -> set:
+    changed = set()
+    for row in rows:
+        key = (row.product_id, row.supermarket_id)
+        day = row.recorded_at.date()
+        categories = (ALL_CATEGORIES, row.category) if row.category else (ALL_CATEGORIES,)
+        previous = state.get(key)
+        if previous is None:
+            for category in categories:
+                deltas.setdefault((day, row.supermarket_id, category), [0.0, 0])[1] += 1
+        elif row.recorded_at < previous[1]:
+            # Fila atrasada (ej. un precio aprobado de la cuarentena): no reescribe el pasado
+            continue
+        elif row.price != previous[0]:
+            relative = math.log(row.price / previous[0])
+            for category in categories:
+                deltas.setdefault((day, row.supermarket_id, category), [0.0, 0])[0] += relative
+        state[key] = (row.price, row.recorded_at, row.category)
+        changed.add(key)
+    return changed
+
+def _load_state(db: Session, keys: set) -> dict:
+    product_ids = sorted({k[0] for k in keys})
+    state = {}
+    for i in range(0, len(product_ids), STATE_QUERY_CHUNK):
+        chunk = product_ids[i:i + STATE_QUERY_CHUNK]
+        for s in db.query(PriceIndexState).filter(PriceIndexState.product_id.in_(chunk)):
+            if (s.product_id, s.supermarket_id) in keys:
+                state[(s.product_id, s.supermarket_id)] = (s.price, s.recorded_at, s.category)
+    return state
+
+def _save_state(db: Session, state: dict, changed: set, existing: set):
+    rows = [
+        {"product_id": p, "supermarket_id": s, "price": state[(p, s)][0],
+         "recorded_at": state[(p, s)][1], "category": state[(p, s)][2]}
+        for p, s in changed
+    ]
+    updates = [r for r in rows if (r["product_id"], r["supermarket_id"]) in existing]
+    inserts = [r for r in rows if (r["product_id"], r["supermarket_id"]) not in existing]
+    if updates:
+        db.execute(update(PriceIndexState), updates)
+    if inserts:
+        db.execute(insert(PriceIndexState), inserts)
+
+def _apply_deltas(db: Session, deltas: dict):
+    if not deltas:
+        return
+    days = {k[0] for k in deltas}
+    existing = {
+        (d.day, d.supermarket_id, d.category): d
+        for d in db.query(PriceIndexDay).filter(
+            PriceIndexDay.day >= min(days), PriceIndexDay.day <= max(days),
+            PriceIndexDay.supermarket_id.in_({k[1] for k in deltas}),
+        )
+    }
+    new_rows = []
+    for key, (sum_log, new_products) in deltas.items():
+        row = existing.get(key)
+        if row:
+            row.sum_log_relative = (row.sum_log_relative or 0.0) + sum_log
+            row.new_products = (row.new_products or 0) + new_products
+        else:
+            new_rows.append({
+                "day": key[0], "supermarket_id": key[1], "category": key[2],
+                "sum_log_relative": sum_log, "new_products": new_products,
+            })
+    db.flush()
+    if new_rows:
+        db.execute(insert(PriceIndexDay), new_rows)
+
+# Recalcula products e index_value de las series (supermercado, categoría) indicadas
+def rebuild_series(db: Session, groups):
+    for supermarket_id, category in groups:
+        days = db.execute(
+            select(PriceIndexDay.day, PriceIndexDay.sum_log_relative, PriceIndexDay.new_products)
+            .where(PriceIndexDay.supermarket_id == supermarket_id, PriceIndexDay.category == category)
+            .order_by(PriceIndexDay.day)
+        ).all()
+        if not days:
+            continue
+        sum_log = np.array([d.sum_log_relative or 0.0 for d in days])
+        products = np.cumsum([d.new_products or 0 for d in days])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = np.where(products > 0, sum_log / products, 0.0)
+        step[0] = 0.0
+        index = BASE_INDEX * np.exp(np.cumsum(step))
+        db.execute(update(PriceIndexDay), [
+            {"day": d.day, "supermarket_id": supermarket_id, "category": category,
+             "products": int(n), "index_value": float(v)}
+            for d, n, v in zip(days, products, index)
+        ])
+
+def _lock_watermark(db: Session, name: str = WATERMARK_NAME) -> AnalyticsWatermark:
+    watermark = (
+        db.query(AnalyticsWatermark)
+        .filter(AnalyticsWatermark.name == name)
+        .with_for_update()
+        .first()
+    )
+    if watermark is None:
+        watermark = AnalyticsWatermark(name=name, last_id=0)
+        db.add(watermark)
+        db.flush()
+    return watermark
+
+# Vuelve el watermark al valor de antes del backfill (con el lock ya tomado)
+def _restore_watermark(db: Session, watermark: AnalyticsWatermark):
+    previous = _lock_watermark(db, BACKFILL_WATERMARK_NAME)
+    watermark.last_id = previous.last_id
+    watermark.updated_at = datetime.now(timezone.utc)
+
+# True si hay un backfill en curso. Uno que empezó hace más de
+# PRICE_INDEX_BACKFILL_TIMEOUT_SECONDS se da por muerto y se restaura el watermark.
+def _backfill_running(db: Session, watermark: AnalyticsWatermark) -> bool:
+    if watermark.last_id != BACKFILL_RUNNING:
+        return False
+    started = watermark.updated_at
+    if started is not None and started.tzinfo is None:
+        started = started.replace(tzinfo=timezone.utc)
+    if started is None or (datetime.now(timezone.utc) - started).total_seconds() > PRICE_INDEX_BACKFILL_TIMEOUT_SECONDS:
+        _restore_watermark(db, watermark)
+        db.flush()
+        print(f"⚠️ Backfill del índice de precios sin terminar desde {started}: watermark restaurado a {watermark.last_id}")
+        return False
+    return True
+
+# ---------- INCREMENTAL ----------
+
+# Suma un lote de filas al estado y a los agregados. Devuelve los grupos (supermercado, categoría) tocados.
+def _apply_rows(db: Session, rows) -> set:
+    keys = {(r.product_id, r.supermarket_id) for r in rows}
+    state = _load_state(db, keys)
+    existing = set(state)
+    deltas = {}
+    changed = _accumulate(sorted(rows, key=lambda r: (r.recorded_at, r.id)), state, deltas)
+    _save_state(db, state, changed, existing)
+    _apply_deltas(db, deltas)
+    db.flush()
+    return {(k[1], k[2]) for k in deltas}
+
+# Procesa las filas nuevas de price_history y después los precios actuales que
+# todavía no están en el estado. Devuelve cuántas filas procesó.
+def update_price_index(db: Session, batch_size: int = PRICE_INDEX_BATCH_SIZE) -> int:
+    total = 0
+    while True:
+        # El lock del watermark evita dos corridas a la vez
+        watermark = _lock_watermark(db)
+        if _backfill_running(db, watermark):
+            db.rollback()
+            return total
+        rows = db.execute(
+            _history_query().where(PriceHistory.id > watermark.last_id).order_by(PriceHistory.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+
+        rebuild_series(db, _apply_rows(db, rows))
+        watermark.last_id = rows[-1].id
+        watermark.updated_at = datetime.now(timezone.utc)
+        db.commit()
+        total += len(rows)
+        if len(rows) < batch_size:
+            break
+    return total + _update_from_prices(db, batch_size)
+
+# Precios actuales sin estado o más nuevos que el estado, en lotes por id
+def _update_from_prices(db: Session, batch_size: int) -> int:
+    query = _current_prices_query().outerjoin(PriceIndexState, and_(
+        PriceIndexState.product_id == Price.product_id,
+        PriceIndexState.supermarket_id == Price.supermarket_id,
+    )).where(or_(PriceIndexState.recorded_at.is_(None), Price.updated_at > PriceIndexState.recorded_at))
+    total, last_id = 0, 0
+    while True:
+        watermark = _lock_watermark(db)
+        if _backfill_running(db, watermark):
+            db.rollback()
+            return total
+        rows = db.execute(query.where(Price.id > last_id).order_by(Price.id).limit(batch_size)).all()
+        if not rows:
+            db.commit()
+            return total
+
+        rebuild_series(db, _apply_rows(db, rows))
+        db.commit()
+        total += len(rows)
+        last_id = rows[-1].id
+        if len(rows) < batch_size:
+            return total
+
+# ---------- BACKFILL ----------
+
+# Marca el backfill como en curso y devuelve (último id a procesar, supermercados).
+# Además del historial, el backfill lee los precios actuales.
+def start_backfill(db: Session):
+    watermark = _lock_watermark(db)
+    previous = _lock_watermark(db, BACKFILL_WATERMARK_NAME)
+    # Si ya había uno en curso, el valor a restaurar sigue siendo el de antes de ese
+    if watermark.last_id != BACKFILL_RUNNING:
+        previous.last_id = watermark.last_id
+    previous.updated_at = datetime.now(timezone.utc)
+    watermark.last_id = BACKFILL_RUNNING
+    watermark.updated_at = datetime.now(timezone.utc)
+    max_id = db.execute(select(func.max(PriceHistory.id))).scalar() or 0
+    supermarket_ids = [s for (s,) in db.execute(select(Supermarket.id).order_by(Supermarket.id))]
+    db.commit()
+    return max_id, supermarket_ids
+
+# Recalcula desde cero un supermercado con las filas hasta max_id, en chunks
+def backfill_supermarket(supermarket_id: int, max_id: int, region: str = None) -> int:
+    db = SessionLocal(region=region)
+    try:
+        db.execute(delete(PriceIndexDay).where(PriceIndexDay.supermarket_id == supermarket_id))
+        db.execute(delete(PriceIndexState).where(PriceIndexState.supermarket_id == supermarket_id))
+
+        state = {}
+        deltas = {}
+        processed = 0
+        result = db.execute(
+            _history_query()
+            .where(PriceHistory.supermarket_id == supermarket_id, PriceHistory.id <= max_id)
+            .order_by(PriceHistory.recorded_at, PriceHistory.id)
+            .execution_options(yield_per=PRICE_INDEX_BACKFILL_CHUNK)
+        )
+        for chunk in result.partitions():
+            _accumulate(chunk, state, deltas)
+            processed += len(chunk)
+        # Después del historial, el precio vigente de cada producto
+        current = db.execute(
+            _current_prices_query()
+            .where(Price.supermarket_id == supermarket_id)
+            .order_by(Price.updated_at, Price.id)
+            .execution_options(yield_per=PRICE_INDEX_BACKFILL_CHUNK)
+        )
+        for chunk in current.partitions():
+            _accumulate(chunk, state, deltas)
+            processed += len(chunk)
+
+        _save_state(db, state, set(state), existing=set())
+        _apply_deltas(db, deltas)
+        rebuild_series(db, {(k[1], k[2]) for k in deltas})
+        db.commit()
+        print(f"📈 Índice de precios: supermercado {supermarket_id}, {processed} filas")
+        return processed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+def finish_backfill(db: Session, max_id: int):
+    watermark = _lock_watermark(db)
+    watermark.last_id = max_id
+    watermark.updated_at = datetime.now(timezone.utc)
+    db.commit()
+
+# Un supermercado falló: los que terminaron quedan recalculados hasta max_id y el que
+# falló hizo rollback, así que el incremental puede seguir desde el watermark de antes
+# (las filas que vuelve a leer ya están en el estado y no suman nada).
+def abort_backfill(db: Session):
+    watermark = _lock_watermark(db)
+    if watermark.last_id == BACKFILL_RUNNING:
+        _restore_watermark(db, watermark)
+        print(f"⚠️ Backfill del índice de precios fallido: watermark restaurado a {watermark.last_id}")
+    db.commit()
+
+# Backfill en este proceso con un pool de threads (el de Celery reparte entre workers)
+def run_backfill(workers: int = PRICE_INDEX_BACKFILL_WORKERS, region: str = None) -> int:
+    db = SessionLocal(region=region)
+    try:
+        max_id, supermarket_ids = start_backfill(db)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                processed = sum(pool.map(lambda s: backfill_supermarket(s, max_id, region), supermarket_ids))
+        except Exception:
+            abort_backfill(db)
+            raise
+        finish_backfill(db, max_id)
+        return processed
+    finally:
+        db.close()
+
+# ---------- LECTURA ----------
+
+# Series de los supermercados de la región
+def get_index_series(db: Session, region: str, supermarket_id: int = None, category: str = ALL_CATEGORIES,
+                     start=None, end=None) -> list[dict]:
+    query = (
+        select(PriceIndexDay.supermarket_id, Supermarket.name, PriceIndexDay.day,
+               PriceIndexDay.index_value, PriceIndexDay.products)
+        .join(Supermarket, Supermarket.id == PriceIndexDay.supermarket_id)
+        .where(PriceIndexDay.category == category, Supermarket.region == region)
+    )
+    if supermarket_id is not None:
+        query = query.where(PriceIndexDay.supermarket_id == supermarket_id)
+    if start is not None:
+        query = query.where(PriceIndexDay.day >= start)
+    if end is not None:
+        query = query.where(PriceIndexDay.day <= end)
+
+    series = {}
+    for row in db.execute(query.order_by(PriceIndexDay.supermarket_id, PriceIndexDay.day)):
+        entry = series.setdefault(row.supermarket_id, {
+            "supermarket_id": row.supermarket_id,
+            "supermarket": row.name,
+            "category": category,
+            "points": [],
+        })
+        entry["points"].append({"day": row.day, "index": row.index_value, "products": row.products})
+    return list(series.values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Actualizar el índice diario de precios")
+    parser.add_argument("--backfill", action="store_true", help="recalcular todo el historial")
+    parser.add_argument("--workers", type=int, default=PRICE_INDEX_BACKFILL_WORKERS)
+    parser.add_argument("--region", default=None, help="región con base propia (por defecto, la base principal)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(f"📈 Backfill terminado: {run_backfill(args.workers, args.region)} filas")
+    else:
+        db = SessionLocal(region=args.region)
+        try:
+            print(f"📈 Índice actualizado: {update_price_index(db)} filas nuevas")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    main()
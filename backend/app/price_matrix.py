@@ -0,0 +1,61 @@
+# app/price_matrix.py
+# Grilla productos × supermercados para la pantalla de comparación, en formato
+# columnar: un array de ids de producto, la lista de supermercados y un array
+# plano de precios (fila por producto, null donde no hay precio).
+import msgpack
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import Price, Product, PRODUCT_IS_LIVE
+from app.supermarkets import all_supermarkets
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+# Con region, solo la partición de esa región y sus supermercados como columnas
+def build_price_matrix(db: Session, category: str = None, generic_id: int = None, region: str = None) -> dict:
+    query = (
+        select(Price.product_id, Price.supermarket_id, Price.price)
+        .join(Product, Product.id == Price.product_id)
+        .where(Price.price.isnot(None), Price.supermarket_id.isnot(None), PRODUCT_IS_LIVE)
+    )
+    if region is not None:
+        query = query.where(Price.region == region)
+    if category is not None:
+        query = query.where(Product.category == category)
+    if generic_id is not None:
+        query = query.where(Product.generic_product_id == generic_id)
+
+    rows = db.execute(query).all()
+    supermarkets = all_supermarkets(db, region)
+    supermarket_ids = np.array([s[0] for s in supermarkets], dtype=np.int64)
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, 3)
+    if len(data) and len(supermarket_ids):
+        # all_supermarkets viene ordenado por id, así que searchsorted da la columna.
+        # Un precio de un supermercado que no está en la lista (de otra región, o dado
+        # de alta entre las dos consultas) se descarta: si no, caería en otra columna.
+        price_supermarkets = data[:, 1].astype(np.int64)
+        col_idx = np.searchsorted(supermarket_ids, price_supermarkets).clip(max=len(supermarket_ids) - 1)
+        known = supermarket_ids[col_idx] == price_supermarkets
+        data, col_idx = data[known], col_idx[known]
+    else:
+        data = data[:0]
+    if len(data):
+        product_ids, row_idx = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+        grid = np.full(len(product_ids) * len(supermarket_ids), np.nan)
+        grid[row_idx * len(supermarket_ids) + col_idx] = data[:, 2]
+    else:
+        product_ids = np.empty(0, dtype=np.int64)
+        grid = np.empty(0)
+
+    prices = grid.astype(object)
+    prices[np.isnan(grid)] = None
+    return {
+        "shape": [len(product_ids), len(supermarket_ids)],
+        "product_ids": product_ids.tolist(),
+        "supermarkets": [{"id": s[0], "name": s[1], "slug": s[2]} for s in supermarkets],
+        "prices": prices.tolist(),
+    }
+
+def pack_msgpack(payload: dict) -> bytes:
+    return msgpack.packb(payload, use_bin_type=True)
@@ -0,0 +1,101 @@
+# app/price_validation.py
+# Detección de precios anómalos en lotes (scrapers que mandan x100, ceros, etc.).
+# Compara cada precio entrante con la mediana reciente de ese producto en ese
+# supermercado. Todo el lote se evalúa con operaciones de NumPy, sin loops por fila.
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select, union_all
+from sqlalchemy.orm import Session
+from app.models import Price, PriceHistory
+
+OUTLIER_LOOKBACK_DAYS = int(os.getenv("OUTLIER_LOOKBACK_DAYS", "90"))
+# Más de OUTLIER_RATIO veces (o menos de 1/OUTLIER_RATIO) la mediana es sospechoso
+OUTLIER_RATIO = float(os.getenv("OUTLIER_RATIO", "5"))
+# Con suficiente historial, también lo que se aleja más de OUTLIER_IQR_FACTOR rangos intercuartiles
+OUTLIER_IQR_FACTOR = float(os.getenv("OUTLIER_IQR_FACTOR", "10"))
+OUTLIER_IQR_MIN_SAMPLES = int(os.getenv("OUTLIER_IQR_MIN_SAMPLES", "5"))
+# Tamaño de los IN (...) al traer el historial
+STATS_QUERY_CHUNK = 5000
+
+REASON_OK = 0
+REASON_NON_POSITIVE = 1
+REASON_RATIO = 2
+REASON_SPREAD = 3
+REASONS = {
+    REASON_NON_POSITIVE: "non_positive",
+    REASON_RATIO: "ratio_to_median",
+    REASON_SPREAD: "outside_iqr",
+}
+
+# (producto, supermercado) empaquetado en un int64 para ordenar y buscar vectorizado
+def pack_keys(product_ids, supermarket_ids):
+    return (np.asarray(product_ids, dtype=np.int64) << 16) | np.asarray(supermarket_ids, dtype=np.int64)
+
+def _load_reference_prices(db: Session, product_ids) -> np.ndarray:
+    since = datetime.now(timezone.utc) - timedelta(days=OUTLIER_LOOKBACK_DAYS)
+    ids = sorted(set(int(p) for p in product_ids))
+    rows = []
+    for i in range(0, len(ids), STATS_QUERY_CHUNK):
+        chunk = ids[i:i + STATS_QUERY_CHUNK]
+        history = select(PriceHistory.product_id, PriceHistory.supermarket_id, PriceHistory.price).where(
+            PriceHistory.product_id.in_(chunk), PriceHistory.recorded_at >= since, PriceHistory.price > 0
+        )
+        current = select(Price.product_id, Price.supermarket_id, Price.price).where(
+            Price.product_id.in_(chunk), Price.price > 0
+        )
+        rows.extend(db.execute(union_all(history, current)).all())
+    if not rows:
+        return np.empty((0, 3))
+    return np.array(rows, dtype=np.float64)
+
+# Estadísticas por grupo: claves ordenadas, cantidad de muestras, mediana, q1 y q3
+def group_stats(keys: np.ndarray, prices: np.ndarray):
+    order = np.lexsort((prices, keys))
+    keys = keys[order]
+    prices = prices[order]
+    unique_keys, start, counts = np.unique(keys, return_index=True, return_counts=True)
+
+    def quantile(q):
+        position = (counts - 1) * q
+        lo = start + np.floor(position).astype(np.int64)
+        hi = start + np.ceil(position).astype(np.int64)
+        return prices[lo] + (prices[hi] - prices[lo]) * (position - np.floor(position))
+
+    return unique_keys, counts, quantile(0.5), quantile(0.25), quantile(0.75)
+
+# Devuelve (código de motivo por fila, mediana de referencia por fila).
+# Código 0 = precio aceptado.
+def detect_outliers(db: Session, product_ids, supermarket_ids, prices):
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    supermarket_ids = np.asarray(supermarket_ids, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    reasons = np.zeros(len(prices), dtype=np.int8)
+    reference = np.full(len(prices), np.nan)
+    if len(prices) == 0:
+        return reasons, reference
+
+    reasons[~np.isfinite(prices) | (prices <= 0)] = REASON_NON_POSITIVE
+
+    samples = _load_reference_prices(db, product_ids)
+    if len(samples):
+        stat_keys, counts, median, q1, q3 = group_stats(pack_keys(samples[:, 0], samples[:, 1]), samples[:, 2])
+        keys = pack_keys(product_ids, supermarket_ids)
+        pos = np.minimum(np.searchsorted(stat_keys, keys), len(stat_keys) - 1)
+        found = stat_keys[pos] == keys
+        reference = np.where(found, median[pos], np.nan)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = prices / reference
+            spread = np.abs(prices - reference) / (q3[pos] - q1[pos])
+        ratio_outlier = found & ((ratio > OUTLIER_RATIO) | (ratio < 1 / OUTLIER_RATIO))
+        spread_outlier = (
+            found
+            & (counts[pos] >= OUTLIER_IQR_MIN_SAMPLES)
+            & (q3[pos] > q1[pos])
+            & (spread > OUTLIER_IQR_FACTOR)
+        )
+        reasons[(reasons == REASON_OK) & ratio_outlier] = REASON_RATIO
+        reasons[(reasons == REASON_OK) & spread_outlier] = REASON_SPREAD
+
+    return reasons, reference
@@ -0,0 +1,88 @@
+# app/product_purge.py
+# Purga de productos borrados. DELETE /products/{id} solo marca deleted_at y encola
+# una ProductPurge; acá se borran historial, cestas, precios y submissions en lotes
+# chicos, con un commit por lote, así ninguna transacción mantiene locks mucho tiempo.
+# Al final se borra la fila del producto. Es idempotente: se puede reintentar.
+import os
+import time
+from datetime import datetime, timezone
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from app.models import Product, Price, PriceHistory, Basket, PriceSubmission, PriceQuarantine, ProductPurge
+from app.admin_stats import record
+
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "5000"))
+# Pausa entre lotes para dejar pasar al resto de las escrituras
+PURGE_BATCH_PAUSE_SECONDS = float(os.getenv("PURGE_BATCH_PAUSE_SECONDS", "0.05"))
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "30"))
+
+# (contador en ProductPurge, tabla); los precios van después del historial
+PURGE_STEPS = [
+    ("history_deleted", PriceHistory),
+    ("basket_deleted", Basket),
+    ("prices_deleted", Price),
+    ("submissions_deleted", PriceQuarantine),
+    ("submissions_deleted", PriceSubmission),
+]
+
+def _delete_batch(db: Session, model, product_id: int) -> int:
+    ids = select(model.id).where(model.product_id == product_id).limit(PURGE_BATCH_SIZE)
+    statement = delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False)
+    if model is Price:
+        # Los contadores de /admin/stats van por supermercado
+        deleted = db.execute(statement.returning(Price.supermarket_id)).scalars().all()
+        for supermarket_id in set(deleted):
+            record(db, f"prices:{supermarket_id}", -deleted.count(supermarket_id))
+        return len(deleted)
+    deleted = db.execute(statement).rowcount
+    if model is PriceHistory:
+        record(db, "price_history", -deleted)
+    return deleted
+
+def run_purge(db: Session, purge: ProductPurge):
+    for counter, model in PURGE_STEPS:
+        while True:
+            deleted = _delete_batch(db, model, purge.product_id)
+            setattr(purge, counter, (getattr(purge, counter) or 0) + deleted)
+            db.commit()
+            if deleted < PURGE_BATCH_SIZE:
+                break
+            time.sleep(PURGE_BATCH_PAUSE_SECONDS)
+
+    # Solo si sigue borrado (nadie lo restauró mientras tanto)
+    db.execute(delete(Product).where(Product.id == purge.product_id, Product.deleted_at.isnot(None)))
+    purge.status = "done"
+    purge.finished_at = datetime.now(timezone.utc)
+    db.commit()
+
+# Procesa las purgas encoladas. Devuelve cuántas terminaron bien.
+def purge_deleted_products(db: Session, limit: int = 10) -> int:
+    queued = (
+        db.query(ProductPurge)
+        .filter(ProductPurge.status == "queued")
+        .order_by(ProductPurge.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    # Reclamarlas todas antes de empezar: el primer commit suelta los locks
+    for purge in queued:
+        purge.status = "running"
+        purge.started_at = datetime.now(timezone.utc)
+        purge.error = None
+    db.commit()
+
+    done = 0
+    for purge in queued:
+        try:
+            run_purge(db, purge)
+            done += 1
+            print(f"🧹 Producto {purge.product_id} purgado")
+        except Exception as e:
+            db.rollback()
+            purge.status = "failed"
+            purge.error = str(e)
+            purge.finished_at = datetime.now(timezone.utc)
+            db.commit()
+            print(f"❌ Falló la purga del producto {purge.product_id}: {e}")
+    return done
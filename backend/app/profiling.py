@@ -0,0 +1,317 @@
+# app/profiling.py
+# Profiling a pedido para admins: un request con el header "X-Profile: 1" (o ?_profile=1)
+# y un token de admin corre bajo cProfile, con el tiempo de cada query SQL.
+# El reporte queda en PROFILE_DIR (JSON + .prof para snakeviz / pstats) y la respuesta
+# lleva X-Profile-Id para bajarlo de GET /admin/profiles/{id}.
+#
+# - Los handlers síncronos corren en el threadpool de anyio: cada llamada al threadpool
+#   hecha por el request perfilado lleva su propio cProfile (el contextvar viaja al
+#   thread) y al final se suman. El thread del event loop también se perfila, pero lo
+#   comparte con otros requests: sus corutinas pueden aparecer en el reporte.
+# - Las queries se miden con los eventos de cursor de todos los engines (primario,
+#   réplicas, regiones).
+# - Sin el flag el costo es leer un contextvar por query y por llamada al threadpool.
+# - Si el token no es de admin, hay otro request perfilándose en este worker o se
+#   pasó el límite (compartido entre workers, como el rate limit), el request corre
+#   normal y la respuesta dice por qué en X-Profile-Status.
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+from uuid import uuid4
+import anyio.to_thread
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.auth import token_subject
+from app.database import SessionLocal
+from app.models import User
+from app.rate_limit import RateLimitGroup, limiter
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/mastermarket-profiles")
+# Requests perfilados por minuto entre todos los workers (y ráfaga máxima)
+PROFILE_PER_MINUTE = float(os.getenv("PROFILE_PER_MINUTE", "2"))
+PROFILE_BURST = int(os.getenv("PROFILE_BURST", "3"))
+# Reportes que se guardan (se borran los más viejos)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+PROFILE_TOP_FUNCTIONS = 40
+PROFILE_TOP_STATEMENTS = 20
+
+QUERY_FLAG = "_profile"
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{12}$")
+
+profile_rate_limit = RateLimitGroup("profile", PROFILE_BURST, PROFILE_PER_MINUTE)
+
+@dataclass
+class RequestProfile:
+    id: str
+    profilers: list = field(default_factory=list)
+    # statement → [veces, segundos en total, máximo]
+    statements: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def record_sql(self, statement: str, seconds: float):
+        with self._lock:
+            entry = self.statements.setdefault(statement, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def add_profiler(self, profiler: cProfile.Profile):
+        with self._lock:
+            self.profilers.append(profiler)
+
+# Request perfilado en curso (None casi siempre)
+active_profile = contextvars.ContextVar("active_profile", default=None)
+
+# ---------- THREADPOOL ----------
+
+_run_sync = anyio.to_thread.run_sync
+
+def _profiled(profile: RequestProfile, func):
+    def run(*args):
+        profiler = cProfile.Profile()
+        profile.add_profiler(profiler)
+        profiler.enable()
+        try:
+            return func(*args)
+        finally:
+            profiler.disable()
+    return run
+
+# FastAPI y Starlette llaman a anyio.to_thread.run_sync para cada handler y
+# dependencia síncronos; no hay otro punto donde enganchar el thread que los corre
+async def _run_sync_with_profile(func, *args, **kwargs):
+    profile = active_profile.get()
+    if profile is not None:
+        func = _profiled(profile, func)
+    return await _run_sync(func, *args, **kwargs)
+
+# ---------- SQL ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if active_profile.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = active_profile.get()
+    starts = conn.info.get("profile_query_start")
+    if profile is not None and starts:
+        profile.record_sql(" ".join(statement.split())[:500], time.perf_counter() - starts.pop())
+
+if PROFILING_ENABLED:
+    anyio.to_thread.run_sync = _run_sync_with_profile
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+# ---------- REPORTES ----------
+
+def _function_name(key) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    parts = filename.replace("\\", "/").split("/")
+    return f"{name} ({'/'.join(parts[-2:])}:{line})"
+
+# La maquinaria del event loop (incluida la espera en epoll) no dice nada del request
+def _is_event_loop(key) -> bool:
+    filename, _, name = key
+    return "/asyncio/" in filename or filename.endswith("selectors.py") or name.startswith("<method 'poll'")
+
+def build_report(profile: RequestProfile, stats: pstats.Stats, meta: dict) -> dict:
+    functions = sorted(
+        ((key, value) for key, value in stats.stats.items() if not _is_event_loop(key)),
+        key=lambda item: item[1][3], reverse=True,
+    )
+    statements = sorted(profile.statements.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "id": profile.id,
+        **meta,
+        "threadpool_calls": len(profile.profilers) - 1,
+        "functions": [
+            {
+                "function": _function_name(key),
+                "calls": calls,
+                "primitive_calls": primitive,
+                "own_ms": round(own * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            }
+            for key, (primitive, calls, own, cumulative, _) in functions[:PROFILE_TOP_FUNCTIONS]
+        ],
+        "sql": {
+            "queries": sum(count for count, _, _ in profile.statements.values()),
+            "total_ms": round(sum(total for _, total, _ in profile.statements.values()) * 1000, 3),
+            "statements": [
+                {"statement": statement, "count": count, "total_ms": round(total * 1000, 3), "max_ms": round(slowest * 1000, 3)}
+                for statement, (count, total, slowest) in statements[:PROFILE_TOP_STATEMENTS]
+            ],
+        },
+    }
+
+def _prune_reports():
+    reports = sorted(
+        (f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")),
+        key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)),
+    )
+    for name in reports[:max(0, len(reports) - PROFILE_KEEP)]:
+        for extension in (".json", ".prof"):
+            path = os.path.join(PROFILE_DIR, name[:-5] + extension)
+            if os.path.exists(path):
+                os.remove(path)
+
+def save_report(profile: RequestProfile, meta: dict) -> dict:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stats = pstats.Stats(*profile.profilers)
+    report = build_report(profile, stats, meta)
+    stats.dump_stats(os.path.join(PROFILE_DIR, f"{profile.id}.prof"))
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w") as f:
+        json.dump(report, f)
+    _prune_reports()
+    print(f"🔬 Profile {profile.id}: {meta['method']} {meta['path']} en {meta['duration_ms']} ms")
+    return report
+
+def report_path(profile_id: str, extension: str = ".json"):
+    if not PROFILE_ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}{extension}")
+    return path if os.path.exists(path) else None
+
+def load_report(profile_id: str):
+    path = report_path(profile_id)
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+# Resumen de los reportes guardados, el más nuevo primero
+def list_reports(limit: int = 50) -> list[dict]:
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = sorted(
+        (f for f in os.listdir(PROFILE_DIR) if f.endswith(".json")),
+        key=lambda f: os.path.getmtime(os.path.join(PROFILE_DIR, f)),
+        reverse=True,
+    )
+    summaries = []
+    for name in names[:limit]:
+        report = load_report(name[:-5])
+        if report:
+            summaries.append({k: report.get(k) for k in ("id", "method", "path", "status", "duration_ms", "created_at")}
+                             | {"sql_ms": report["sql"]["total_ms"]})
+    return summaries
+
+# ---------- MIDDLEWARE ----------
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def profile_requested(scope) -> bool:
+    flag = _header(scope, b"x-profile")
+    if flag is None:
+        flag = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(QUERY_FLAG, [None])[0]
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+def _is_admin(user_id: int) -> bool:
+    db = SessionLocal()
+    try:
+        user = db.get(User, user_id)
+        return user is not None and user.role == "admin"
+    finally:
+        db.close()
+
+async def _admin_id(scope):
+    authorization = _header(scope, b"authorization")
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    subject = token_subject(authorization[7:].strip())
+    try:
+        user_id = int(subject)
+    except (TypeError, ValueError):
+        return None
+    return user_id if await _run_sync(_is_admin, user_id) else None
+
+def _with_headers(send, headers: list):
+    async def send_with_headers(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": list(message.get("headers", [])) + headers}
+        await send(message)
+    return send_with_headers
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        # Un request perfilado a la vez por worker: cProfile usa un solo hook por thread
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if not PROFILING_ENABLED or scope["type"] != "http" or not profile_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        user_id = await _admin_id(scope)
+        refused = None
+        if user_id is None:
+            refused = "forbidden"
+        elif self._busy:
+            refused = "busy"
+        else:
+            # Se toma antes del próximo await, así dos requests no pasan el chequeo a la vez
+            self._busy = True
+            try:
+                allowed = (await limiter.take("ratelimit:profile", profile_rate_limit))[0]
+            except BaseException:
+                self._busy = False
+                raise
+            if not allowed:
+                self._busy = False
+                refused = "rate-limited"
+        if refused:
+            await self.app(scope, receive, _with_headers(send, [(b"x-profile-status", refused.encode())]))
+            return
+
+        profile = RequestProfile(id=uuid4().hex[:12])
+        loop_profiler = cProfile.Profile()
+        profile.add_profiler(loop_profiler)
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = active_profile.set(profile)
+        created_at = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        try:
+            loop_profiler.enable()
+            # La compresión no sirve este request desde su cache
+            await self.app({**scope, "profiling": True}, receive,
+                           _with_headers(send_with_status, [(b"x-profile-id", profile.id.encode())]))
+        finally:
+            loop_profiler.disable()
+            duration_ms = round((time.perf_counter() - started) * 1000, 3)
+            active_profile.reset(token)
+            self._busy = False
+            meta = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": status.get("code"),
+                "user_id": user_id,
+                "created_at": created_at,
+                "duration_ms": duration_ms,
+            }
+            try:
+                await _run_sync(save_report, profile, meta)
+            except Exception as e:
+                print(f"⚠️ No se pudo guardar el profile {profile.id}: {e}")
@@ -0,0 +1,74 @@
+# app/quantity_backfill.py
+# Backfill único de la cantidad estructurada (migración 002): los productos cargados
+# antes no tienen net_quantity/unit, así que tampoco base_quantity ni unit_price en
+# sus precios, y no aparecen en best-value.
+# Para cada producto vivo sin base_quantity: si no tiene net_quantity/unit se sacan
+# del tamaño al final del nombre ("Avonmore Milk 2L"), se normaliza con to_base y se
+# recalcula el unit_price de sus precios. Los que no se pueden parsear quedan igual
+# (se corrigen a mano con PUT /products/{id}).
+# Recorre por id en lotes (keyset), así se puede cortar y volver a correr.
+#
+# CLI: python -m app.quantity_backfill [--batch-size 500] [--region gb]
+import argparse
+import os
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, session_database
+from app.models import Price, Product, PRODUCT_IS_LIVE
+from app.price_cache import invalidate_products
+from app.units import to_base, parse_name_quantity
+
+QUANTITY_BACKFILL_BATCH_SIZE = int(os.getenv("QUANTITY_BACKFILL_BATCH_SIZE", "500"))
+
+# Devuelve (productos revisados, productos con base_quantity nueva)
+def backfill_quantities(db: Session, batch_size: int = QUANTITY_BACKFILL_BATCH_SIZE) -> tuple[int, int]:
+    seen = updated = 0
+    last_id = 0
+    while True:
+        products = (
+            db.query(Product)
+            .filter(Product.base_quantity.is_(None), Product.id > last_id, PRODUCT_IS_LIVE)
+            .order_by(Product.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not products:
+            break
+        last_id = products[-1].id
+        seen += len(products)
+
+        changed = []
+        for product in products:
+            net_quantity, unit = product.net_quantity, product.unit
+            if net_quantity is None and unit is None:
+                net_quantity, unit = parse_name_quantity(product.name)
+            base_quantity, base_unit = to_base(net_quantity, unit)
+            if base_quantity is None:
+                continue
+            product.net_quantity, product.unit = net_quantity, unit
+            product.base_quantity, product.base_unit = base_quantity, base_unit
+            db.query(Price).filter(Price.product_id == product.id).update(
+                {Price.unit_price: Price.price / base_quantity}, synchronize_session=False,
+            )
+            changed.append(product.id)
+        db.commit()
+        # El UPDATE de unit_price no pasa por write-through
+        invalidate_products(session_database(db), changed)
+        updated += len(changed)
+        print(f"📦 Hasta id {last_id}: {updated} de {seen} productos con cantidad")
+    return seen, updated
+
+def main():
+    parser = argparse.ArgumentParser(description="Completar net_quantity/base_quantity y unit_price de productos viejos")
+    parser.add_argument("--batch-size", type=int, default=QUANTITY_BACKFILL_BATCH_SIZE)
+    parser.add_argument("--region", default=None, help="región con base propia (por defecto, la base principal)")
+    args = parser.parse_args()
+
+    db = SessionLocal(region=args.region)
+    try:
+        seen, updated = backfill_quantities(db, args.batch_size)
+        print(f"🩹 Backfill terminado: {updated} de {seen} productos actualizados")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# app/rate_limit.py
+# Rate limiting con token buckets. Cada request cae en un grupo de rutas (login,
+# lecturas pesadas, escrituras, lecturas) y se descuenta un token del bucket de
+# (grupo, usuario) si trae un token JWT válido, o de (grupo, IP) si no.
+# El bucket vive en Redis y se actualiza con un script Lua atómico, así el límite
+# es el mismo con uno o varios workers. Si Redis no responde, se usan buckets en
+# memoria por worker (más permisivos: N workers = N veces el límite) hasta que vuelva.
+# Las respuestas llevan los headers RateLimit-* y los 429 también Retry-After.
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from app.auth import token_subject
+from app.redis_client import get_async_redis
+from app.load_shedding import EXEMPT_PREFIXES
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Detrás de un balancer la IP real viene en X-Forwarded-For. Los primeros valores los
+# manda el cliente (puede poner cualquier cosa); cada proxy agrega al final la IP de
+# quien le habló. Con N proxies propios delante, la IP del cliente es la N-ésima desde
+# la derecha. RATE_LIMIT_TRUST_FORWARDED_FOR=true equivale a un proxy.
+RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true"
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "1" if RATE_LIMIT_TRUST_FORWARDED_FOR else "0"))
+# Tras un error de Redis, cuánto tiempo se usan solo los buckets en memoria
+RATE_LIMIT_REDIS_RETRY_SECONDS = float(os.getenv("RATE_LIMIT_REDIS_RETRY_SECONDS", "5"))
+# Máximo de buckets en memoria por worker (se descartan los menos usados)
+RATE_LIMIT_MEMORY_BUCKETS = 10000
+
+@dataclass
+class RateLimitGroup:
+    name: str
+    capacity: int           # ráfaga máxima
+    per_minute: float       # tokens que se recuperan por minuto
+    prefixes: tuple = ()    # rutas del grupo; vacío = cualquiera
+    methods: tuple = ()     # métodos del grupo; vacío = cualquiera
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60.0
+
+    def matches(self, method: str, path: str) -> bool:
+        if self.methods and method not in self.methods:
+            return False
+        return not self.prefixes or path.startswith(self.prefixes)
+
+# Se evalúan en orden, gana el primero que coincide
+rate_limit_groups = [
+    # Fuerza bruta de contraseñas y registros masivos
+    RateLimitGroup("auth", 10, 10, prefixes=("/auth",)),
+    RateLimitGroup("auth", 10, 10, prefixes=("/users",), methods=("POST",)),
+    # Lecturas que recorren todo el catálogo
+    RateLimitGroup("heavy", 10, 10, prefixes=("/products/with-prices", "/prices/matrix")),
+    RateLimitGroup("write", 60, 60, methods=("POST", "PUT", "PATCH", "DELETE")),
+    RateLimitGroup("read", 300, 300),
+]
+# Ej: RATE_LIMITS_JSON='{"read": {"capacity": 600, "per_minute": 600}}'
+for _name, _limits in json.loads(os.getenv("RATE_LIMITS_JSON", "{}")).items():
+    for _group in rate_limit_groups:
+        if _group.name == _name:
+            _group.capacity = int(_limits.get("capacity", _group.capacity))
+            _group.per_minute = float(_limits.get("per_minute", _group.per_minute))
+
+def classify(method: str, path: str) -> RateLimitGroup:
+    return next(g for g in rate_limit_groups if g.matches(method, path))
+
+# ---------- BUCKETS ----------
+
+# Recarga según el tiempo transcurrido (reloj de Redis, igual para todos los
+# workers), descuenta un token si hay y devuelve {permitido, tokens que quedan}.
+# Los números van como string: Redis trunca a entero los números de Lua.
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', string.format('%.6f', now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity / rate) * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+class MemoryBuckets:
+    def __init__(self, max_buckets: int = RATE_LIMIT_MEMORY_BUCKETS):
+        self.buckets = OrderedDict()
+        self.max_buckets = max_buckets
+
+    def take(self, key: str, capacity: int, rate: float):
+        now = time.monotonic()
+        tokens, ts = self.buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self.buckets[key] = (tokens, now)
+        while len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+        return allowed, tokens
+
+class RateLimiter:
+    def __init__(self):
+        self.memory = MemoryBuckets()
+        self._script = None
+        self._redis_down_until = 0.0
+
+    async def take(self, key: str, group: RateLimitGroup):
+        if time.monotonic() >= self._redis_down_until:
+            try:
+                if self._script is None:
+                    self._script = get_async_redis().register_script(TOKEN_BUCKET_LUA)
+                allowed, tokens = await self._script(keys=[key], args=[group.capacity, group.rate])
+                return bool(allowed), float(tokens)
+            except Exception as e:
+                print(f"⚠️ Rate limit sin Redis, usando buckets en memoria: {e}")
+                self._redis_down_until = time.monotonic() + RATE_LIMIT_REDIS_RETRY_SECONDS
+        return self.memory.take(key, group.capacity, group.rate)
+
+limiter = RateLimiter()
+
+# ---------- MIDDLEWARE ----------
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+# IP que agregó el primero de nuestros proxies (la N-ésima desde la derecha, sumando
+# todos los headers X-Forwarded-For). Si hay menos valores que proxies, el header no
+# pasó por todos ellos y no se usa.
+def forwarded_client(scope, trusted_proxies: int):
+    if trusted_proxies <= 0:
+        return None
+    hops = [
+        hop.strip()
+        for key, value in scope["headers"] if key == b"x-forwarded-for"
+        for hop in value.decode("latin-1").split(",")
+    ]
+    hops = [hop for hop in hops if hop]
+    return hops[-trusted_proxies] if len(hops) >= trusted_proxies else None
+
+def client_identity(scope) -> str:
+    authorization = _header(scope, b"authorization")
+    if authorization and authorization.lower().startswith("bearer "):
+        subject = token_subject(authorization[7:].strip())
+        if subject is not None:
+            return f"user:{subject}"
+    forwarded = forwarded_client(scope, RATE_LIMIT_TRUSTED_PROXIES)
+    if forwarded:
+        return f"ip:{forwarded}"
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+# Headers del draft IETF de RateLimit: Limit = ráfaga, Remaining = tokens enteros,
+# Reset = segundos hasta tener el bucket lleno otra vez
+def rate_limit_headers(group: RateLimitGroup, tokens: float) -> list:
+    window = math.ceil(group.capacity / group.rate)
+    reset = math.ceil((group.capacity - tokens) / group.rate)
+    return [
+        (b"ratelimit-limit", str(group.capacity).encode()),
+        (b"ratelimit-remaining", str(int(tokens)).encode()),
+        (b"ratelimit-reset", str(reset).encode()),
+        (b"ratelimit-policy", f"{group.capacity};w={window}".encode()),
+    ]
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not RATE_LIMIT_ENABLED or scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        group = classify(scope["method"], scope["path"])
+        allowed, tokens = await limiter.take(f"ratelimit:{group.name}:{client_identity(scope)}", group)
+        headers = rate_limit_headers(group, tokens)
+
+        if not allowed:
+            retry_after = math.ceil((1 - tokens) / group.rate)
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            await send({"type": "http.response.start", "status": 429, "headers": headers + [
+                (b"retry-after", str(retry_after).encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
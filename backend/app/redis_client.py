@@ -0,0 +1,43 @@
+# app/redis_client.py
+# Clientes Redis compartidos (el mismo Redis que usa Celery como broker)
+# Con timeouts cortos: el rate limit consulta Redis en cada request, y un Redis colgado
+# (que no rechaza la conexión) tiene que fallar rápido para caer a los buckets en memoria.
+import os
+import redis
+import redis.asyncio as aioredis
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_SOCKET_TIMEOUT_SECONDS = float(os.getenv("REDIS_SOCKET_TIMEOUT_SECONDS", "1"))
+REDIS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "1"))
+
+_client = None
+_async_client = None
+_pubsub_client = None
+
+def get_redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            REDIS_URL, decode_responses=True,
+            socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+        )
+    return _client
+
+def get_async_redis() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(
+            REDIS_URL, decode_responses=True,
+            socket_timeout=REDIS_SOCKET_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+        )
+    return _async_client
+
+# Para suscripciones pub/sub: la lectura espera mensajes sin límite, así que sin
+# socket_timeout (con él, una suscripción sin mensajes se cortaría cada pocos segundos)
+def get_pubsub_redis() -> aioredis.Redis:
+    global _pubsub_client
+    if _pubsub_client is None:
+        _pubsub_client = aioredis.Redis.from_url(
+            REDIS_URL, decode_responses=True, socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+        )
+    return _pubsub_client
@@ -0,0 +1,41 @@
+# app/regions.py
+# Región (país) de cada request. prices y price_history están particionadas por
+# lista de región en Postgres (migrations/010_region_partitions.sql): filtrando por
+# region, una query solo lee la partición de su país.
+# La región sale de ?region= o del header X-Region; sin ninguno, DEFAULT_REGION.
+# Las regiones de REGION_DATABASE_URLS viven en su propia base: get_region_db y
+# get_region_read_db abren la sesión contra esa base (ver RoutingSession).
+from fastapi import Depends, Header, HTTPException, Query
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, DEFAULT_REGION, REGIONS
+
+def normalize_region(region: str):
+    return region.strip().lower() if region else None
+
+def get_region(region: str = Query(None, max_length=8), x_region: str = Header(None, max_length=8)) -> str:
+    region = normalize_region(region) or normalize_region(x_region) or DEFAULT_REGION
+    if region not in REGIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown region: {region}")
+    return region
+
+def get_region_db(region: str = Depends(get_region)):
+    db = SessionLocal(region=region)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Para handlers GET de solo lectura: réplica si hay (en la base principal)
+def get_region_read_db(region: str = Depends(get_region)):
+    db = SessionLocal(use_replica=True, region=region)
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Crea las particiones de la región si faltan (la función la define la migración 010).
+# Sin partición propia, los precios de una región nueva caerían en la partición default.
+def ensure_region_partitions(db: Session, region: str):
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT create_region_partitions(:region)"), {"region": region})
@@ -1,6 +1,25 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+import os
+import shutil
+from uuid import uuid4
+from datetime import datetime, timezone
 from app.auth import require_role  # ajustá el import según tu estructura real
-from app import models
+from app import models, crud
+from app.database import get_db, get_read_db, REGIONS
+from app.schemas import ImportJob as ImportJobSchema, PriceQuarantine as PriceQuarantineSchema, ProductPurge as ProductPurgeSchema
+from app.schemas import GenericMatchSuggestion as GenericMatchSuggestionSchema
+from app.schemas import Supermarket as SupermarketSchema, SupermarketCreate
+from app.supermarkets import get_supermarket_id, get_supermarket_name, get_supermarket_region, all_supermarkets, slugify
+from app.regions import get_region, get_region_db
+from app.singleflight import flights
+from app.load_shedding import load_shedding_snapshot
+from app.catalog_import import IMPORT_DIR, detect_format
+from app.tasks import match_generic_products, import_catalog
+from app.singleflight import product_summary_flight
+from app.admin_stats import get_stats
+from app.profiling import list_reports, load_report, report_path
 
 router = APIRouter(
     prefix="/admin",
@@ -10,3 +29,201 @@ router = APIRouter(
 @router.get("/secret")
 def get_admin_data(current_user: models.User = Depends(require_role("admin"))):
     return {"message": f"Hola {current_user.email}, tenés acceso como admin"}
+
+# Métricas del coalescing de requests (cuántos se colapsaron en una sola query)
+@router.get("/singleflight")
+def get_singleflight_stats(current_user: models.User = Depends(require_role("admin"))):
+    return {name: flight.snapshot() for name, flight in flights.items()}
+
+# Límites, requests en curso y descartados (503/504) por clase de ruta
+@router.get("/load-shedding")
+def get_load_shedding_stats(current_user: models.User = Depends(require_role("admin"))):
+    return load_shedding_snapshot()
+
+# Totales del catálogo, precios y usuarios sin COUNT(*) sobre las tablas grandes.
+# Cada cifra dice si es exacta o estimada y de dónde sale (ver app/admin_stats.py).
+@router.get("/stats")
+def get_admin_stats(db: Session = Depends(get_read_db), current_user: models.User = Depends(require_role("admin"))):
+    return get_stats(db)
+
+# ---------- PROFILING A PEDIDO ----------
+
+# Reportes de los requests perfilados con X-Profile: 1 (ver app/profiling.py)
+@router.get("/profiles")
+def list_profiles(limit: int = 50, current_user: models.User = Depends(require_role("admin"))):
+    return list_reports(limit)
+
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, current_user: models.User = Depends(require_role("admin"))):
+    report = load_report(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return report
+
+# El .prof crudo, para abrir con snakeviz o pstats
+@router.get("/profiles/{profile_id}/pstats")
+def get_profile_pstats(profile_id: str, current_user: models.User = Depends(require_role("admin"))):
+    path = report_path(profile_id, ".prof")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"profile_{profile_id}.prof")
+
+# ---------- SUPERMERCADOS ----------
+
+# Los precios de usuarios solo aceptan supermercados que ya existen en su región:
+# las cadenas nuevas se dan de alta acá (?region= o X-Region)
+@router.get("/supermarkets", response_model=list[SupermarketSchema])
+def list_supermarkets(region: str = Depends(get_region), db: Session = Depends(get_region_db),
+                      current_user: models.User = Depends(require_role("admin"))):
+    return [{"id": i, "name": name, "slug": slug, "region": region} for i, name, slug in all_supermarkets(db, region)]
+
+@router.post("/supermarkets", response_model=SupermarketSchema, status_code=201)
+def create_supermarket(supermarket: SupermarketCreate, region: str = Depends(get_region),
+                       db: Session = Depends(get_region_db),
+                       current_user: models.User = Depends(require_role("admin"))):
+    supermarket_id = get_supermarket_id(db, supermarket.name, create=True, region=region)
+    return {
+        "id": supermarket_id,
+        "name": get_supermarket_name(db, supermarket_id),
+        "slug": slugify(supermarket.name),
+        "region": get_supermarket_region(db, supermarket_id),
+    }
+
+# ---------- IMPORTACIÓN DE CATÁLOGO ----------
+
+# Sube un CSV/JSONL y lo importa en un worker de Celery; devuelve el job para seguir el progreso
+@router.post("/import/products", response_model=ImportJobSchema, status_code=202)
+def import_products(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("admin")),
+):
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid4().hex}_{os.path.basename(file.filename or 'catalog')}")
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+
+    job = models.ImportJob(filename=file.filename or "catalog", status="pending")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    try:
+        import_catalog.delay(job.id, path, detect_format(path))
+    except Exception as e:
+        print(f"❌ No se pudo encolar la importación {job.id}: {e}")
+        job.status = "failed"
+        job.error = "Task queue unavailable"
+        job.finished_at = datetime.now(timezone.utc)
+        db.commit()
+        os.remove(path)
+        raise HTTPException(status_code=503, detail="Task queue unavailable")
+    return job
+
+@router.get("/import/{job_id}", response_model=ImportJobSchema)
+def get_import_job(job_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    job = db.get(models.ImportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+# CSV con las filas rechazadas y el motivo
+@router.get("/import/{job_id}/rejects")
+def get_import_rejects(job_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    job = db.get(models.ImportJob, job_id)
+    if job is None or not job.rejects_path or not os.path.exists(job.rejects_path):
+        raise HTTPException(status_code=404, detail="No rejected rows for this import")
+    return FileResponse(job.rejects_path, media_type="text/csv", filename=f"import_{job_id}_rejects.csv")
+
+# ---------- CUARENTENA DE PRECIOS ----------
+
+@router.get("/price-quarantine", response_model=list[PriceQuarantineSchema])
+def list_price_quarantine(
+    status: str = "pending",
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("admin")),
+):
+    return crud.get_quarantined_prices(db, status=status, skip=skip, limit=limit)
+
+@router.post("/price-quarantine/{quarantine_id}/approve", response_model=PriceQuarantineSchema)
+def approve_price_quarantine(quarantine_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    item = crud.approve_quarantined_price(db, quarantine_id, current_user.id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Pending quarantined price not found")
+    return item
+
+@router.post("/price-quarantine/{quarantine_id}/reject", response_model=PriceQuarantineSchema)
+def reject_price_quarantine(quarantine_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    item = crud.reject_quarantined_price(db, quarantine_id, current_user.id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Pending quarantined price not found")
+    return item
+
+# ---------- PURGA DE PRODUCTOS BORRADOS ----------
+
+@router.get("/purges", response_model=list[ProductPurgeSchema])
+def list_product_purges(
+    status: str = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("admin")),
+):
+    return crud.get_product_purges(db, status=status, skip=skip, limit=limit)
+
+@router.get("/purges/{purge_id}", response_model=ProductPurgeSchema)
+def get_product_purge(purge_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    purge = crud.get_product_purge(db, purge_id)
+    if not purge:
+        raise HTTPException(status_code=404, detail="Purge not found")
+    return purge
+
+@router.post("/purges/{purge_id}/retry", response_model=ProductPurgeSchema)
+def retry_product_purge(purge_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    purge = crud.retry_product_purge(db, purge_id)
+    if not purge:
+        raise HTTPException(status_code=404, detail="Purge not found or already done")
+    return purge
+
+# ---------- MATCHING DE GENÉRICOS ----------
+
+# Lanza una corrida fuera de horario (la tarea de Celery corre una vez por día).
+# Va a un worker de Celery: tarda minutos y en el proceso web ocuparía un lugar de
+# escritura con el statement_timeout de los requests (app/load_shedding.py).
+@router.post("/generic-matches/run", status_code=202)
+def run_generic_matching(current_user: models.User = Depends(require_role("admin"))):
+    try:
+        task = match_generic_products.delay()
+    except Exception as e:
+        print(f"❌ No se pudo encolar el matching de genéricos: {e}")
+        raise HTTPException(status_code=503, detail="Task queue unavailable")
+    return {"status": "queued", "task_id": task.id}
+
+@router.get("/generic-matches", response_model=list[GenericMatchSuggestionSchema])
+def list_generic_matches(
+    status: str = "pending",
+    min_score: float = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(require_role("admin")),
+):
+    return crud.get_generic_match_suggestions(db, status=status, min_score=min_score, skip=skip, limit=limit)
+
+@router.post("/generic-matches/{suggestion_id}/accept", response_model=GenericMatchSuggestionSchema)
+def accept_generic_match(suggestion_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    suggestion = crud.accept_generic_match(db, suggestion_id, current_user.id)
+    if not suggestion:
+        raise HTTPException(status_code=404, detail="Pending suggestion not found")
+    for region in REGIONS:
+        product_summary_flight.forget((region, suggestion.product_id))
+        product_summary_flight.forget((region, suggestion.generic_product_id))
+    return suggestion
+
+@router.post("/generic-matches/{suggestion_id}/reject", response_model=GenericMatchSuggestionSchema)
+def reject_generic_match(suggestion_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(require_role("admin"))):
+    suggestion = crud.reject_generic_match(db, suggestion_id, current_user.id)
+    if not suggestion:
+        raise HTTPException(status_code=404, detail="Pending suggestion not found")
+    return suggestion
@@ -0,0 +1,38 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session
+from app.schemas import PriceIndexSeries
+from app.supermarkets import get_supermarket_id
+from app.regions import get_region, get_region_read_db
+from app.singleflight import SingleFlight
+from app.price_index import get_index_series, ALL_CATEGORIES, PRICE_INDEX_INTERVAL_SECONDS
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# La serie cambia solo cuando corre el job, así que se cachea varios minutos
+PRICE_INDEX_CACHE_SECONDS = min(300, int(PRICE_INDEX_INTERVAL_SECONDS))
+price_index_flight = SingleFlight("price_index", ttl=PRICE_INDEX_CACHE_SECONDS, stale_ttl=PRICE_INDEX_CACHE_SECONDS)
+
+# GET /analytics/index?supermarket=Tesco&category=Dairy&start=2025-01-01
+# Sin supermarket devuelve una serie por supermercado de la región (Tesco vs Aldi vs Lidl)
+@router.get("/index", response_model=list[PriceIndexSeries])
+def read_price_index(
+    response: Response,
+    supermarket: str = None,
+    category: str = ALL_CATEGORIES,
+    start: date = None,
+    end: date = None,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    supermarket_id = None
+    if supermarket is not None:
+        supermarket_id = get_supermarket_id(db, supermarket, region=region)
+        if supermarket_id is None:
+            raise HTTPException(status_code=404, detail="Supermarket not found")
+    response.headers["Cache-Control"] = f"public, max-age={PRICE_INDEX_CACHE_SECONDS}"
+    return price_index_flight.do(
+        (region, supermarket_id, category, start, end),
+        lambda s: get_index_series(s, region, supermarket_id, category, start, end),
+        db,
+    )
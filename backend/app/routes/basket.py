@@ -2,37 +2,38 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from app import crud
 from app.schemas import Basket, BasketCreate, BasketUpdate
-from app.database import SessionLocal
-from app.database import get_db
+from app.regions import get_region_db
 
+# Las cestas van en la base de la región (?region= o X-Region), junto a los productos
+# que referencian: una región con su propia base tiene sus propios ids de producto
 router = APIRouter(prefix="/basket", tags=["basket"])
 
 
 
 @router.get("/", response_model=list[Basket])
-def read_baskets(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_baskets(skip: int = 0, limit: int = 100, db: Session = Depends(get_region_db)):
     return crud.get_baskets(db, skip=skip, limit=limit)
 
 @router.get("/{basket_id}", response_model=Basket)
-def read_basket(basket_id: int, db: Session = Depends(get_db)):
+def read_basket(basket_id: int, db: Session = Depends(get_region_db)):
     db_basket = crud.get_basket(db, basket_id)
     if db_basket is None:
         raise HTTPException(status_code=404, detail="Basket not found")
     return db_basket
 
 @router.post("/", response_model=Basket)
-def create_basket(basket: BasketCreate, db: Session = Depends(get_db)):
+def create_basket(basket: BasketCreate, db: Session = Depends(get_region_db)):
     return crud.create_basket(db, basket)
 
 @router.put("/{basket_id}", response_model=Basket)
-def update_basket(basket_id: int, basket: BasketUpdate, db: Session = Depends(get_db)):
+def update_basket(basket_id: int, basket: BasketUpdate, db: Session = Depends(get_region_db)):
     db_basket = crud.update_basket(db, basket_id, basket)
     if db_basket is None:
         raise HTTPException(status_code=404, detail="Basket not found")
     return db_basket
 
 @router.delete("/{basket_id}", response_model=Basket)
-def delete_basket(basket_id: int, db: Session = Depends(get_db)):
+def delete_basket(basket_id: int, db: Session = Depends(get_region_db)):
     db_basket = crud.delete_basket(db, basket_id)
     if db_basket is None:
         raise HTTPException(status_code=404, detail="Basket not found")
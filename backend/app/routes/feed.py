@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app import models
+from app.auth import get_current_user
+from app.schemas import FeedPage
+from app.deals_feed import get_feed
+
+router = APIRouter(prefix="/feed", tags=["feed"])
+
+# GET /feed?limit=20 → ofertas para el usuario logueado (bajadas de precio de
+# productos de su cesta o de sus genéricos), la más nueva primero.
+# Siguiente página: GET /feed?before=<next_before>
+@router.get("/", response_model=FeedPage)
+def read_feed(
+    before: int = None,
+    limit: int = Query(20, ge=1, le=100),
+    user: models.User = Depends(get_current_user)
+):
+    try:
+        return get_feed(user.id, before=before, limit=limit)
+    except Exception as e:
+        print(f"⚠️ No se pudo leer el feed: {e}")
+        raise HTTPException(status_code=503, detail="Feed unavailable, retry later")
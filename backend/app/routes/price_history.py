@@ -1,18 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
+import os
+from datetime import datetime
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.models import PriceHistory
-from app.schemas import PriceHistory as PriceHistorySchema
+from app.models import PriceHistory, Product, PRODUCT_IS_LIVE
+from app.schemas import PriceHistory as PriceHistorySchema, PriceChart
+from app.supermarkets import get_supermarket_name
+from app.downsample import downsample
 from app.database import SessionLocal
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.regions import get_region, get_region_read_db
 
 router = APIRouter(prefix="/price-history", tags=["price-history"])
 
+# Tope de puntos por supermercado que puede pedir un gráfico
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+
 
 
 @router.get("/", response_model=list[PriceHistorySchema])
-def read_price_history(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(PriceHistory).offset(skip).limit(limit).all()
+def read_price_history(
+    skip: int = 0,
+    limit: int = 100,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    # Filtrar por region deja la query en la partición de esa región
+    return (
+        db.query(PriceHistory)
+        .join(Product, Product.id == PriceHistory.product_id)
+        .filter(PriceHistory.region == region, PRODUCT_IS_LIVE)
+        .offset(skip)
+        .limit(limit)
+        .all()
+    )
 
 @router.get("/product/{product_id}", response_model=list[PriceHistorySchema])
-def read_price_history_for_product(product_id: int, db: Session = Depends(get_db)):
-    return db.query(PriceHistory).filter(PriceHistory.product_id == product_id).order_by(PriceHistory.recorded_at.desc()).all()
+def read_price_history_for_product(
+    product_id: int,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    return (
+        db.query(PriceHistory)
+        .join(Product, Product.id == PriceHistory.product_id)
+        .filter(PriceHistory.product_id == product_id, PriceHistory.region == region, PRODUCT_IS_LIVE)
+        .order_by(PriceHistory.recorded_at.desc())
+        .all()
+    )
+
+# GET /price-history/product/{id}/chart?points=200&start=2025-01-01T00:00:00&method=lttb
+# Una serie por supermercado con como mucho `points` puntos, por larga que sea la historia
+@router.get("/product/{product_id}/chart", response_model=PriceChart)
+def read_price_chart(
+    product_id: int,
+    points: int = Query(200, ge=4, le=CHART_MAX_POINTS),
+    start: datetime = None,
+    end: datetime = None,
+    method: str = Query("lttb", pattern="^(lttb|minmax)$"),
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    if not db.query(Product.id).filter(Product.id == product_id, PRODUCT_IS_LIVE).first():
+        raise HTTPException(status_code=404, detail="Product not found")
+
+    query = select(PriceHistory.supermarket_id, PriceHistory.recorded_at, PriceHistory.price).where(
+        PriceHistory.product_id == product_id, PriceHistory.region == region, PriceHistory.price.isnot(None)
+    )
+    if start is not None:
+        query = query.where(PriceHistory.recorded_at >= start)
+    if end is not None:
+        query = query.where(PriceHistory.recorded_at <= end)
+    # Mismo orden que ix_price_history_product_supermarket: cada supermercado queda contiguo
+    rows = db.execute(query.order_by(PriceHistory.supermarket_id, PriceHistory.recorded_at)).all()
+
+    series = []
+    if rows:
+        supermarket_ids, recorded_at, prices = zip(*rows)
+        supermarket_ids = np.array(supermarket_ids)
+        times = np.array(recorded_at, dtype="datetime64[us]")
+        x = times.astype(np.int64).astype(np.float64)
+        y = np.array(prices, dtype=np.float64)
+        bounds = np.r_[0, np.flatnonzero(np.diff(supermarket_ids)) + 1, len(rows)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            keep = lo + downsample(x[lo:hi], y[lo:hi], points, method)
+            supermarket_id = int(supermarket_ids[lo])
+            series.append({
+                "supermarket_id": supermarket_id,
+                "supermarket": get_supermarket_name(db, supermarket_id),
+                "total_points": int(hi - lo),
+                "points": [
+                    {"recorded_at": t, "price": p}
+                    for t, p in zip(times[keep].tolist(), y[keep].tolist())
+                ],
+            })
+    return {"product_id": product_id, "method": method, "start": start, "end": end, "series": series}
@@ -0,0 +1,61 @@
+import asyncio
+import json
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from app.price_events import hub, PriceSubscription
+
+router = APIRouter(tags=["prices"])
+
+def _parse_ids(value) -> set[int]:
+    if isinstance(value, str):
+        value = [v for v in value.split(",") if v.strip()]
+    return {int(v) for v in value or []}
+
+async def _send_batches(websocket: WebSocket, subscription: PriceSubscription):
+    while True:
+        batch = await subscription.next_batch()
+        if not batch:
+            continue
+        dropped, subscription.dropped = subscription.dropped, 0
+        await websocket.send_json({"type": "prices", "events": batch, "dropped": dropped})
+
+# WS /ws/prices?product_ids=1,2&generic_ids=7 → deltas de precio en vivo
+# Mensajes del cliente: {"action": "subscribe" | "unsubscribe", "product_ids": [...], "generic_ids": [...]}
+@router.websocket("/ws/prices")
+async def price_stream(websocket: WebSocket, product_ids: str = "", generic_ids: str = ""):
+    await websocket.accept()
+    subscription = PriceSubscription()
+    try:
+        subscription.product_ids |= _parse_ids(product_ids)
+        subscription.generic_ids |= _parse_ids(generic_ids)
+    except ValueError:
+        await websocket.close(code=1003, reason="Invalid ids")
+        return
+
+    hub.register(subscription)
+    sender = asyncio.create_task(_send_batches(websocket, subscription))
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                products = _parse_ids(message.get("product_ids"))
+                generics = _parse_ids(message.get("generic_ids"))
+            except (ValueError, TypeError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": "Invalid subscription message"})
+                continue
+
+            if message.get("action") == "unsubscribe":
+                subscription.product_ids -= products
+                subscription.generic_ids -= generics
+            else:
+                subscription.product_ids |= products
+                subscription.generic_ids |= generics
+            await websocket.send_json({
+                "type": "subscribed",
+                "product_ids": sorted(subscription.product_ids),
+                "generic_ids": sorted(subscription.generic_ids),
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unregister(subscription)
+        sender.cancel()
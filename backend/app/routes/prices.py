@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Header
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
-from app.schemas import Price, PriceCreate, PriceUpdate
+from app.schemas import Price, PriceCreate, PriceUpdate, PriceSubmissionReceipt
 import app.crud as price_crud
-from app.database import get_db
+from app.database import get_db, get_read_db
+from app.singleflight import product_prices_flight
+from app.price_cache import get_current_prices
+from app.price_matrix import build_price_matrix, pack_msgpack, MSGPACK_MEDIA_TYPE
+from app.fieldsets import parse_fields, sparse_response
+from app.regions import get_region, get_region_db, get_region_read_db
+from app.supermarkets import get_supermarket_id
 
 
+# Todas las rutas son por región (?region= o X-Region, ver app/regions.py)
 router = APIRouter(prefix="/prices", tags=["prices"])
 
 # Dependencia para obtener la sesión de base de datos
@@ -13,25 +21,81 @@ router = APIRouter(prefix="/prices", tags=["prices"])
 
 # GET /prices/ → listar precios
 @router.get("/", response_model=list[Price])
-def read_prices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return price_crud.get_prices(db, skip=skip, limit=limit)
+def read_prices(
+    skip: int = 0,
+    limit: int = 100,
+    fields: str = None,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    selected = parse_fields(fields, Price)
+    prices = price_crud.get_prices(db, skip=skip, limit=limit, fields=selected, region=region)
+    return sparse_response(prices, Price, selected) if selected else prices
+
+# GET /prices/matrix → grilla productos × supermercados en formato columnar
+# (?format=msgpack o Accept: application/x-msgpack para la versión binaria)
+@router.get("/matrix")
+def read_price_matrix(
+    request: Request,
+    category: str = None,
+    generic_id: int = None,
+    format: str = Query(None, pattern="^(json|msgpack)$"),
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    payload = build_price_matrix(db, category=category, generic_id=generic_id, region=region)
+    if format == "msgpack" or (format is None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", "")):
+        return Response(content=pack_msgpack(payload), media_type=MSGPACK_MEDIA_TYPE)
+    return payload
 
 # GET /prices/{price_id} → obtener precio por ID
 @router.get("/{price_id}", response_model=Price)
-def read_price(price_id: int, db: Session = Depends(get_db)):
-    db_price = price_crud.get_price(db, price_id=price_id)
+def read_price(
+    price_id: int,
+    fields: str = None,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    selected = parse_fields(fields, Price)
+    db_price = price_crud.get_price(db, price_id=price_id, fields=selected, region=region)
     if db_price is None:
         raise HTTPException(status_code=404, detail="Price not found")
-    return db_price
+    return sparse_response(db_price, Price, selected) if selected else db_price
 
 # GET /prices/product/{product_id} → obtener precios por ID de producto
 @router.get("/product/{product_id}", response_model=list[Price])
-def read_prices_by_product(product_id: int, db: Session = Depends(get_db)):
-    prices = price_crud.get_prices_by_product_id(db, product_id=product_id)
+def read_prices_by_product(
+    product_id: int,
+    fields: str = None,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    selected = parse_fields(fields, Price)
+    # Requests simultáneos por el mismo producto comparten una sola lectura (cache de Redis o base)
+    prices = product_prices_flight.do(
+        (region, product_id),
+        lambda s: [Price(**p) for p in get_current_prices(s, [product_id], region)[product_id]],
+        db,
+    )
     if not prices:
         raise HTTPException(status_code=404, detail="No prices found for this product")
-    return prices
+    return sparse_response(prices, Price, selected) if selected else prices
 
-@router.post("/prices/", response_model=Price)
-def add_price(price: PriceCreate, db: Session = Depends(get_db)):
-    return price_crud.create_price(db, price)
+# POST /prices/prices/ → encola el precio y responde enseguida (202).
+# Un worker de Celery aplica la cola en lote; reintentos con la misma
+# Idempotency-Key devuelven la misma submission sin duplicar historial.
+@router.post("/prices/", response_model=PriceSubmissionReceipt, status_code=202)
+def add_price(
+    price: PriceCreate,
+    idempotency_key: str = Header(None, max_length=200),
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_db)
+):
+    # Solo supermercados dados de alta por un admin (POST /admin/supermarkets)
+    supermarket_id = get_supermarket_id(db, price.supermarket, region=region)
+    if supermarket_id is None:
+        raise HTTPException(status_code=400, detail=f"Unknown supermarket: {price.supermarket}")
+    submission = price_crud.enqueue_price_submission(db, price, supermarket_id, idempotency_key)
+    if submission is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return submission
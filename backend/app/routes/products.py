@@ -1,89 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
 from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse
-import shutil
-from uuid import uuid4
-import boto3
-from botocore.exceptions import BotoCoreError, NoCredentialsError
-import os
 from app import crud
-from app.models import Product as ProductModel, Price, GenericProduct
-from app.schemas import Product as ProductSchema, ProductCreate, ProductUpdate, ProductOrGenericOut
-from app.database import get_db
+from app.models import Product as ProductModel, Price, GenericProduct, PRODUCT_IS_LIVE
+from app.schemas import Product as ProductSchema, ProductCreate, ProductUpdate, ProductOrGenericOut, BestValueItem
+from app.database import get_db, get_read_db, REGIONS, region_database_sessions
+from app.regions import get_region, get_region_read_db
 from app.crud import get_all_simple_products
-from PIL import Image
-import io
+from app.units import to_base, normalize_unit
+from app.fieldsets import parse_fields, load_only_columns, sparse_response
+from app.singleflight import product_summary_flight, product_prices_flight
+from app.image_store import store_image
+from app.admin_stats import record
 
 print("✅ Se cargó el router de productos")
 
 router = APIRouter(prefix="/products", tags=["products"])
 
-# Ruta absoluta a static/images
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "static", "images"))
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-#  AWS S3 config
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_S3_BUCKET_NAME = os.getenv("AWS_S3_BUCKET")
-AWS_REGION = os.getenv("AWS_REGION", "eu-west-1")
-
-s3 = boto3.client("s3",
-                  region_name=AWS_REGION,
-                  aws_access_key_id=AWS_ACCESS_KEY_ID,
-                  aws_secret_access_key=AWS_SECRET_ACCESS_KEY)
-
-def upload_to_s3(file: UploadFile, filename: str) -> str:
-    try:
-        # 🧼 Open the uploaded image
-        image = Image.open(file.file)
-
-        # 🎯 Resize or compress as needed (e.g., convert to JPEG and lower quality)
-        buffer = io.BytesIO()
-        image.save(buffer, format="JPEG", optimize=True, quality=70)  # quality: 1-95
-        buffer.seek(0)
-
-        # 🔼 Upload to S3 from buffer
-        s3.upload_fileobj(
-            buffer,
-            AWS_S3_BUCKET_NAME,
-            filename,
-            ExtraArgs={"ContentType": "image/jpeg"}
-        )
-
-        url = f"https://{AWS_S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{filename}"
-        return url
-    except Exception as e:
-        print(f"❌ Error uploading to S3: {e}")
-        raise HTTPException(status_code=500, detail=f"S3 upload failed: {str(e)}")
-
 # Get all products
+# ?fields=id,name,image_url → solo esos campos (y solo esas columnas desde la base)
 @router.get("/", response_model=list[ProductSchema])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_products(db, skip=skip, limit=limit)
+def read_products(skip: int = 0, limit: int = 100, fields: str = None, db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, ProductSchema)
+    products = crud.get_products(db, skip=skip, limit=limit, fields=selected)
+    return sparse_response(products, ProductSchema, selected) if selected else products
 
 # Get products and generic products
 
 @router.get("/all-simple", response_model=list[ProductOrGenericOut])
-def all_simple_products(db: Session = Depends(get_db)):
-    return get_all_simple_products(db)
+def all_simple_products(fields: str = None, db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, ProductOrGenericOut)
+    products = get_all_simple_products(db, fields=selected)
+    return sparse_response(products, ProductOrGenericOut, selected) if selected else products
+
+# 🏷️ Mejor precio por kg / l / unidad dentro de un genérico o una categoría.
+# Sin base_unit, los mejores de cada unidad base por separado (€/kg no se compara con €/l)
+@router.get("/best-value", response_model=list[BestValueItem])
+def best_value(
+    generic_id: int = None,
+    category: str = None,
+    base_unit: str = None,
+    limit: int = Query(10, ge=1, le=100),
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    if generic_id is None and category is None:
+        raise HTTPException(status_code=400, detail="generic_id or category is required")
+    return crud.get_best_value(db, generic_id=generic_id, category=category, base_unit=base_unit, limit=limit, region=region)
 
 # Obtener producto por ID
 @router.get("/{product_id}", response_model=ProductSchema)
-def read_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = crud.get_product(db, product_id)
+def read_product(product_id: int, fields: str = None, db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, ProductSchema)
+    db_product = crud.get_product(db, product_id, fields=selected)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return db_product
+    return sparse_response(db_product, ProductSchema, selected) if selected else db_product
 
 # 🔍 Obtener productos por código de barras
 @router.get("/barcode/{barcode}", response_model=list[ProductSchema])
-def get_products_by_barcode(barcode: str, db: Session = Depends(get_db)):
-    products = db.query(ProductModel).filter(ProductModel.barcode == barcode).all()
+def get_products_by_barcode(barcode: str, fields: str = None, db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, ProductSchema)
+    products = (
+        db.query(ProductModel)
+        .options(*load_only_columns(ProductModel, selected))
+        .filter(ProductModel.barcode == barcode, PRODUCT_IS_LIVE)
+        .all()
+    )
     if not products:
         raise HTTPException(status_code=404, detail="No products found with this barcode")
-    return products
+    return sparse_response(products, ProductSchema, selected) if selected else products
 
 # Crear nuevo producto
 @router.post("/", response_model=ProductSchema)
@@ -96,29 +82,36 @@ def update_product(product_id: int, product: ProductUpdate, db: Session = Depend
     db_product = crud.update_product(db, product_id, product)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    # La copia del producto en cada región con base propia, con el unit_price de sus precios
+    for region_db in region_database_sessions():
+        crud.update_product(region_db, product_id, product)
+    # unit_price cambia con la cantidad: que los próximos requests no reciban el resultado viejo
+    for region in REGIONS:
+        product_summary_flight.forget((region, product_id))
+        if db_product.generic_product_id:
+            product_summary_flight.forget((region, db_product.generic_product_id))
+        product_prices_flight.forget((region, product_id))
     return db_product
 
-# Eliminar producto
+# Eliminar producto (borrado lógico; la purga de precios e historial corre en segundo plano)
 @router.delete("/{product_id}", response_model=ProductSchema)
 def delete_product(product_id: int, db: Session = Depends(get_db)):
     db_product = crud.delete_product(db, product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
+    # Cada región con base propia oculta y purga su copia (y sus precios)
+    for region_db in region_database_sessions():
+        crud.delete_product(region_db, product_id)
+    for region in REGIONS:
+        product_summary_flight.forget((region, product_id))
+        product_prices_flight.forget((region, product_id))
     return db_product
 
-# upload de fotos
+# upload de fotos: la misma foto (o casi igual) devuelve la url que ya existe
 @router.post("/upload-image/")
-async def upload_image(file: UploadFile = File(...)):
-    # Nombre único para la imagen
-    filename = f"{uuid4().hex}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # URL accesible públicamente
-    image_url = f"/static/images/{filename}"
-    return {"image_url": image_url}
+def upload_image(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    image, duplicate = store_image(db, file.file.read(), storage="local")
+    return {"image_url": image.url, "duplicate": duplicate}
 
 
 # ✅ Upload image to S3 and create product
@@ -130,20 +123,26 @@ async def create_product_with_image(
     brand: str = Form(...),
     description: str = Form(...),
     quantity: int = Form(...),
+    net_quantity: float = Form(None),
+    unit: str = Form(None),
     image: UploadFile = File(None),
     image_url: str = Form(None),
     db: Session = Depends(get_db)
 ):
     print("📸 Uploading image using S3")
-    existing_product = db.query(ProductModel).filter(ProductModel.barcode == barcode).first()
+    existing_product = db.query(ProductModel).filter(ProductModel.barcode == barcode, PRODUCT_IS_LIVE).first()
     if existing_product:
         raise HTTPException(status_code=400, detail="Product with this barcode already exists.")
 
+    if unit is not None and normalize_unit(unit) is None:
+        raise HTTPException(status_code=400, detail=f"Unknown unit: {unit}")
+    unit = normalize_unit(unit)
+    base_quantity, base_unit = to_base(net_quantity, unit)
+
     final_image_url = None
 
     if image:
-        filename = f"{uuid4().hex}_{image.filename}"
-        final_image_url = upload_to_s3(image, filename)
+        final_image_url = store_image(db, await image.read(), storage="s3")[0].url
     elif image_url:
         final_image_url = image_url
 
@@ -154,10 +153,15 @@ async def create_product_with_image(
         brand=brand,
         description=description,
         quantity=quantity,
+        net_quantity=net_quantity,
+        unit=unit,
+        base_quantity=base_quantity,
+        base_unit=base_unit,
         image_url=final_image_url
     )
 
     db.add(new_product)
+    record(db, "products")
     db.commit()
     db.refresh(new_product)
 
@@ -171,6 +175,8 @@ async def create_product_with_image(
             "brand": new_product.brand,
             "description": new_product.description,
             "quantity": new_product.quantity,
+            "net_quantity": new_product.net_quantity,
+            "unit": new_product.unit,
             "image_url": new_product.image_url
         }
     }
@@ -1,14 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from app.crud import get_product_summary
-from app.database import get_db
-from app.schemas import ProductSummaryResponse
+from app.regions import get_region, get_region_read_db
+from app.schemas import ProductSummaryResponse, ProductSummaryItem
+from app.fieldsets import parse_fields, sparse_content
+from app.singleflight import product_summary_flight
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 @router.get("/{product_id}/summary", response_model=ProductSummaryResponse)
-def product_summary(product_id: int, db: Session = Depends(get_db)):
-    summary = get_product_summary(db, product_id)
+# ?fields=id,supermarket,last_price recorta cada item de products
+def product_summary(
+    product_id: int,
+    fields: str = None,
+    region: str = Depends(get_region),
+    db: Session = Depends(get_region_read_db)
+):
+    selected = parse_fields(fields, ProductSummaryItem)
+    # Requests simultáneos por el mismo id (y región) comparten una sola query
+    summary = product_summary_flight.do(
+        (region, product_id), lambda s: get_product_summary(s, product_id, region), db
+    )
     if not summary:
         raise HTTPException(status_code=404, detail="Product not found")
+    if selected:
+        content = summary.model_dump(mode="json", exclude={"products"})
+        content["products"] = sparse_content(summary.products, ProductSummaryItem, selected)
+        return JSONResponse(content=content)
     return summary
@@ -1,22 +1,27 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Product, Price
+from app.database import get_db, get_read_db
+from app.models import Product, PRODUCT_IS_LIVE
+from app.price_cache import get_current_prices
+from app.supermarkets import all_supermarkets
+from app.regions import get_region, get_region_read_db
 
 router = APIRouter()
 
 @router.get("/products/with-prices")
-def get_products_with_prices(db: Session = Depends(get_db)):
-    products = db.query(Product).all()
+def get_products_with_prices(region: str = Depends(get_region), db: Session = Depends(get_region_read_db)):
+    products = db.query(Product).filter(PRODUCT_IS_LIVE).all()
+    # Columnas solo para los supermercados de la región
+    supermarkets = all_supermarkets(db, region)
+    # Todos los precios en un solo multi-get del cache (los que falten, en una sola query)
+    current = get_current_prices(db, [p.id for p in products], region)
     result = []
 
     for product in products:
-        prices = db.query(Price).filter(Price.product_id == product.id).all()
+        # Extraer precios por supermercado (por id, sin comparar strings)
+        price_map = {p["supermarket_id"]: p["price"] for p in current[product.id]}
 
-        # Extraer precios por supermercado
-        price_map = {p.supermarket.lower(): p.price for p in prices}
-
-        result.append({
+        item = {
             "id": product.id,
             "name": product.name,
             "description": product.description,
@@ -25,9 +30,10 @@ def get_products_with_prices(db: Session = Depends(get_db)):
             "quantity": product.quantity,
             "image_url": product.image_url,
             "barcode": product.barcode,
-            "precio_lidl": price_map.get("lidl") or 0,
-            "precio_tesco": price_map.get("tesco") or 0,
-            "precio_aldi": price_map.get("aldi") or 0,
-        })
+        }
+        # Una clave precio_<slug> por cada supermarket de la tabla (precio_lidl, precio_tesco, ...)
+        for supermarket_id, _, slug in supermarkets:
+            item[f"precio_{slug.replace(' ', '_')}"] = price_map.get(supermarket_id) or 0
+        result.append(item)
 
     return result
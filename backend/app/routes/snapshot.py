@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from app.catalog_snapshot import read_manifest, artifact_path, snapshot_dir
+from app.database import REGIONS
+from app.regions import get_region
+
+router = APIRouter(prefix="/snapshot", tags=["snapshot"])
+
+# El manifest cambia con cada snapshot: cache corto + ETag para revalidar barato.
+# Uno por región (?region= o X-Region)
+@router.get("/manifest")
+def get_snapshot_manifest(request: Request, region: str = Depends(get_region)):
+    manifest = read_manifest(snapshot_dir(region))
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Catalog snapshot not built yet")
+    etag = f'"{manifest["version"]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60", "Vary": "X-Region"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=manifest, headers=headers)
+
+# Los bundles llevan el hash en el nombre, así que nunca cambian
+@router.get("/files/{region}/{filename}")
+def get_snapshot_file(region: str, filename: str):
+    path = artifact_path(filename, snapshot_dir(region)) if region in REGIONS else None
+    if not path:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+    return FileResponse(
+        path,
+        media_type="application/gzip",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
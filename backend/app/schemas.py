@@ -1,8 +1,9 @@
 # app/schemas.py
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
+from app.units import UNITS, normalize_unit
 
 # ---------- Price ----------
 class PriceCreate(BaseModel):
@@ -18,15 +19,62 @@ class Price(BaseModel):
     product_id: int
     supermarket: str
     price: float
+    unit_price: Optional[float] = None
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+# Precio actual por supermercado (slug → precio); las cadenas salen de la tabla supermarkets
 class ProductPrices(BaseModel):
-    tesco: float
-    aldi: float
-    lidl: float
+    prices: dict[str, float] = {}
+
+class Supermarket(BaseModel):
+    id: int
+    name: str
+    slug: str
+    region: str
+
+    class Config:
+        from_attributes = True
+
+# Alta de supermercado (solo admin); la región sale de ?region= / X-Region
+class SupermarketCreate(BaseModel):
+    name: str
+
+    @field_validator("name")
+    @classmethod
+    def check_name(cls, value):
+        if not value.strip():
+            raise ValueError("name must not be empty")
+        return value
+
+class PriceSubmissionReceipt(BaseModel):
+    id: int
+    idempotency_key: str
+    product_id: int
+    price: float
+    status: str
+    submitted_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class PriceQuarantine(BaseModel):
+    id: int
+    product_id: int
+    supermarket_id: int
+    price: float
+    reference_price: Optional[float] = None
+    reason: str
+    submission_id: Optional[int] = None
+    submitted_at: datetime
+    status: str
+    reviewed_by: Optional[int] = None
+    reviewed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
 
 # ---------- PriceHistory ----------
 class PriceHistory(BaseModel):
@@ -39,6 +87,25 @@ class PriceHistory(BaseModel):
     class Config:
         from_attributes = True
 
+# Historial reducido para gráficos: como mucho `points` puntos por supermercado
+class PriceChartPoint(BaseModel):
+    recorded_at: datetime
+    price: float
+
+class PriceChartSeries(BaseModel):
+    supermarket_id: int
+    supermarket: str
+    # Puntos del historial en la ventana antes de reducir
+    total_points: int
+    points: List[PriceChartPoint]
+
+class PriceChart(BaseModel):
+    product_id: int
+    method: str
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    series: List[PriceChartSeries]
+
 # ---------- Product ----------
 class ProductBase(BaseModel):
     name: str
@@ -46,9 +113,21 @@ class ProductBase(BaseModel):
     category: str
     brand: Optional[str] = None
     quantity: int
+    net_quantity: Optional[float] = None
+    unit: Optional[str] = None
     image_url: str
     barcode: str 
 
+    @field_validator("unit")
+    @classmethod
+    def check_unit(cls, value):
+        if value is None:
+            return None
+        unit = normalize_unit(value)
+        if unit is None:
+            raise ValueError(f"unit must be one of {', '.join(UNITS)}")
+        return unit
+
 class ProductCreate(ProductBase):
     pass
 
@@ -57,6 +136,8 @@ class ProductUpdate(ProductBase):
 
 class Product(ProductBase):
     id: int
+    base_quantity: Optional[float] = None
+    base_unit: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -79,6 +160,19 @@ class ProductSummaryItem(BaseModel):
     image_url: Optional[str] = None
     supermarket: Optional[str] = None
     last_price: Optional[float] = None
+    unit_price: Optional[float] = None
+    base_unit: Optional[str] = None
+
+class BestValueItem(BaseModel):
+    product_id: int
+    name: str
+    brand: Optional[str] = None
+    supermarket: str
+    price: float
+    unit_price: float
+    base_unit: str
+    net_quantity: Optional[float] = None
+    unit: Optional[str] = None
 
 class ProductSummaryResponse(BaseModel):
     id: int
@@ -87,6 +181,85 @@ class ProductSummaryResponse(BaseModel):
     image_url: Optional[str] = None
     products: List[ProductSummaryItem]
 
+# ---------- Import ----------
+class ImportJob(BaseModel):
+    id: int
+    filename: str
+    status: str
+    processed: int
+    inserted: int
+    duplicates: int
+    rejected: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# ---------- Purge ----------
+class ProductPurge(BaseModel):
+    id: int
+    product_id: int
+    status: str
+    history_deleted: int
+    basket_deleted: int
+    prices_deleted: int
+    submissions_deleted: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# ---------- Generic matching ----------
+class GenericMatchSuggestion(BaseModel):
+    id: int
+    product_id: int
+    generic_product_id: int
+    score: float
+    rank: int
+    status: str
+    created_at: datetime
+    reviewed_by: Optional[int] = None
+    reviewed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# ---------- Price index ----------
+class PriceIndexPoint(BaseModel):
+    day: date
+    index: Optional[float] = None
+    products: int
+
+class PriceIndexSeries(BaseModel):
+    supermarket_id: int
+    supermarket: str
+    category: str
+    points: List[PriceIndexPoint]
+
+# ---------- Feed ----------
+class FeedEntry(BaseModel):
+    id: int
+    product_id: int
+    product_name: str
+    generic_product_id: Optional[int] = None
+    supermarket: Optional[str] = None
+    region: Optional[str] = None
+    price: float
+    previous_price: float
+    drop_pct: float
+    updated_at: Optional[datetime] = None
+    reason: str     # basket: el producto está en la cesta; generic: otro producto del mismo genérico
+
+class FeedPage(BaseModel):
+    entries: List[FeedEntry]
+    # Pasar como ?before= para la página siguiente; None si no hay más
+    next_before: Optional[int] = None
+
 # ---------- Basket ----------
 class BasketBase(BaseModel):
     user_id: int
@@ -120,6 +293,7 @@ class Price(BaseModel):
     product_id: int
     supermarket: str
     price: float
+    unit_price: Optional[float] = None
     updated_at: datetime
 
     class Config:
@@ -158,7 +332,7 @@ class Basket(BasketBase):
 
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # ----------- Entrada: Registro -----------
 
@@ -0,0 +1,131 @@
+# app/singleflight.py
+# Coalescing de requests idénticos: si llegan cien GET iguales al mismo tiempo,
+# solo uno ejecuta la query y el resto espera y comparte el resultado.
+# Además guarda el resultado un rato corto (ttl) y lo sigue sirviendo como "stale"
+# durante stale_ttl mientras se recalcula en segundo plano.
+import os
+import threading
+import time
+from app.database import SessionLocal, MAIN_DATABASE, session_database
+
+SINGLEFLIGHT_TTL_SECONDS = float(os.getenv("SINGLEFLIGHT_TTL_SECONDS", "1"))
+SINGLEFLIGHT_STALE_SECONDS = float(os.getenv("SINGLEFLIGHT_STALE_SECONDS", "5"))
+SINGLEFLIGHT_MAX_ENTRIES = int(os.getenv("SINGLEFLIGHT_MAX_ENTRIES", "10000"))
+
+# Todas las instancias, para exponer métricas en /admin/singleflight
+flights = {}
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, name: str, ttl: float = SINGLEFLIGHT_TTL_SECONDS, stale_ttl: float = SINGLEFLIGHT_STALE_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._cache = {}
+        self.stats = {
+            "requests": 0,
+            "computed": 0,
+            "collapsed": 0,
+            "fresh_hits": 0,
+            "stale_hits": 0,
+            "errors": 0,
+        }
+        flights[name] = self
+
+    # fn recibe una sesión y tiene que devolver algo que no dependa de ella
+    # (schemas de pydantic, no objetos ORM), porque el resultado se comparte.
+    def do(self, key, fn, db):
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            entry = self._cache.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < self.ttl:
+                    self.stats["fresh_hits"] += 1
+                    return entry[1]
+                if age < self.ttl + self.stale_ttl:
+                    self.stats["stale_hits"] += 1
+                    if key not in self._calls:
+                        call = _Call()
+                        self._calls[key] = call
+                        threading.Thread(target=self._refresh, args=(key, call, fn, session_database(db)), daemon=True).start()
+                    return entry[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.stats["collapsed"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return self._run(key, call, fn, db)
+
+    def _run(self, key, call, fn, db):
+        try:
+            call.result = fn(db)
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        else:
+            with self._lock:
+                self.stats["computed"] += 1
+                if len(self._cache) >= SINGLEFLIGHT_MAX_ENTRIES:
+                    self._evict_expired()
+                self._cache[key] = (time.monotonic(), call.result)
+            return call.result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    # Refresco en segundo plano: la sesión del request original ya se cerró,
+    # así que se abre otra contra la misma base (la de la región si tiene una propia)
+    def _refresh(self, key, call, fn, database):
+        db = SessionLocal(use_replica=True, region=None if database == MAIN_DATABASE else database)
+        try:
+            self._run(key, call, fn, db)
+        except Exception as e:
+            print(f"⚠️ Error refrescando {self.name}:{key}: {e}")
+        finally:
+            db.close()
+
+    def _evict_expired(self):
+        limit = time.monotonic() - (self.ttl + self.stale_ttl)
+        for key in [k for k, (stored_at, _) in self._cache.items() if stored_at < limit]:
+            del self._cache[key]
+        # Si sigue lleno, se vacía: es un cache de segundos, no importa perderlo
+        if len(self._cache) >= SINGLEFLIGHT_MAX_ENTRIES:
+            self._cache.clear()
+
+    def forget(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "in_flight": len(self._calls),
+                "cached_keys": len(self._cache),
+                "ttl_seconds": self.ttl,
+                "stale_seconds": self.stale_ttl,
+            }
+
+product_summary_flight = SingleFlight("product_summary")
+product_prices_flight = SingleFlight("product_prices")
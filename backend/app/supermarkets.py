@@ -0,0 +1,91 @@
+# app/supermarkets.py
+# Cache en memoria de la tabla supermarkets ((región, nombre) → id y id → nombre / región).
+# Son pocas filas y casi nunca cambian, así que la ingesta de precios
+# resuelve el id sin ir a la base en cada fila.
+# Todo va separado por base (session_database): una región con su propia base
+# tiene sus propios ids, que pueden repetir los de la base principal.
+import threading
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, DEFAULT_REGION, session_database
+from app.models import Supermarket
+from app.regions import ensure_region_partitions
+
+_lock = threading.Lock()
+_ids_by_slug = {}
+_names_by_id = {}
+_slugs_by_id = {}
+_regions_by_id = {}
+
+def slugify(name: str) -> str:
+    return " ".join(name.split()).lower()
+
+def _remember(database: str, supermarket: Supermarket):
+    key = (database, supermarket.id)
+    with _lock:
+        _ids_by_slug[(database, supermarket.region, supermarket.slug)] = supermarket.id
+        _names_by_id[key] = supermarket.name
+        _slugs_by_id[key] = supermarket.slug
+        _regions_by_id[key] = supermarket.region
+
+def load_supermarkets(db: Session):
+    database = session_database(db)
+    for supermarket in db.query(Supermarket).all():
+        _remember(database, supermarket)
+
+# Devuelve el id del supermercado de esa región; si no existe y create=True lo da de alta.
+# Solo el alta de admin crea: un nombre que manda un usuario nunca agrega supermercados
+# (cada uno suma una columna a /prices/matrix y una clave a /products/with-prices).
+# El alta va en su propia transacción contra el primario (o la base de la región),
+# así un rollback del llamador no deja en el cache un id que no existe.
+def get_supermarket_id(db: Session, name: str, create: bool = False, region: str = DEFAULT_REGION):
+    slug = slugify(name)
+    database = session_database(db)
+    if (database, region, slug) in _ids_by_slug:
+        return _ids_by_slug[(database, region, slug)]
+
+    existing = db.query(Supermarket).filter(Supermarket.region == region, Supermarket.slug == slug).first()
+    if existing:
+        _remember(database, existing)
+        return existing.id
+    if not create:
+        return None
+
+    session = SessionLocal(region=region)
+    try:
+        # Primer supermercado de una región nueva: sus particiones antes que sus precios
+        ensure_region_partitions(session, region)
+        supermarket = Supermarket(name=" ".join(name.split()), slug=slug, region=region)
+        session.add(supermarket)
+        try:
+            session.commit()
+        except IntegrityError:
+            # Otro worker lo creó al mismo tiempo
+            session.rollback()
+            supermarket = session.query(Supermarket).filter(Supermarket.region == region, Supermarket.slug == slug).one()
+        _remember(session_database(session), supermarket)
+        return supermarket.id
+    finally:
+        session.close()
+
+def get_supermarket_name(db: Session, supermarket_id: int):
+    key = (session_database(db), supermarket_id)
+    if key not in _names_by_id:
+        load_supermarkets(db)
+    return _names_by_id.get(key)
+
+def get_supermarket_region(db: Session, supermarket_id: int):
+    key = (session_database(db), supermarket_id)
+    if key not in _regions_by_id:
+        load_supermarkets(db)
+    return _regions_by_id.get(key)
+
+# Lista (id, nombre, slug) de todos los supermercados (o los de una región), ordenada por id
+def all_supermarkets(db: Session, region: str = None) -> list[tuple[int, str, str]]:
+    database = session_database(db)
+    load_supermarkets(db)
+    with _lock:
+        return [
+            (i, _names_by_id[(base, i)], _slugs_by_id[(base, i)]) for base, i in sorted(_names_by_id)
+            if base == database and (region is None or _regions_by_id[(base, i)] == region)
+        ]
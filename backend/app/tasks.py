@@ -1,15 +1,30 @@
 # app/tasks.py
-from celery import shared_task
+import os
+from celery import shared_task, chord
 from datetime import datetime
-from database import SessionLocal
-import crud
-from models import Product
+from app.database import SessionLocal, REGIONS, MAIN_DATABASE, region_engines, session_database, database_for_region
+from app import crud
+from app.models import Product, PRODUCT_IS_LIVE
+from app.catalog_snapshot import publish_snapshot
+from app import product_purge
+from app import price_index
+from app.generic_matching import run_matching
+from app.catalog_import import run_import_job
+from app.price_cache import check_consistency
+from app.image_store import cleanup_orphan_images
+from app import deals_feed
+from app import admin_stats
+
+# Submissions por transacción y ventana en la que varias del mismo
+# (producto, supermercado) se juntan en una sola escritura
+PRICE_QUEUE_BATCH_SIZE = int(os.getenv("PRICE_QUEUE_BATCH_SIZE", "500"))
+PRICE_COALESCE_SECONDS = float(os.getenv("PRICE_COALESCE_SECONDS", "60"))
 
 @shared_task(name="app.tasks.update_prices")
 def update_prices():
     db = SessionLocal()
     try:
-        products = db.query(Product).all()
+        products = db.query(Product).filter(PRODUCT_IS_LIVE).all()
         for product in products:
             # Replace this with your actual logic for fetching the new price
             new_price = 9.99  # example placeholder
@@ -21,3 +36,169 @@ def update_prices():
         raise e
     finally:
         db.close()
+
+@shared_task(name="app.tasks.drain_price_submissions")
+def drain_price_submissions():
+    total = 0
+    # La cola de la base principal y la de cada región que vive en su propia base
+    for region in [None, *region_engines]:
+        db = SessionLocal(region=region)
+        try:
+            while True:
+                processed = crud.apply_pending_price_submissions(
+                    db, limit=PRICE_QUEUE_BATCH_SIZE, window_seconds=PRICE_COALESCE_SECONDS
+                )
+                total += processed
+                if processed < PRICE_QUEUE_BATCH_SIZE:
+                    break
+        except Exception as e:
+            db.rollback()
+            raise e
+        finally:
+            db.close()
+    return total
+
+@shared_task(name="app.tasks.build_catalog_snapshot")
+def build_catalog_snapshot():
+    # Un bundle por región. Lectura pesada: va a una réplica si hay
+    manifests = {}
+    for region in REGIONS:
+        db = SessionLocal(use_replica=True, region=region)
+        try:
+            manifests[region] = publish_snapshot(db, region)
+        finally:
+            db.close()
+    return manifests
+
+@shared_task(name="app.tasks.purge_deleted_products")
+def purge_deleted_products():
+    # Cada base purga su copia del producto
+    done = 0
+    for region in [None, *region_engines]:
+        db = SessionLocal(region=region)
+        try:
+            done += product_purge.purge_deleted_products(db)
+        finally:
+            db.close()
+    return done
+
+@shared_task(name="app.tasks.update_price_index")
+def update_price_index():
+    # Cada base tiene su propio índice, estado y watermark
+    total = 0
+    for region in [None, *region_engines]:
+        db = SessionLocal(region=region)
+        try:
+            total += price_index.update_price_index(db)
+        finally:
+            db.close()
+    return total
+
+# Backfill del índice de una base (region=None para la principal): un subtask por
+# supermercado, repartidos entre los workers. Mientras corre, update_price_index no
+# hace nada en esa base; al final se fija el watermark.
+# Si falla algún subtask, el callback no corre y el errback restaura el watermark.
+@shared_task(name="app.tasks.backfill_price_index")
+def backfill_price_index(region: str = None):
+    db = SessionLocal(region=region)
+    try:
+        max_id, supermarket_ids = price_index.start_backfill(db)
+    finally:
+        db.close()
+    chord(
+        backfill_price_index_supermarket.s(supermarket_id, max_id, region) for supermarket_id in supermarket_ids
+    )(finish_price_index_backfill.s(max_id, region).on_error(abort_price_index_backfill.si(region)))
+    return max_id
+
+@shared_task(name="app.tasks.backfill_price_index_supermarket")
+def backfill_price_index_supermarket(supermarket_id: int, max_id: int, region: str = None):
+    return price_index.backfill_supermarket(supermarket_id, max_id, region)
+
+@shared_task(name="app.tasks.finish_price_index_backfill")
+def finish_price_index_backfill(results, max_id: int, region: str = None):
+    db = SessionLocal(region=region)
+    try:
+        price_index.finish_backfill(db, max_id)
+        return sum(results)
+    finally:
+        db.close()
+
+@shared_task(name="app.tasks.abort_price_index_backfill")
+def abort_price_index_backfill(region: str = None):
+    db = SessionLocal(region=region)
+    try:
+        price_index.abort_backfill(db)
+    finally:
+        db.close()
+
+@shared_task(name="app.tasks.match_generic_products")
+def match_generic_products():
+    db = SessionLocal()
+    try:
+        return run_matching(db)
+    finally:
+        db.close()
+
+# Importación de catálogo subida por un admin: puede tardar mucho, así que corre en
+# un worker y no ocupa el web worker. El archivo tiene que estar en IMPORT_DIR
+# compartido (volumen común entre backend y worker).
+@shared_task(name="app.tasks.import_catalog")
+def import_catalog(job_id: int, path: str, fmt: str):
+    run_import_job(job_id, path, fmt)
+
+@shared_task(name="app.tasks.check_price_cache")
+def check_price_cache():
+    # Se compara contra el primario: una réplica atrasada daría falsos desajustes.
+    # Cada base (la principal y las de región) tiene sus propios hashes.
+    stats = {}
+    for region in [None, *region_engines]:
+        db = SessionLocal(region=region)
+        try:
+            stats[session_database(db)] = check_consistency(db)
+        finally:
+            db.close()
+    return stats
+
+@shared_task(name="app.tasks.cleanup_orphan_images")
+def cleanup_orphan_images_task():
+    db = SessionLocal()
+    try:
+        return cleanup_orphan_images(db)
+    finally:
+        db.close()
+
+@shared_task(name="app.tasks.fan_out_deals")
+def fan_out_deals(events: list):
+    # Cada evento se resuelve en la base de su región (nombres e interesados)
+    by_database = {}
+    for event in events:
+        by_database.setdefault(database_for_region(event.get("region")), []).append(event)
+    delivered = 0
+    for database, database_events in by_database.items():
+        db = SessionLocal(region=None if database == MAIN_DATABASE else database)
+        try:
+            delivered += deals_feed.fan_out_deals(db, database_events)
+        finally:
+            db.close()
+    return delivered
+
+@shared_task(name="app.tasks.rebuild_deals_interest_index")
+def rebuild_deals_interest_index():
+    stats = {}
+    for region in [None, *region_engines]:
+        db = SessionLocal(region=region)
+        try:
+            stats[session_database(db)] = deals_feed.rebuild_interest_index(db)
+        finally:
+            db.close()
+    return stats
+
+@shared_task(name="app.tasks.recount_stats")
+def recount_stats():
+    # COUNT(*) sobre las tablas grandes, pero en el primario: en una réplica atrasada
+    # se perderían las escrituras recientes (ver admin_stats.recount)
+    db = SessionLocal()
+    try:
+        return admin_stats.recount(db)
+    finally:
+        db.close()
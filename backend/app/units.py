@@ -0,0 +1,64 @@
+# app/units.py
+# Normalización de cantidades a una unidad base (kg, l o unidad) para poder
+# comparar el precio por unidad entre presentaciones distintas del mismo genérico.
+import re
+
+# unidad → (unidad base, factor para pasar a la base)
+UNITS = {
+    "mg": ("kg", 0.000001),
+    "g": ("kg", 0.001),
+    "kg": ("kg", 1.0),
+    "ml": ("l", 0.001),
+    "cl": ("l", 0.01),
+    "l": ("l", 1.0),
+    "unit": ("unit", 1.0),
+}
+
+# Variantes que aparecen en los datos de proveedores
+ALIASES = {
+    "gr": "g", "grs": "g", "gram": "g", "grams": "g",
+    "kilo": "kg", "kgs": "kg",
+    "ltr": "l", "litre": "l", "liter": "l", "litres": "l", "liters": "l",
+    "units": "unit", "u": "unit", "pc": "unit", "pcs": "unit", "ea": "unit",
+}
+
+_QUANTITY_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([a-zA-Z]+)\s*$")
+# Tamaño al final del nombre: "Avonmore Milk 2L", "Pasta 500 g"
+_NAME_QUANTITY_RE = re.compile(r"(\d+(?:[.,]\d+)?\s*[a-zA-Z]+)\s*$")
+
+def normalize_unit(unit):
+    if unit is None:
+        return None
+    unit = unit.strip().lower()
+    unit = ALIASES.get(unit, unit)
+    return unit if unit in UNITS else None
+
+# (500, "g") → (0.5, "kg"); devuelve (None, None) si no se puede normalizar
+def to_base(net_quantity, unit):
+    unit = normalize_unit(unit)
+    if unit is None or not net_quantity or net_quantity <= 0:
+        return None, None
+    base_unit, factor = UNITS[unit]
+    return net_quantity * factor, base_unit
+
+# "1.5L" / "500 ml" → (1.5, "l") / (500.0, "ml")
+def parse_quantity(text):
+    match = _QUANTITY_RE.match(text or "")
+    if not match:
+        return None, None
+    unit = normalize_unit(match.group(2))
+    if unit is None:
+        return None, None
+    return float(match.group(1).replace(",", ".")), unit
+
+# "Avonmore Milk 2L" → (2.0, "l"); para productos cargados antes de tener net_quantity
+def parse_name_quantity(name):
+    match = _NAME_QUANTITY_RE.search(name or "")
+    if not match:
+        return None, None
+    return parse_quantity(match.group(1))
+
+def unit_price(price, base_quantity):
+    if price is None or not base_quantity:
+        return None
+    return price / base_quantity
@@ -0,0 +1,5 @@
+# Los módulos de app/ crean el engine al importarse: sin DATABASE_URL (fuera de
+# docker-compose) los tests usan un SQLite en memoria
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
@@ -0,0 +1,48 @@
+-- 001_supermarkets.sql
+-- Normaliza prices.supermarket y price_history.supermarket (texto libre repetido
+-- en cada fila) a una tabla supermarkets con ids smallint.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/001_supermarkets.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS supermarkets (
+    id SMALLSERIAL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    slug VARCHAR NOT NULL UNIQUE
+);
+
+-- Backfill: un supermercado por nombre distinto, sin importar mayúsculas ni espacios
+INSERT INTO supermarkets (name, slug)
+SELECT DISTINCT ON (lower(trim(s))) trim(s), lower(trim(s))
+FROM (
+    SELECT supermarket AS s FROM prices
+    UNION ALL
+    SELECT supermarket FROM price_history
+) AS all_names
+WHERE s IS NOT NULL AND trim(s) <> ''
+ORDER BY lower(trim(s)), trim(s)
+ON CONFLICT (slug) DO NOTHING;
+
+-- prices
+ALTER TABLE prices ADD COLUMN supermarket_id SMALLINT REFERENCES supermarkets(id);
+UPDATE prices p
+SET supermarket_id = s.id
+FROM supermarkets s
+WHERE s.slug = lower(trim(p.supermarket));
+ALTER TABLE prices DROP COLUMN supermarket;
+CREATE INDEX ix_prices_product_supermarket ON prices (product_id, supermarket_id);
+
+-- price_history
+ALTER TABLE price_history ADD COLUMN supermarket_id SMALLINT REFERENCES supermarkets(id);
+UPDATE price_history h
+SET supermarket_id = s.id
+FROM supermarkets s
+WHERE s.slug = lower(trim(h.supermarket));
+ALTER TABLE price_history DROP COLUMN supermarket;
+CREATE INDEX ix_price_history_product_supermarket ON price_history (product_id, supermarket_id, recorded_at);
+
+COMMIT;
+
+-- Las filas reescritas dejan espacio muerto: recuperar con VACUUM fuera de la transacción
+VACUUM ANALYZE prices;
+VACUUM ANALYZE price_history;
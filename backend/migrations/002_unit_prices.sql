@@ -0,0 +1,21 @@
+-- 002_unit_prices.sql
+-- Cantidad estructurada en products y precio por unidad precalculado en prices.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/002_unit_prices.sql
+-- Después, una vez por base (la principal y cada región con base propia):
+--   python -m app.quantity_backfill [--region gb]
+-- que completa net_quantity/unit/base_quantity de los productos existentes y
+-- recalcula el unit_price de sus precios (acá base_quantity recién se crea y está vacía).
+
+BEGIN;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS net_quantity DOUBLE PRECISION;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS unit VARCHAR;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS base_quantity DOUBLE PRECISION;
+ALTER TABLE products ADD COLUMN IF NOT EXISTS base_unit VARCHAR;
+CREATE INDEX IF NOT EXISTS ix_products_generic_product_id ON products (generic_product_id);
+CREATE INDEX IF NOT EXISTS ix_products_category ON products (category);
+
+ALTER TABLE prices ADD COLUMN IF NOT EXISTS unit_price DOUBLE PRECISION;
+CREATE INDEX IF NOT EXISTS ix_prices_unit_price ON prices (unit_price);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- 003_import_jobs.sql
+-- Seguimiento de importaciones masivas de catálogo (POST /admin/import/products)
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/003_import_jobs.sql
+
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id SERIAL PRIMARY KEY,
+    filename VARCHAR NOT NULL,
+    status VARCHAR DEFAULT 'pending',
+    processed INTEGER DEFAULT 0,
+    inserted INTEGER DEFAULT 0,
+    duplicates INTEGER DEFAULT 0,
+    rejected INTEGER DEFAULT 0,
+    rejects_path VARCHAR,
+    error VARCHAR,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
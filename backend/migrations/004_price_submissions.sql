@@ -0,0 +1,17 @@
+-- 004_price_submissions.sql
+-- Cola durable de precios enviados por usuarios (POST /prices/prices/).
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/004_price_submissions.sql
+
+CREATE TABLE IF NOT EXISTS price_submissions (
+    id SERIAL PRIMARY KEY,
+    idempotency_key VARCHAR NOT NULL UNIQUE,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    supermarket_id SMALLINT NOT NULL REFERENCES supermarkets(id),
+    price DOUBLE PRECISION NOT NULL,
+    status VARCHAR DEFAULT 'pending',
+    submitted_at TIMESTAMPTZ NOT NULL,
+    processed_at TIMESTAMPTZ
+);
+
+-- Solo las pendientes: el índice queda chico aunque la tabla crezca
+CREATE INDEX IF NOT EXISTS ix_price_submissions_pending ON price_submissions (id) WHERE status = 'pending';
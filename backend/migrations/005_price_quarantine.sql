@@ -0,0 +1,19 @@
+-- 005_price_quarantine.sql
+-- Precios enviados que la validación marcó como anómalos; quedan para revisión de un admin.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/005_price_quarantine.sql
+
+CREATE TABLE IF NOT EXISTS price_quarantine (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    supermarket_id SMALLINT NOT NULL REFERENCES supermarkets(id),
+    price DOUBLE PRECISION NOT NULL,
+    reference_price DOUBLE PRECISION,
+    reason VARCHAR NOT NULL,
+    submission_id INTEGER,
+    submitted_at TIMESTAMPTZ NOT NULL,
+    status VARCHAR DEFAULT 'pending',
+    reviewed_by INTEGER,
+    reviewed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_price_quarantine_status ON price_quarantine (status);
@@ -0,0 +1,29 @@
+-- 006_product_soft_delete.sql
+-- Borrado lógico de productos + tabla de progreso de la purga en segundo plano.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/006_product_soft_delete.sql
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMPTZ;
+
+-- Índices parciales: solo productos vivos, que es lo que filtran todas las lecturas
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_live_category ON products (category, id) WHERE deleted_at IS NULL;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_products_live_barcode ON products (barcode) WHERE deleted_at IS NULL;
+
+-- La purga borra cestas por producto
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_basket_product_id ON basket (product_id);
+
+CREATE TABLE IF NOT EXISTS product_purges (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    status VARCHAR DEFAULT 'queued',
+    history_deleted INTEGER DEFAULT 0,
+    basket_deleted INTEGER DEFAULT 0,
+    prices_deleted INTEGER DEFAULT 0,
+    submissions_deleted INTEGER DEFAULT 0,
+    error VARCHAR,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_product_purges_product_id ON product_purges (product_id);
+CREATE INDEX IF NOT EXISTS ix_product_purges_status ON product_purges (status);
@@ -0,0 +1,33 @@
+-- 007_price_index.sql
+-- Índice diario de precios encadenado por supermercado y categoría (app/price_index.py).
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/007_price_index.sql
+-- Después: python -m app.price_index --backfill
+
+CREATE TABLE IF NOT EXISTS price_index_days (
+    day DATE NOT NULL,
+    supermarket_id SMALLINT NOT NULL REFERENCES supermarkets(id),
+    category VARCHAR NOT NULL,
+    sum_log_relative DOUBLE PRECISION DEFAULT 0,
+    new_products INTEGER DEFAULT 0,
+    products INTEGER DEFAULT 0,
+    index_value DOUBLE PRECISION,
+    PRIMARY KEY (day, supermarket_id, category)
+);
+
+-- Lectura de una serie: (category, supermercado) ordenado por día
+CREATE INDEX IF NOT EXISTS ix_price_index_days_series ON price_index_days (category, supermarket_id, day);
+
+CREATE TABLE IF NOT EXISTS price_index_state (
+    product_id INTEGER NOT NULL,
+    supermarket_id SMALLINT NOT NULL,
+    category VARCHAR,
+    price DOUBLE PRECISION NOT NULL,
+    recorded_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product_id, supermarket_id)
+);
+
+CREATE TABLE IF NOT EXISTS analytics_watermarks (
+    name VARCHAR PRIMARY KEY,
+    last_id INTEGER DEFAULT 0,
+    updated_at TIMESTAMPTZ
+);
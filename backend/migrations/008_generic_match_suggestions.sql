@@ -0,0 +1,18 @@
+-- 008_generic_match_suggestions.sql
+-- Genéricos propuestos por el job de matching (app/generic_matching.py) para revisión de un admin.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/008_generic_match_suggestions.sql
+
+CREATE TABLE IF NOT EXISTS generic_match_suggestions (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    generic_product_id INTEGER NOT NULL REFERENCES generic_products(id) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL,
+    rank INTEGER NOT NULL,
+    status VARCHAR DEFAULT 'pending',
+    created_at TIMESTAMPTZ NOT NULL,
+    reviewed_by INTEGER,
+    reviewed_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_generic_match_suggestions_product_id ON generic_match_suggestions (product_id);
+CREATE INDEX IF NOT EXISTS ix_generic_match_suggestions_status ON generic_match_suggestions (status);
@@ -0,0 +1,31 @@
+-- 009_images.sql
+-- Imágenes direccionadas por contenido (app/image_store.py): sha256 para duplicados
+-- exactos y dHash en 4 bandas de 16 bits para encontrar fotos casi iguales.
+-- Las imágenes subidas antes de esta migración no están en la tabla: no se
+-- deduplican contra ellas y la limpieza de huérfanas no las toca.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/009_images.sql
+
+CREATE TABLE IF NOT EXISTS images (
+    id SERIAL PRIMARY KEY,
+    sha256 VARCHAR(64) NOT NULL UNIQUE,
+    dhash BIGINT NOT NULL,
+    dhash_band0 INTEGER NOT NULL,
+    dhash_band1 INTEGER NOT NULL,
+    dhash_band2 INTEGER NOT NULL,
+    dhash_band3 INTEGER NOT NULL,
+    url VARCHAR NOT NULL UNIQUE,
+    storage VARCHAR NOT NULL,
+    storage_key VARCHAR NOT NULL,
+    content_type VARCHAR NOT NULL,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    created_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_images_dhash_band0 ON images (dhash_band0);
+CREATE INDEX IF NOT EXISTS ix_images_dhash_band1 ON images (dhash_band1);
+CREATE INDEX IF NOT EXISTS ix_images_dhash_band2 ON images (dhash_band2);
+CREATE INDEX IF NOT EXISTS ix_images_dhash_band3 ON images (dhash_band3);
+CREATE INDEX IF NOT EXISTS ix_images_last_seen_at ON images (last_seen_at);
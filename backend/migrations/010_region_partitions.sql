@@ -0,0 +1,92 @@
+-- 010_region_partitions.sql
+-- Región (país) en supermarkets, prices y price_history, y prices / price_history
+-- particionadas por lista de región: una query con region = 'xx' solo lee la
+-- partición de ese país. Los datos existentes quedan en la región por defecto
+-- (DEFAULT_REGION de la app, acá la variable default_region).
+-- create_region_partitions(region) crea las particiones de una región nueva; la app
+-- la llama sola al dar de alta el primer supermercado de esa región. Lo que llegue
+-- para una región sin partición cae en prices_other / price_history_other.
+-- Reescribe las dos tablas enteras: correr en una ventana de mantenimiento.
+-- Una región con su propia base (REGION_DATABASE_URLS) corre esta misma migración
+-- allá, con sus secuencias como estén: los caches de la app van separados por base,
+-- así que los ids pueden repetir los de la base principal.
+-- Uso: psql "$DATABASE_URL" -v default_region=ie -f backend/migrations/010_region_partitions.sql
+
+\if :{?default_region}
+\else
+    \set default_region ie
+\endif
+
+BEGIN;
+
+-- supermarkets: la misma cadena puede estar en varios países
+ALTER TABLE supermarkets ADD COLUMN IF NOT EXISTS region VARCHAR(8) NOT NULL DEFAULT :'default_region';
+ALTER TABLE supermarkets ALTER COLUMN region DROP DEFAULT;
+ALTER TABLE supermarkets DROP CONSTRAINT IF EXISTS supermarkets_slug_key;
+ALTER TABLE supermarkets ADD CONSTRAINT uq_supermarkets_region_slug UNIQUE (region, slug);
+
+CREATE OR REPLACE FUNCTION create_region_partitions(region TEXT) RETURNS void AS $$
+BEGIN
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF prices FOR VALUES IN (%L)', 'prices_' || region, region);
+    EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF price_history FOR VALUES IN (%L)', 'price_history_' || region, region);
+END;
+$$ LANGUAGE plpgsql;
+
+-- prices: la clave de partición tiene que estar en la PK
+ALTER TABLE prices RENAME TO prices_unpartitioned;
+ALTER SEQUENCE prices_id_seq OWNED BY NONE;
+
+CREATE TABLE prices (
+    id INTEGER NOT NULL DEFAULT nextval('prices_id_seq'),
+    product_id INTEGER REFERENCES products(id) ON DELETE CASCADE,
+    supermarket_id SMALLINT REFERENCES supermarkets(id),
+    region VARCHAR(8) NOT NULL,
+    price DOUBLE PRECISION,
+    unit_price DOUBLE PRECISION,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (id, region)
+) PARTITION BY LIST (region);
+ALTER SEQUENCE prices_id_seq OWNED BY prices.id;
+
+-- price_history
+ALTER TABLE price_history RENAME TO price_history_unpartitioned;
+ALTER SEQUENCE price_history_id_seq OWNED BY NONE;
+
+CREATE TABLE price_history (
+    id INTEGER NOT NULL DEFAULT nextval('price_history_id_seq'),
+    product_id INTEGER REFERENCES products(id),
+    supermarket_id SMALLINT REFERENCES supermarkets(id),
+    region VARCHAR(8) NOT NULL,
+    price DOUBLE PRECISION,
+    recorded_at TIMESTAMP,
+    PRIMARY KEY (id, region)
+) PARTITION BY LIST (region);
+ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id;
+
+CREATE TABLE prices_other PARTITION OF prices DEFAULT;
+CREATE TABLE price_history_other PARTITION OF price_history DEFAULT;
+SELECT create_region_partitions(:'default_region');
+
+-- Copia: cada fila toma la región de su supermercado
+INSERT INTO prices (id, product_id, supermarket_id, region, price, unit_price, updated_at)
+SELECT p.id, p.product_id, p.supermarket_id, COALESCE(s.region, :'default_region'), p.price, p.unit_price, p.updated_at
+FROM prices_unpartitioned p
+LEFT JOIN supermarkets s ON s.id = p.supermarket_id;
+
+INSERT INTO price_history (id, product_id, supermarket_id, region, price, recorded_at)
+SELECT h.id, h.product_id, h.supermarket_id, COALESCE(s.region, :'default_region'), h.price, h.recorded_at
+FROM price_history_unpartitioned h
+LEFT JOIN supermarkets s ON s.id = h.supermarket_id;
+
+DROP TABLE prices_unpartitioned;
+DROP TABLE price_history_unpartitioned;
+
+-- Los índices sobre la tabla padre se crean en cada partición (y en las futuras)
+CREATE INDEX ix_prices_product_supermarket ON prices (product_id, supermarket_id);
+CREATE INDEX ix_prices_unit_price ON prices (unit_price);
+CREATE INDEX ix_price_history_product_supermarket ON price_history (product_id, supermarket_id, recorded_at);
+
+COMMIT;
+
+ANALYZE prices;
+ANALYZE price_history;
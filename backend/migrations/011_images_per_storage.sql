@@ -0,0 +1,12 @@
+-- 011_images_per_storage.sql
+-- Una imagen por (storage, sha256) en vez de por sha256: la deduplicación de
+-- app/image_store.py busca solo dentro del mismo storage, así que los mismos bytes
+-- subidos a S3 y al disco local son dos filas (y dos urls) distintas.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/011_images_per_storage.sql
+
+BEGIN;
+
+ALTER TABLE images DROP CONSTRAINT IF EXISTS images_sha256_key;
+ALTER TABLE images ADD CONSTRAINT uq_images_storage_sha256 UNIQUE (storage, sha256);
+
+COMMIT;
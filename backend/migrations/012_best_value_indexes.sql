@@ -0,0 +1,23 @@
+-- 012_best_value_indexes.sql
+-- Índices para GET /products/best-value (crud.get_best_value). La consulta filtra por
+-- genérico o categoría y unidad base (columnas de products) y ordena por unit_price
+-- (de prices): se resuelve con los productos vivos de ese grupo y, para cada uno,
+-- sus precios por (product_id, unit_price). El índice sobre unit_price solo no sirve
+-- para una consulta filtrada y se borra.
+-- Uso: psql "$DATABASE_URL" -f backend/migrations/012_best_value_indexes.sql
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS ix_products_live_category_base_unit
+    ON products (category, base_unit, id) WHERE deleted_at IS NULL;
+CREATE INDEX IF NOT EXISTS ix_products_live_generic_base_unit
+    ON products (generic_product_id, base_unit, id) WHERE deleted_at IS NULL;
+
+-- prices está particionada por región: el índice se crea en cada partición
+CREATE INDEX IF NOT EXISTS ix_prices_product_unit_price
+    ON prices (product_id, unit_price) WHERE unit_price IS NOT NULL;
+DROP INDEX IF EXISTS ix_prices_unit_price;
+
+COMMIT;
+
+ANALYZE products;
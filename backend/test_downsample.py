@@ -0,0 +1,45 @@
+# Tests de app/downsample.py: python -m pytest test_downsample.py
+import numpy as np
+import pytest
+from app.downsample import downsample, _bucket_edges
+
+SIZES = list(range(5, 200)) + [997, 1000, 2048, 3000]
+
+def _series(size: int):
+    rng = np.random.default_rng(size)
+    x = np.arange(size, dtype=np.float64)
+    return x, np.cumsum(rng.normal(size=size))
+
+@pytest.mark.parametrize("size", [61, 100, 1000, 2999])
+def test_bucket_edges_cover_interior_points(size):
+    for n_buckets in range(1, size - 1):
+        edges = _bucket_edges(size, n_buckets)
+        assert edges[0] == 1
+        assert edges[-2] == size - 1
+        assert edges[-1] == size
+        assert np.all(np.diff(edges[:-1]) >= 1)
+
+# Nunca más de `points` puntos, índices estrictamente crecientes, primero y último incluidos
+@pytest.mark.parametrize("method, min_points", [("lttb", 3), ("minmax", 4)])
+def test_output_length_and_order(method, min_points):
+    for size in SIZES:
+        x, y = _series(size)
+        for points in range(min_points, size + 2, max(1, size // 40)):
+            selected = downsample(x, y, points, method)
+            assert len(selected) == size if points >= size else len(selected) <= points, (size, points)
+            assert np.all(np.diff(selected) > 0), (size, points)
+            assert selected[0] == 0 and selected[-1] == size - 1, (size, points)
+
+def test_minmax_regression_61_44():
+    x, y = _series(61)
+    assert len(downsample(x, y, 44, "minmax")) <= 44
+
+def test_keeps_extremes_with_minmax():
+    x, y = _series(1000)
+    selected = downsample(x, y, 100, "minmax")
+    assert int(np.argmin(y)) in selected
+    assert int(np.argmax(y)) in selected
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample(np.arange(10.0), np.arange(10.0), 5, "nope")
@@ -0,0 +1,76 @@
+# Tests de app/price_index.py: python -m pytest test_price_index.py
+import math
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+import pytest
+from app.database import Base, engine, SessionLocal
+from app.models import PriceIndexDay
+from app.price_index import _accumulate, rebuild_series, ALL_CATEGORIES, BASE_INDEX
+
+Row = namedtuple("Row", "id product_id supermarket_id price recorded_at category")
+START = datetime(2024, 1, 1, 9)
+
+def _row(id, product_id, price, days, supermarket_id=1, category="dairy"):
+    return Row(id, product_id, supermarket_id, price, START + timedelta(days=days), category)
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+
+def test_first_price_only_counts_product():
+    state, deltas = {}, {}
+    changed = _accumulate([_row(1, 10, 2.0, 0)], state, deltas)
+    assert changed == {(10, 1)}
+    assert deltas == {
+        (date(2024, 1, 1), 1, ALL_CATEGORIES): [0.0, 1],
+        (date(2024, 1, 1), 1, "dairy"): [0.0, 1],
+    }
+
+def test_price_change_adds_log_relative():
+    state, deltas = {}, {}
+    _accumulate([_row(1, 10, 2.0, 0), _row(2, 10, 3.0, 1)], state, deltas)
+    sum_log, new_products = deltas[(date(2024, 1, 2), 1, ALL_CATEGORIES)]
+    assert sum_log == pytest.approx(math.log(1.5))
+    assert new_products == 0
+    assert state[(10, 1)][0] == 3.0
+
+# Volver a ver el mismo precio o una fila más vieja que el estado no suma nada
+def test_repeated_and_late_rows_are_ignored():
+    state, deltas = {}, {}
+    _accumulate([_row(1, 10, 2.0, 0)], state, deltas)
+    deltas.clear()
+    changed = _accumulate([_row(2, 10, 2.0, 1), _row(3, 10, 9.0, -1)], state, deltas)
+    assert changed == {(10, 1)}
+    assert deltas == {}
+    assert state[(10, 1)][:2] == (2.0, START + timedelta(days=1))
+
+def test_without_category_only_all():
+    state, deltas = {}, {}
+    _accumulate([_row(1, 10, 2.0, 0, category=None)], state, deltas)
+    assert list(deltas) == [(date(2024, 1, 1), 1, ALL_CATEGORIES)]
+
+# Jevons encadenado: cada día suma la media de logs sobre los productos conocidos
+def test_rebuild_series_chains_geometric_mean(db):
+    state, deltas = {}, {}
+    _accumulate([
+        _row(1, 10, 2.0, 0), _row(2, 11, 4.0, 0),
+        _row(3, 10, 4.0, 1),                      # un producto x2, el otro sin cambios
+        _row(4, 12, 1.0, 2),                      # producto nuevo: no mueve el índice
+        _row(5, 11, 2.0, 3), _row(6, 12, 2.0, 3), # x0.5 y x2
+    ], state, deltas)
+    db.add_all(
+        PriceIndexDay(day=k[0], supermarket_id=k[1], category=k[2], sum_log_relative=v[0], new_products=v[1])
+        for k, v in deltas.items()
+    )
+    db.flush()
+    rebuild_series(db, {(1, ALL_CATEGORIES)})
+    db.commit()
+
+    days = db.query(PriceIndexDay).filter(PriceIndexDay.category == ALL_CATEGORIES).order_by(PriceIndexDay.day).all()
+    assert [d.products for d in days] == [2, 2, 3, 3]
+    expected = [BASE_INDEX, BASE_INDEX * 2 ** 0.5, BASE_INDEX * 2 ** 0.5, BASE_INDEX * 2 ** 0.5]
+    assert [d.index_value for d in days] == pytest.approx(expected)
@@ -0,0 +1,71 @@
+# Tests de app/price_validation.py: python -m pytest test_price_validation.py
+import numpy as np
+import pytest
+from app import price_validation
+from app.price_validation import (
+    detect_outliers, group_stats, pack_keys,
+    REASON_OK, REASON_NON_POSITIVE, REASON_RATIO, REASON_SPREAD,
+)
+
+# Historial de referencia como filas (producto, supermercado, precio), sin base
+@pytest.fixture
+def reference(monkeypatch):
+    samples = []
+    monkeypatch.setattr(
+        price_validation, "_load_reference_prices",
+        lambda db, product_ids: np.array(samples, dtype=np.float64).reshape(-1, 3),
+    )
+    return samples
+
+def test_pack_keys_separates_products_and_supermarkets():
+    keys = pack_keys([1, 1, 2], [1, 2, 1])
+    assert len(set(keys.tolist())) == 3
+    assert np.all(np.diff(keys) > 0)
+
+def test_group_stats_median_and_quartiles():
+    keys = np.array([7, 7, 7, 7, 3, 3, 3])
+    prices = np.array([4.0, 1.0, 3.0, 2.0, 10.0, 30.0, 20.0])
+    unique_keys, counts, median, q1, q3 = group_stats(keys, prices)
+    assert unique_keys.tolist() == [3, 7]
+    assert counts.tolist() == [3, 4]
+    assert median.tolist() == [20.0, 2.5]
+    assert q1.tolist() == [15.0, 1.75]
+    assert q3.tolist() == [25.0, 3.25]
+
+def test_empty_batch(reference):
+    reasons, median = detect_outliers(None, [], [], [])
+    assert len(reasons) == 0 and len(median) == 0
+
+def test_non_positive_and_non_finite(reference):
+    reasons, _ = detect_outliers(None, [1, 1, 1, 1], [1, 1, 1, 1], [0, -2, np.nan, np.inf])
+    assert reasons.tolist() == [REASON_NON_POSITIVE] * 4
+
+def test_without_history_everything_positive_passes(reference):
+    reasons, median = detect_outliers(None, [1, 2], [1, 1], [0.01, 5000])
+    assert reasons.tolist() == [REASON_OK, REASON_OK]
+    assert np.isnan(median).all()
+
+def test_ratio_to_median(reference):
+    reference.extend([[1, 1, 2.0], [1, 1, 2.0], [1, 1, 2.2]])
+    reasons, median = detect_outliers(None, [1, 1, 1, 1], [1, 1, 1, 1], [2.1, 200.0, 0.02, 9.0])
+    assert reasons.tolist() == [REASON_OK, REASON_RATIO, REASON_RATIO, REASON_OK]
+    assert median.tolist() == [2.0] * 4
+
+# La mediana es de (producto, supermercado): el mismo precio en otro supermercado no se compara
+def test_reference_is_per_supermarket(reference):
+    reference.extend([[1, 1, 2.0], [1, 2, 200.0]])
+    reasons, median = detect_outliers(None, [1, 1, 1], [1, 2, 3], [200.0, 200.0, 200.0])
+    assert reasons.tolist() == [REASON_RATIO, REASON_OK, REASON_OK]
+    assert median[0] == 2.0 and median[1] == 200.0 and np.isnan(median[2])
+
+def test_spread_needs_enough_samples(reference):
+    # Dentro del ratio pero a más de OUTLIER_IQR_FACTOR rangos intercuartiles
+    reference.extend([[1, 1, p] for p in (10.0, 10.0, 10.1, 10.1, 10.2)])
+    reference.extend([[2, 1, p] for p in (10.0, 10.1, 10.2)])
+    reasons, _ = detect_outliers(None, [1, 2], [1, 1], [30.0, 30.0])
+    assert reasons.tolist() == [REASON_SPREAD, REASON_OK]
+
+def test_spread_ignored_without_dispersion(reference):
+    reference.extend([[1, 1, 10.0]] * 6)
+    reasons, _ = detect_outliers(None, [1], [1], [30.0])
+    assert reasons.tolist() == [REASON_OK]
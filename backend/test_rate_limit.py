@@ -0,0 +1,75 @@
+# Tests de app/rate_limit.py: python -m pytest test_rate_limit.py
+import pytest
+from app import rate_limit
+from app.rate_limit import MemoryBuckets, RateLimitGroup, rate_limit_headers, forwarded_client, classify
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+def _scope(*forwarded):
+    return {"headers": [(b"x-forwarded-for", value.encode()) for value in forwarded]}
+
+def test_bucket_allows_burst_then_refuses(clock):
+    buckets = MemoryBuckets()
+    results = [buckets.take("k", 3, 1.0) for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert [tokens for _, tokens in results] == [2, 1, 0, 0]
+
+def test_bucket_refills_with_time_up_to_capacity(clock):
+    buckets = MemoryBuckets()
+    for _ in range(3):
+        buckets.take("k", 3, 0.5)
+    clock[0] += 3
+    assert buckets.take("k", 3, 0.5) == (True, pytest.approx(0.5))
+    assert buckets.take("k", 3, 0.5)[0] is False
+    clock[0] += 1000
+    assert buckets.take("k", 3, 0.5) == (True, 2)
+
+def test_buckets_are_per_key(clock):
+    buckets = MemoryBuckets()
+    buckets.take("a", 1, 1.0)
+    assert buckets.take("a", 1, 1.0)[0] is False
+    assert buckets.take("b", 1, 1.0)[0] is True
+
+def test_least_recently_used_bucket_is_dropped(clock):
+    buckets = MemoryBuckets(max_buckets=2)
+    buckets.take("a", 1, 1.0)
+    buckets.take("b", 1, 1.0)
+    buckets.take("a", 1, 1.0)
+    buckets.take("c", 1, 1.0)
+    assert list(buckets.buckets) == ["a", "c"]
+
+def test_rate_limit_headers():
+    group = RateLimitGroup("write", 60, 30)
+    headers = dict(rate_limit_headers(group, 14.6))
+    assert headers == {
+        b"ratelimit-limit": b"60",
+        b"ratelimit-remaining": b"14",
+        b"ratelimit-reset": b"91",
+        b"ratelimit-policy": b"60;w=120",
+    }
+
+def test_classify():
+    assert classify("POST", "/auth/login").name == "auth"
+    assert classify("POST", "/users/").name == "auth"
+    assert classify("GET", "/users/me").name == "read"
+    assert classify("GET", "/prices/matrix").name == "heavy"
+    assert classify("DELETE", "/products/1").name == "write"
+
+@pytest.mark.parametrize("forwarded, proxies, expected", [
+    (("1.1.1.1",), 0, None),
+    (("1.1.1.1",), 1, "1.1.1.1"),
+    # El cliente puede mandar su propio header: cuenta desde la derecha
+    (("6.6.6.6, 1.1.1.1",), 1, "1.1.1.1"),
+    (("6.6.6.6, 1.1.1.1, 10.0.0.2",), 2, "1.1.1.1"),
+    # Varios headers se leen como una sola lista
+    (("6.6.6.6", "1.1.1.1, 10.0.0.2"), 2, "1.1.1.1"),
+    (("1.1.1.1",), 2, None),
+    ((), 1, None),
+    (("1.1.1.1, ,",), 1, "1.1.1.1"),
+])
+def test_forwarded_client(forwarded, proxies, expected):
+    assert forwarded_client(_scope(*forwarded), proxies) == expected
@@ -0,0 +1,60 @@
+# Tests de app/units.py: python -m pytest test_units.py
+import pytest
+from app.units import parse_quantity, parse_name_quantity, to_base, normalize_unit, unit_price
+
+@pytest.mark.parametrize("text, expected", [
+    ("500 g", (500.0, "g")),
+    ("1.5L", (1.5, "l")),
+    ("1,5 l", (1.5, "l")),
+    ("  330ml ", (330.0, "ml")),
+    ("2 KG", (2.0, "kg")),
+    ("750 grs", (750.0, "g")),
+    ("6 pcs", (6.0, "unit")),
+    ("1 litre", (1.0, "l")),
+    ("500", (None, None)),
+    ("g", (None, None)),
+    ("500 oz", (None, None)),
+    ("2 x 500 g", (None, None)),
+    ("", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_quantity(text, expected):
+    assert parse_quantity(text) == expected
+
+@pytest.mark.parametrize("name, expected", [
+    ("Avonmore Milk 2L", (2.0, "l")),
+    ("Pasta 500 g", (500.0, "g")),
+    ("Coca-Cola 330ml", (330.0, "ml")),
+    ("Coke Zero", (None, None)),
+    ("7Up Free", (None, None)),
+    ("Eggs 6 pack", (None, None)),
+    (None, (None, None)),
+])
+def test_parse_name_quantity(name, expected):
+    assert parse_name_quantity(name) == expected
+
+@pytest.mark.parametrize("quantity, unit, expected", [
+    (500, "g", (0.5, "kg")),
+    (250, "mg", (0.00025, "kg")),
+    (33, "cl", (0.33, "l")),
+    (1.5, "Litre", (1.5, "l")),
+    (6, "pcs", (6.0, "unit")),
+    (0, "g", (None, None)),
+    (-1, "g", (None, None)),
+    (None, "g", (None, None)),
+    (500, None, (None, None)),
+    (500, "oz", (None, None)),
+])
+def test_to_base(quantity, unit, expected):
+    assert to_base(quantity, unit) == (pytest.approx(expected[0]) if expected[0] is not None else None, expected[1])
+
+def test_normalize_unit():
+    assert normalize_unit(" KGS ") == "kg"
+    assert normalize_unit("oz") is None
+    assert normalize_unit(None) is None
+
+def test_unit_price():
+    assert unit_price(2.0, 0.5) == 4.0
+    assert unit_price(2.0, None) is None
+    assert unit_price(2.0, 0) is None
+    assert unit_price(None, 0.5) is None